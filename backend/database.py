@@ -4,6 +4,8 @@ from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from backend.utils.schema_cache import get_schema_cache, register_ddl_invalidation
+
 # Load environment variables
 load_dotenv()
 
@@ -14,6 +16,9 @@ DB_NAME = os.getenv("DB_NAME", "ai_chatbot")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
+# Server-side cap on any single statement the database agent runs (milliseconds, 0 disables)
+SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "60000"))
+
 # Construct PostgreSQL URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
@@ -24,6 +29,19 @@ engine = create_engine(
     pool_recycle=300
 )
 
+# Generated SQL from the database agent runs on its own pool with a server-side cap,
+# so the cap never applies to init_db's DDL or to chat writes
+agent_engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    connect_args={"options": f"-c statement_timeout={SQL_STATEMENT_TIMEOUT_MS}"}
+)
+
+# Migrations and other DDL on these engines drop cached schema reflection
+register_ddl_invalidation(engine)
+register_ddl_invalidation(agent_engine)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -41,10 +59,15 @@ def get_db():
 # Initialize database tables
 def init_db():
     # Import all SQLAlchemy models to ensure they're registered with Base
-    from backend.models.chat import ChatSession, ChatMessage
+    from backend.models.chat import ChatSession, ChatMessage, ChatSummary
     from backend.models.ecommerce import (
         Customer, Address, Category, Supplier, Product, ProductImage, 
         Inventory, Order, OrderItem, Payment, Shipping, Cart, CartItem, 
         Discount, Review, Wishlist, WishlistItem
     )
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add indexes introduced since they were created
+    for table in (ChatSession.__table__, ChatMessage.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    get_schema_cache().invalidate(reason="init_db")
@@ -1,4 +1,5 @@
 import os
+import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -15,6 +16,12 @@ from backend.routes import ecommerce
 from backend.routes import database
 from backend.routes import url_validation
 from backend.database import init_db
+from backend.utils.concurrency import run_blocking, shutdown_executor
+from backend.services.weaviate_client import close_weaviate_client
+from backend.services.ingestion_jobs import shutdown_ingestion_queue
+from backend.services.local_llm import get_local_scheduler, shutdown_local_scheduler
+from backend.services.chat_persistence import shutdown_chat_writer
+from backend.services.chat_summary import shutdown_chat_summarizer
 
 # Get server configuration from environment variables
 HOST = os.getenv("HOST", "0.0.0.0")
@@ -22,6 +29,8 @@ PORT = int(os.getenv("PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
 app = FastAPI(title="AI Chatbot", description="AI local chatbot with LLM integration")
 
@@ -32,6 +41,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paged list endpoints return the next page's cursor in this header
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -72,10 +83,26 @@ async def read_favicon():
         return FileResponse(file_path)
     raise HTTPException(status_code=404, detail="File not found")
 
-# Initialize database on startup
+# Initialize the database and the local model on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    # Load the local model off the event loop now instead of on the first prompt token count
+    if chat.llm_service.provider == "local":
+        try:
+            await run_blocking(get_local_scheduler)
+        except Exception as e:
+            logger.error(f"❌ Failed to load local LLM: {e}")
+
+# Stop summarizing, flush buffered chat writes, then release the worker pools, the local model and the shared Weaviate client on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_chat_summarizer()
+    shutdown_chat_writer()
+    shutdown_ingestion_queue(wait=False)
+    shutdown_local_scheduler()
+    shutdown_executor(wait=False)
+    close_weaviate_client()
 
 @app.get("/test")
 def test_endpoint():
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend.database import Base
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Keyset pagination of the session list, most recently updated first
+        Index("ix_chat_sessions_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(36), unique=True, index=True)  # UUID
@@ -16,6 +20,12 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History windows and keyset paging, in (timestamp, id) order within a session
+        Index("ix_chat_messages_session_timestamp", "session_id", "timestamp", "id"),
+        # Per-session message counts and first user message (session list)
+        Index("ix_chat_messages_session_role_timestamp", "session_id", "role", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"))
@@ -23,4 +33,16 @@ class ChatMessage(Base):
     content = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
-    session = relationship("ChatSession", back_populates="messages") 
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")
+
+class ChatSummary(Base):
+    """Rolling summary of a session's older messages, up to and including summarized_message_id"""
+    __tablename__ = "chat_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), unique=True, index=True)
+    summary = Column(Text)
+    summarized_until = Column(DateTime)  # timestamp of the last summarized message
+    summarized_message_id = Column(Integer)
+    summarized_messages = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
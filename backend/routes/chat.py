@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Query, Body
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 import uuid
 import logging
-from datetime import datetime
-from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from fastapi.responses import StreamingResponse, Response
 import asyncio
 import json
 import os
@@ -15,13 +16,23 @@ import time
 load_dotenv()
 
 from backend.database import get_db
-from backend.models.chat import ChatSession, ChatMessage
+from backend.models.chat import ChatSession, ChatMessage, ChatSummary
 from backend.services.llm_service import LLMService
-from backend.services.rag_service import RAGService
-from backend.services.langchain_sql_service import langchain_sql_service
+from backend.services.local_llm import local_context_budget
+from backend.services.rag_service import RAGService, SEARCH_MODES
+from backend.services.rerank_service import RERANK_ENABLED
+from backend.services.chat_persistence import CHAT_WRITE_BEHIND, get_chat_writer
+from backend.services.history_cache import HISTORY_CACHE_ENABLED, get_history_cache
+from backend.services.chat_summary import CHAT_SUMMARY_ENABLED, get_chat_summarizer, summary_message
+from backend.services.weaviate_client import get_weaviate_manager
+from backend.services.langchain_sql_service import langchain_sql_service, SQL_COMPLEX_QUERY_TIMEOUT
+from backend.utils.concurrency import run_blocking
+from backend.utils.context_budget import ContextBudget, Section, MESSAGE_OVERHEAD_TOKENS
+from backend.utils.deadline import Deadline
+from backend.utils.metadata_filters import parse_metadata_filter
 
 # Define request and response models using Pydantic
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -48,14 +59,33 @@ SYSTEM_INSTRUCTION = os.getenv(
 - Be honest about limitations while being as helpful as possible with available information"""
 )
 
-MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "10"))
-RAG_CONTEXT_MESSAGES = int(os.getenv("RAG_CONTEXT_MESSAGES", "5"))
+# Most messages loaded per session; CONTEXT_TOKEN_BUDGET decides how many reach the prompt
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "50"))
+# Sessions per page of GET /api/sessions and messages per page of GET /api/history/{session_id}
+SESSION_PAGE_SIZE = int(os.getenv("SESSION_PAGE_SIZE", "100"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "200"))
+# Reranked retrieval puts the best chunks first, so fewer are needed in the prompt
+RAG_CONTEXT_MESSAGES = int(os.getenv("RAG_CONTEXT_MESSAGES", "3" if RERANK_ENABLED else "5"))
 ENABLE_RAG = os.getenv("ENABLE_RAG", "true").lower() == "true"
+# Web results merged into RAG context, and how long the fan-out waits for them (seconds)
+RAG_WEB_RESULTS = int(os.getenv("RAG_WEB_RESULTS", "2"))
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "3"))
+# Longest the fan-out waits for vector retrieval (and reranking) before answering without it
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "8"))
+
+def _validate_metadata_filter(value: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if value:
+        parse_metadata_filter(value)
+    return value
 
 class MessageRequest(BaseModel):
     session_id: Optional[str] = None
     message: str
     system_instruction: Optional[str] = None
+    # Restricts document retrieval, e.g. {"category": "Human Resources"} (see utils/metadata_filters.py)
+    metadata_filter: Optional[Dict[str, Any]] = None
+
+    _check_metadata_filter = field_validator("metadata_filter")(_validate_metadata_filter)
 
 class MessageResponse(BaseModel):
     session_id: str
@@ -66,6 +96,11 @@ class HybridSearchRequest(BaseModel):
     n_local_results: int = 3
     n_web_results: int = 3
     include_internet: bool = True
+    search_mode: Optional[str] = None
+    alpha: Optional[float] = None
+    metadata_filter: Optional[Dict[str, Any]] = None
+
+    _check_metadata_filter = field_validator("metadata_filter")(_validate_metadata_filter)
 
 router = APIRouter()
 
@@ -87,11 +122,18 @@ else:
 logger.info("🎉 All services loaded successfully")
 
 # Helper functions
-async def get_or_create_session(session_id: Optional[str], db: Session) -> ChatSession:
-    """Get an existing session or create a new one"""
+# The blocking implementations run in the shared thread pool via run_blocking
+# so that database and model calls never stall the event loop.
+def _get_or_create_session(session_id: Optional[str], db: Session) -> ChatSession:
     if session_id:
+        pk = get_history_cache().get_session_pk(session_id) if HISTORY_CACHE_ENABLED else None
+        if pk is not None:
+            # Hot session: a transient instance carrying the two keys the chat routes use
+            return ChatSession(id=pk, session_id=session_id)
         session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
         if session:
+            if HISTORY_CACHE_ENABLED:
+                get_history_cache().put_session_pk(session.session_id, session.id)
             return session
     
     # Create new session with UUID (either no session_id provided or session not found)
@@ -100,10 +142,11 @@ async def get_or_create_session(session_id: Optional[str], db: Session) -> ChatS
     db.add(session)
     db.commit()
     db.refresh(session)
+    if HISTORY_CACHE_ENABLED:
+        get_history_cache().put_session_pk(session.session_id, session.id)
     return session
 
-async def save_message(session_id: int, role: str, content: str, db: Session) -> ChatMessage:
-    """Save a message to the database"""
+def _save_message(session_id: int, role: str, content: str, db: Session) -> ChatMessage:
     message = ChatMessage(
         session_id=session_id,
         role=role,
@@ -113,20 +156,231 @@ async def save_message(session_id: int, role: str, content: str, db: Session) ->
     db.commit()
     return message
 
+def _get_chat_history(session_id: int, db: Session) -> List[Dict[str, Any]]:
+    if HISTORY_CACHE_ENABLED:
+        cache = get_history_cache()
+        cached = cache.get_history(session_id)
+        if cached is not None:
+            return cached
+        version = cache.version(session_id)
+    # Buffered messages are read before the committed ones: a batch committing in
+    # between is then in one read or the other (duplicates are dropped by the merge)
+    pending = get_chat_writer().pending_messages(session_id) if CHAT_WRITE_BEHIND else []
+    
+    # Messages already folded into the session's summary are replaced by it
+    summary = None
+    if CHAT_SUMMARY_ENABLED:
+        summary = (db.query(ChatSummary.summary, ChatSummary.summarized_until, ChatSummary.summarized_message_id)
+                   .filter(ChatSummary.session_id == session_id)
+                   .first())
+    
+    # Only the most recent MAX_HISTORY_MESSAGES are read (newest first from the
+    # (session_id, timestamp, id) index); the prompt's token budget trims them further
+    query = (db.query(ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+             .filter(ChatMessage.session_id == session_id))
+    if summary:
+        query = query.filter(tuple_(ChatMessage.timestamp, ChatMessage.id) >
+                             (summary.summarized_until, summary.summarized_message_id))
+    messages = (query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+                .limit(MAX_HISTORY_MESSAGES)
+                .all())
+    
+    history = [{"role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in reversed(messages)]
+    if CHAT_WRITE_BEHIND:
+        history = _merge_pending(history, pending)[-MAX_HISTORY_MESSAGES:]
+    history = [{"role": msg["role"], "content": msg["content"]} for msg in history]
+    if summary:
+        history.insert(0, summary_message(summary.summary))
+    if HISTORY_CACHE_ENABLED:
+        cache.fill_history(session_id, history, version)
+    return history
+
+def _cache_message(session_id: int, role: str, content: str) -> None:
+    get_history_cache().append(session_id, {"role": role, "content": content}, MAX_HISTORY_MESSAGES)
+
+def _merge_pending(history: List[Dict[str, Any]], pending: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Append buffered write-behind messages that are not in the committed history yet.
+    
+    pending must be read from the writer before history is queried, so that a
+    batch committed between the two reads is not missed by both.
+    """
+    committed = {(msg["timestamp"], msg["role"]) for msg in history}
+    return history + [msg for msg in pending if (msg["timestamp"], msg["role"]) not in committed]
+
+def _encode_keyset_cursor(timestamp: datetime, pk: int) -> str:
+    """Opaque cursor for (timestamp, id) keyset paging"""
+    return f"{timestamp.isoformat()}|{pk}"
+
+def _decode_keyset_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, pk = cursor.rsplit("|", 1)
+        timestamp = datetime.fromisoformat(timestamp)
+        pk = int(pk)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if timestamp.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp, pk
+
+def _touch_session(session: ChatSession, db: Session) -> None:
+    # By primary key, since a session served from the history cache is not attached to db
+    db.query(ChatSession).filter(ChatSession.id == session.id).update({"updated_at": datetime.utcnow()})
+    db.commit()
+
+async def get_or_create_session(session_id: Optional[str], db: Session) -> ChatSession:
+    """Get an existing session or create a new one"""
+    return await run_blocking(_get_or_create_session, session_id, db)
+
+async def save_message(session_id: int, role: str, content: str, db: Session) -> Optional[ChatMessage]:
+    """Save a message to the database (buffered when CHAT_WRITE_BEHIND is on)"""
+    message = None
+    if CHAT_WRITE_BEHIND:
+        get_chat_writer().save_message(session_id, role, content)
+    else:
+        message = await run_blocking(_save_message, session_id, role, content, db)
+    # Write-through, after the message is buffered or committed so a concurrent fill cannot miss it
+    if HISTORY_CACHE_ENABLED:
+        if get_history_cache().shared:
+            await run_blocking(_cache_message, session_id, role, content)
+        else:
+            _cache_message(session_id, role, content)
+    return message
+
 async def get_chat_history(session_id: int, db: Session) -> List[Dict[str, Any]]:
     """Get chat history for a session"""
-    messages = (db.query(ChatMessage)
-                .filter(ChatMessage.session_id == session_id)
-                .order_by(ChatMessage.timestamp.asc())
-                .all())
+    return await run_blocking(_get_chat_history, session_id, db)
+
+async def touch_session(session: ChatSession, db: Session) -> None:
+    """Update the session's updated_at timestamp"""
+    if CHAT_WRITE_BEHIND:
+        get_chat_writer().touch_session(session.id)
+        return
+    await run_blocking(_touch_session, session, db)
+
+NO_RAG_CONTEXT = "No relevant documents found in the knowledge base. Please respond based on your general knowledge and training data."
+
+RAG_CONTEXT_HEADER = "**RELEVANT CONTEXT FROM KNOWLEDGE BASE:**"
+RAG_CONTEXT_INSTRUCTIONS = "**INSTRUCTIONS:** Use the above context to answer the user's question. If the context contains the specific information requested, use it directly. If not, acknowledge what you can and cannot answer based on the available context."
+
+def rag_instruction(context: str) -> str:
+    """System instruction wrapping retrieved context (the base instruction when there is none)"""
+    if not context:
+        return SYSTEM_INSTRUCTION
+    return f"{SYSTEM_INSTRUCTION}\n\n{RAG_CONTEXT_HEADER}\n\n{context}\n\n{RAG_CONTEXT_INSTRUCTIONS}"
+
+def database_instruction(db_response: str, sql_query: str, db_schema: str) -> str:
+    """System instruction for answering from a database query result"""
+    if sql_query:
+        return f"""
+You are a helpful assistant with access to an e-commerce database.
+
+Database Schema:
+{db_schema}
+
+Database Query Result:
+{db_response}
+
+SQL Query Used:
+```sql
+{sql_query}
+```
+
+IMPORTANT: If the Database Query Result contains a table with "**Query Results:**", preserve that table format exactly as it appears. Do not convert the table to natural language text.
+
+Respond naturally based on the database information above. Use the exact numbers from the database result. 
+Always include the SQL query in your response so the user can see what query was executed.
+"""
+    return f"""
+You are a helpful assistant with access to an e-commerce database.
+
+Database Schema:
+{db_schema}
+
+Database Query Result:
+{db_response}
+
+Respond naturally based on the database information above. Use the exact numbers from the database result.
+"""
+
+# The local model's budget is bounded by its context window and counted with its tokenizer
+context_budget = local_context_budget() if llm_service.provider == "local" else ContextBudget()
+
+def pack_prompt(render, message: str, history: Optional[List[Dict[str, Any]]] = None,
+                passages: Optional[List[str]] = None, schema: str = "",
+                passages_header: str = f"{RAG_CONTEXT_HEADER}\n\n{RAG_CONTEXT_INSTRUCTIONS}") -> tuple:
+    """
+    Fit the system instruction, retrieved passages, schema and history into CONTEXT_TOKEN_BUDGET.
     
-    history = [{"role": msg.role, "content": msg.content} for msg in messages]
+    render(context, schema) builds the system instruction from the kept passages
+    and schema lines; rendered with both empty it is the text that is always sent.
+    passages_header is the text render adds around the passages once any are kept.
     
-    # Limit history length to avoid context window overflow
-    if len(history) > MAX_HISTORY_MESSAGES:
-        history = history[-MAX_HISTORY_MESSAGES:]
+    Returns:
+        (system_instruction, history) with history trimmed to the most recent messages that fit
+    """
+    passages = passages or []
+    newest_first = (history or [])[::-1]
+    schema_lines = schema.split("\n") if schema else []
+    packed = context_budget.pack(
+        required=[render("", ""), message],
+        sections=[
+            Section("chunks", passages, overhead=1, header=passages_header),
+            Section("history", [msg["content"] for msg in newest_first], contiguous=True, overhead=MESSAGE_OVERHEAD_TOKENS),
+            Section("schema", schema_lines, contiguous=True, overhead=1),
+        ]
+    )
+    context = "\n\n".join(passages[i] for i in packed.kept["chunks"])
+    kept_schema = "\n".join(schema_lines[i] for i in packed.kept["schema"])
+    kept_history = [newest_first[i] for i in reversed(packed.kept["history"])]
+    logger.info(f"🧮 Prompt packed to {packed.tokens}/{packed.budget} tokens: {len(packed.kept['chunks'])}/{len(passages)} passages, "
+                f"{len(kept_history)}/{len(newest_first)} history messages, {len(packed.kept['schema'])}/{len(schema_lines)} schema lines")
+    return render(context, kept_schema), kept_history
+
+def rag_context_parts(results, web_results: Optional[List[Dict]] = None) -> List[str]:
+    """Format vector search results (and optional web results) into prompt passages, best first"""
+    # Handle Weaviate v4 GenerativeReturn object and the legacy list format
+    if hasattr(results, 'objects'):
+        objects = results.objects or []
+    elif isinstance(results, list):
+        objects = results
+    else:
+        objects = []
     
-    return history
+    context_parts = []
+    for i, obj in enumerate(objects):
+        if hasattr(obj, 'properties') and 'content' in obj.properties:
+            # Clean up the text while preserving important formatting
+            content = obj.properties['content']
+            # Handle excessive newlines and spaces that are common in PDF extractions
+            # First, replace multiple newlines with single newlines
+            content = '\n'.join(line.strip() for line in content.split('\n') if line.strip())
+            # Then replace multiple spaces with single space
+            cleaned_content = ' '.join(content.split())
+            # Add document source information
+            source = obj.properties.get('source', 'Unknown source')
+            category = obj.properties.get('category', 'General')
+            context_parts.append(f"[Document {i+1} - {source} - {category}]: {cleaned_content}")
+    
+    # Append web results gathered alongside the vector search
+    for i, result in enumerate(web_results or []):
+        snippet = ' '.join((result.get('snippet') or result.get('content') or '').split())
+        if snippet:
+            context_parts.append(f"[Web {i+1} - {result.get('title', 'No title')} - {result.get('url') or result.get('link', '')}]: {snippet}")
+    return context_parts
+
+def format_rag_context(context_parts: List[str], rag_duration: float = 0) -> str:
+    """Join formatted passages into prompt context"""
+    if context_parts:
+        context = "\n\n".join(context_parts)
+        logger.info(f"✅ Vector DB search completed in {rag_duration:.2f}ms - Found {len(context_parts)} relevant passages")
+        logger.info(f"📄 RAG context length: {len(context)} characters")
+        # Return context without debug wrapper to save tokens
+        return context
+    
+    logger.info(f"⚠️  Vector DB search completed in {rag_duration:.2f}ms - No relevant documents found")
+    return NO_RAG_CONTEXT
 
 async def get_rag_context(query: str) -> str:
     """Get relevant context from RAG system"""
@@ -136,82 +390,127 @@ async def get_rag_context(query: str) -> str:
         
     try:
         logger.info(f"🔍 Searching vector DB for query: '{query[:50]}...'")
-        rag_start_time = datetime.utcnow()
-        
-        results = rag_service.query_documents(query, n_results=RAG_CONTEXT_MESSAGES)
+        rag_start_time = time.time()
         
-        rag_end_time = datetime.utcnow()
-        rag_duration = (rag_end_time - rag_start_time).total_seconds() * 1000
+        results = await run_blocking(rag_service.query_documents, query, n_results=RAG_CONTEXT_MESSAGES)
         
-        # Handle Weaviate v4 GenerativeReturn object
-        if hasattr(results, 'objects') and results.objects:
-            # Extract content from Weaviate objects (new v4 API format)
-            context_parts = []
-            for i, obj in enumerate(results.objects):
-                if hasattr(obj, 'properties') and 'content' in obj.properties:
-                    # Clean up the text while preserving important formatting
-                    content = obj.properties['content']
-                    # Handle excessive newlines and spaces that are common in PDF extractions
-                    # First, replace multiple newlines with single newlines
-                    content = '\n'.join(line.strip() for line in content.split('\n') if line.strip())
-                    # Then replace multiple spaces with single space
-                    cleaned_content = ' '.join(content.split())
-                    # Add document source information
-                    source = obj.properties.get('source', 'Unknown source')
-                    category = obj.properties.get('category', 'General')
-                    context_parts.append(f"[Document {i+1} - {source} - {category}]: {cleaned_content}")
-            
-            if context_parts:
-                context = "\n\n".join(context_parts)
-                logger.info(f"✅ Vector DB search completed in {rag_duration:.2f}ms - Found {len(results.objects)} relevant documents")
-                logger.info(f"📄 RAG context length: {len(context)} characters")
-                # Debug context commented out to save tokens - uncomment if needed for debugging
-                # return f"""Here is relevant context from the knowledge base:
-                # 
-                # {context}
-                # 
-                # Please use this context to provide accurate and detailed information. If the context contains specific details, facts, or information that answers the user's question, make sure to include those details in your response. If the context doesn't fully answer the question, you may supplement with your general knowledge, but prioritize the provided context."""
-                
-                # Return context without debug wrapper to save tokens
-                return context
-            else:
-                logger.info(f"⚠️  Vector DB search completed in {rag_duration:.2f}ms - No content found in results")
-                return "No relevant documents found in the knowledge base. Please respond based on your general knowledge and training data."
-        elif isinstance(results, list) and len(results) > 0:
-            # Handle legacy list format
-            context_parts = []
-            for i, obj in enumerate(results):
-                if hasattr(obj, 'properties') and 'content' in obj.properties:
-                    content = obj.properties['content']
-                    content = '\n'.join(line.strip() for line in content.split('\n') if line.strip())
-                    cleaned_content = ' '.join(content.split())
-                    source = obj.properties.get('source', 'Unknown source')
-                    category = obj.properties.get('category', 'General')
-                    context_parts.append(f"[Document {i+1} - {source} - {category}]: {cleaned_content}")
-            
-            if context_parts:
-                context = "\n\n".join(context_parts)
-                logger.info(f"✅ Vector DB search completed in {rag_duration:.2f}ms - Found {len(results)} relevant documents")
-                logger.info(f"📄 RAG context length: {len(context)} characters")
-                # Debug context commented out to save tokens - uncomment if needed for debugging
-                # return f"""Here is relevant context from the knowledge base:
-                # 
-                # {context}
-                # 
-                # Please use this context to provide accurate and detailed information. If the context contains specific details, facts, or information that answers the user's question, make sure to include those details in your response. If the context doesn't fully answer the question, you may supplement with your general knowledge, but prioritize the provided context."""
-                
-                # Return context without debug wrapper to save tokens
-                return context
-            else:
-                logger.info(f"⚠️  Vector DB search completed in {rag_duration:.2f}ms - No content found in results")
-                return "No relevant documents found in the knowledge base. Please respond based on your general knowledge and training data."
-        else:
-            logger.info(f"⚠️  Vector DB search completed in {rag_duration:.2f}ms - No relevant documents found")
-            return "No relevant documents found in the knowledge base. Please respond based on your general knowledge and training data."
+        rag_duration = (time.time() - rag_start_time) * 1000
+        return format_rag_context(rag_context_parts(results), rag_duration)
     except Exception as e:
         logger.error(f"❌ Error getting RAG context: {str(e)}")
         return "Error retrieving document context. Please respond based on your general knowledge and training data."
 
+async def _cancel_tasks(*tasks) -> None:
+    """Cancel fan-out branches that lost; blocking work not yet started is dropped"""
+    for task in tasks:
+        if task is not None and not task.done():
+            task.cancel()
+    for task in tasks:
+        if task is not None:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+async def gather_pre_llm_context(message: str, bypass_rag: bool = False,
+                                 metadata_filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fan out SQL routing, vector retrieval and web search in parallel.
+    
+    The vector store is queried once and shared between branches. When the SQL
+    branch produces a successful query the retrieval branches are cancelled;
+    otherwise their results are formatted into RAG context.
+    
+    Returns:
+        Dict with database_results, context (and its passages, best first) and per-branch timings (ms)
+    """
+    fanout_start_time = time.time()
+    timings = {}
+    
+    async def timed(name, func, *args, **kwargs):
+        start_time = time.time()
+        try:
+            return await run_blocking(func, *args, **kwargs)
+        finally:
+            timings[name] = (time.time() - start_time) * 1000
+    
+    # Cheap keyword routing decides whether the SQL branch is worth launching
+    sql_task = None
+    sql_deadline = None
+    if langchain_sql_service.is_database_query(message):
+        sql_deadline = Deadline(SQL_COMPLEX_QUERY_TIMEOUT, name="SQL query")
+        sql_task = asyncio.create_task(
+            timed("sql", langchain_sql_service.process_query, message, deadline=sql_deadline)
+        )
+    
+    use_rag = ENABLE_RAG and rag_service is not None and not bypass_rag
+    vector_task = None
+    web_task = None
+    if use_rag:
+        vector_task = asyncio.create_task(
+            timed("vector", rag_service.query_documents, message, n_results=RAG_CONTEXT_MESSAGES,
+                  metadata_filter=metadata_filter)
+        )
+        if rag_service.search_service and RAG_WEB_RESULTS > 0:
+            web_task = asyncio.create_task(timed("web", rag_service.search_web, message, RAG_WEB_RESULTS))
+    
+    db_results = None
+    if sql_task is not None:
+        try:
+            db_results = await sql_task
+        except asyncio.CancelledError:
+            # Client went away - stop the agent at its next checkpoint
+            sql_deadline.cancel()
+            await _cancel_tasks(vector_task, web_task)
+            raise
+        except Exception as e:
+            logger.warning(f"❌ Database query failed: {e}")
+    
+    has_successful_db_query = bool(
+        db_results and db_results.get('success') and len((db_results.get('sql_query') or '').strip()) > 0
+    )
+    
+    context = ""
+    context_parts = []
+    if has_successful_db_query:
+        # SQL branch won - retrieval results would be discarded anyway
+        await _cancel_tasks(vector_task, web_task)
+    elif use_rag:
+        vector_results = None
+        web_results = []
+        try:
+            # An unreachable vector store must not stall the chat; answer without its context
+            vector_results = await asyncio.wait_for(vector_task, timeout=VECTOR_SEARCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Vector search exceeded {VECTOR_SEARCH_TIMEOUT}s budget - continuing without it")
+        except Exception as e:
+            logger.error(f"❌ Error getting RAG context: {str(e)}")
+        if web_task is not None:
+            try:
+                # Web search must not hold up the first token beyond its budget
+                web_results = await asyncio.wait_for(web_task, timeout=WEB_SEARCH_TIMEOUT) or []
+            except asyncio.TimeoutError:
+                logger.info(f"⏱️ Web search exceeded {WEB_SEARCH_TIMEOUT}s budget - continuing without it")
+            except Exception as e:
+                logger.warning(f"❌ Internet search failed: {e}")
+        if vector_results is None and not web_results:
+            context = "Error retrieving document context. Please respond based on your general knowledge and training data."
+        else:
+            context_parts = rag_context_parts(vector_results, web_results)
+            context = format_rag_context(context_parts, timings.get("vector", 0))
+    
+    timings["total"] = (time.time() - fanout_start_time) * 1000
+    logger.info(f"🔀 [TIMING] Fan-out completed in {timings['total']:.2f}ms - branches: " +
+                ", ".join(f"{name}={duration:.2f}ms" for name, duration in timings.items() if name != "total"))
+    
+    return {
+        'database_results': db_results,
+        'has_successful_db_query': has_successful_db_query,
+        'context': context,
+        'context_parts': context_parts,
+        'timings': timings
+    }
+
 @router.post("/chat", response_model=MessageResponse)
 async def chat(request: MessageRequest, db: Session = Depends(get_db)):
     """Process a chat message with enhanced database query capabilities"""
@@ -222,9 +521,9 @@ async def chat(request: MessageRequest, db: Session = Depends(get_db)):
         # Save user message
         await save_message(session.id, "user", request.message, db)
         
-        # Check if this is a database query
-        db_result = rag_service.process_database_query(request.message)
-        db_results = db_result.get('database_results') if db_result else None
+        # Run SQL routing and retrieval concurrently; RAG context is used only as a fallback
+        fanout = await gather_pre_llm_context(request.message, metadata_filter=request.metadata_filter)
+        db_results = fanout['database_results']
         
         # Handle conceptual questions about business terminology
         conceptual_keywords = ['what does', 'what is', 'explain', 'define', 'meaning', 'mean']
@@ -248,7 +547,8 @@ For questions about "revenue contribution," "product performance," or similar bu
 
 Be conversational and educational in your response."""
             
-            response = llm_service.generate_response(
+            response = await run_blocking(
+                llm_service.generate_response,
                 request.message,
                 context=system_instruction
             )
@@ -265,7 +565,8 @@ Respond naturally based on the database information above. Use the exact numbers
 """
             
             # Get LLM response with database context
-            response = llm_service.generate_response(
+            response = await run_blocking(
+                llm_service.generate_response,
                 request.message,
                 context=system_instruction
             )
@@ -284,24 +585,30 @@ For business questions:
 
 Focus on being helpful and educational rather than saying you don't have information."""
             
-            response = llm_service.generate_response(
+            response = await run_blocking(
+                llm_service.generate_response,
                 request.message,
                 context=system_instruction
             )
         else:
-            # Get enhanced context including database schema if relevant (RAG fallback)
-            context = await get_rag_context(request.message)
+            # Use the RAG context gathered during the fan-out (RAG fallback)
+            context = fanout['context']
             
             # Create the system instruction with enhanced context
             if context and not context.startswith("No relevant documents") and not context.startswith("Error retrieving"):
-                # Combine RAG context with the optimized system instruction
-                system_instruction = f"{SYSTEM_INSTRUCTION}\n\n{context}"
+                # Combine RAG context with the optimized system instruction, within the token budget
+                system_instruction, _ = await run_blocking(
+                    pack_prompt,
+                    lambda packed_context, _schema: f"{SYSTEM_INSTRUCTION}\n\n{packed_context}" if packed_context else SYSTEM_INSTRUCTION,
+                    request.message, passages=fanout['context_parts'], passages_header=""
+                )
                 logger.info("🔍 Using RAG context combined with optimized system instruction")
             else:
                 # Use base system instruction when no RAG context is available
                 system_instruction = SYSTEM_INSTRUCTION
             
-            response = llm_service.generate_response(
+            response = await run_blocking(
+                llm_service.generate_response,
                 request.message,
                 context=system_instruction
             )
@@ -310,8 +617,7 @@ Focus on being helpful and educational rather than saying you don't have informa
         await save_message(session.id, "assistant", response, db)
         
         # Update session timestamp
-        session.updated_at = datetime.utcnow()
-        db.commit()
+        await touch_session(session, db)
         
         logger.info(f"Response generated: {len(response)} chars")
         return {"session_id": session.session_id, "response": response}
@@ -321,20 +627,51 @@ Focus on being helpful and educational rather than saying you don't have informa
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{session_id}")
-async def get_history(session_id: str, db: Session = Depends(get_db)):
-    """Get chat history for a session"""
+def get_history(
+    session_id: str,
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=1000),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get chat history for a session, oldest first.
+    
+    Returns the latest limit messages (or those before the before cursor).
+    When older messages remain, the X-Next-Cursor header holds the cursor
+    for the previous page.
+    """
+    try:
+        older_than = _decode_keyset_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.session_id == session.id
-    ).order_by(ChatMessage.timestamp.asc()).all()
+    # The newest page also shows messages still waiting in the write-behind buffer,
+    # read before the committed page (see _merge_pending)
+    pending = get_chat_writer().pending_messages(session.id) if CHAT_WRITE_BEHIND and not older_than else []
     
-    return [{"role": msg.role, "content": msg.content, "timestamp": msg.timestamp} for msg in messages]
+    query = (db.query(ChatMessage)
+             .filter(ChatMessage.session_id == session.id)
+             .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()))
+    if older_than:
+        query = query.filter(tuple_(ChatMessage.timestamp, ChatMessage.id) < older_than)
+    messages = query.limit(limit + 1).all()
+    
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers["X-Next-Cursor"] = _encode_keyset_cursor(messages[-1].timestamp, messages[-1].id)
+    
+    history = [{"role": msg.role, "content": msg.content, "timestamp": msg.timestamp} for msg in reversed(messages)]
+    if pending:
+        history = [{key: msg[key] for key in ("role", "content", "timestamp")} for msg in _merge_pending(history, pending)]
+    return history
 
 @router.post("/chat/stream")
-async def stream_chat_post(request: MessageRequest, bypass_rag: bool = False, db: Session = Depends(get_db)):
+async def stream_chat_post(request: MessageRequest, http_request: Request, bypass_rag: bool = False, db: Session = Depends(get_db)):
     """Stream chat responses using POST with database query support"""
     request_start_time = time.time()
     logger.info(f"🚀 [TIMING] Request started at: {request_start_time}")
@@ -365,38 +702,23 @@ async def stream_chat_post(request: MessageRequest, bypass_rag: bool = False, db
     logger.info(f"📚 [TIMING] Chat history retrieved in {history_duration:.2f}ms")
     logger.info(f"📚 Chat history: {len(history)} messages")
     
-    # Check if this is a database query FIRST
-    db_query_start_time = time.time()
-    db_result = rag_service.process_database_query(request.message)
-    db_query_end_time = time.time()
-    db_query_duration = (db_query_end_time - db_query_start_time) * 1000
-    logger.info(f"🗄️ [TIMING] Database query processing completed in {db_query_duration:.2f}ms")
-    
-    # Get relevant context from RAG (unless bypassed or successful database query found)
-    context = ""
-    rag_duration = 0
-    db_results = db_result.get('database_results') if db_result else None
-    has_successful_db_query = db_results and db_results.get('success') and len(db_results.get('sql_query', '').strip()) > 0
+    # Run SQL routing, vector retrieval and web search concurrently
+    fanout = await gather_pre_llm_context(request.message, bypass_rag=bypass_rag, metadata_filter=request.metadata_filter)
+    db_results = fanout['database_results']
+    has_successful_db_query = fanout['has_successful_db_query']
+    context = fanout['context']
     
     logger.info(f"🔍 DEBUG: bypass_rag={bypass_rag}, has_successful_db_query={has_successful_db_query}")
     
-    if not bypass_rag and not has_successful_db_query:
-        rag_start_time = time.time()
-        context = await get_rag_context(request.message)
-        rag_end_time = time.time()
-        rag_duration = (rag_end_time - rag_start_time) * 1000
-        
-        # Log RAG usage
-        if context and len(context.strip()) > 0:
-            logger.info(f"🔍 [TIMING] RAG context retrieved in {rag_duration:.2f}ms - Context will be used in response")
-            logger.info(f"🔍 RAG context length: {len(context)} characters")
-            logger.info(f"🔍 RAG context preview: {context[:300]}...")
-        else:
-            logger.info(f"⚠️ [TIMING] No RAG context found in {rag_duration:.2f}ms - Response will be generated without document context")
-    elif has_successful_db_query:
+    if has_successful_db_query:
         logger.info(f"🗄️ Database query detected - skipping RAG context")
-    else:
+    elif bypass_rag:
         logger.info("🚫 RAG context skipped (bypass mode)")
+    elif context and len(context.strip()) > 0:
+        logger.info(f"🔍 RAG context length: {len(context)} characters")
+        logger.info(f"🔍 RAG context preview: {context[:300]}...")
+    else:
+        logger.info(f"⚠️ No RAG context found - Response will be generated without document context")
     
     logger.info(f"🔍 DEBUG: Final context length: {len(context)}")
     
@@ -405,8 +727,6 @@ async def stream_chat_post(request: MessageRequest, bypass_rag: bool = False, db
     pre_llm_duration = (pre_llm_end_time - request_start_time) * 1000
     logger.info(f"⚡ [TIMING] Pre-LLM processing completed in {pre_llm_duration:.2f}ms")
     
-    import os
-    provider = os.getenv("LLM_PROVIDER", "local").lower()
     async def response_generator():
         try:
             yield "data: {}\n\n".format(json.dumps({'session_id': session.session_id}))
@@ -418,14 +738,15 @@ async def stream_chat_post(request: MessageRequest, bypass_rag: bool = False, db
             instruction_start_time = time.time()
             logger.info(f"🔍 DEBUG: System instruction selection - has_successful_db_query={has_successful_db_query}, context_length={len(context)}, has_system_instruction={bool(request.system_instruction)}")
             
+            passages = []
+            db_schema = ""
             if has_successful_db_query:
                 # Use database query result from LangChain SQL Agent
                 db_response = db_results.get('response', 'No response')
                 sql_query = db_results.get('sql_query', '')
                 
                 # Get database schema for context
-                db_info = langchain_sql_service.get_database_info()
-                db_schema = ""
+                db_info = await run_blocking(langchain_sql_service.get_database_info)
                 if 'schema' in db_info and not 'error' in db_info:
                     db_schema = db_info['schema']
                 
@@ -434,57 +755,33 @@ async def stream_chat_post(request: MessageRequest, bypass_rag: bool = False, db
                 logger.info(f"🗄️ SQL query: {sql_query[:100]}...")
                 logger.info(f"🗄️ Database schema length: {len(db_schema)} characters")
                 
-                # Include SQL query in the response if available
-                if sql_query:
-                    system_instruction = f"""
-You are a helpful assistant with access to an e-commerce database.
-
-Database Schema:
-{db_schema}
-
-Database Query Result:
-{db_response}
-
-SQL Query Used:
-```sql
-{sql_query}
-```
-
-IMPORTANT: If the Database Query Result contains a table with "**Query Results:**", preserve that table format exactly as it appears. Do not convert the table to natural language text.
-
-Respond naturally based on the database information above. Use the exact numbers from the database result. 
-Always include the SQL query in your response so the user can see what query was executed.
-"""
-                else:
-                    system_instruction = f"""
-You are a helpful assistant with access to an e-commerce database.
-
-Database Schema:
-{db_schema}
-
-Database Query Result:
-{db_response}
-
-Respond naturally based on the database information above. Use the exact numbers from the database result.
-"""
+                render = lambda _context, schema: database_instruction(db_response, sql_query, schema)
                 logger.info("🗄️ Using LangChain SQL Agent result for response")
             elif request.system_instruction:
                 # Use custom system instruction if provided
-                system_instruction = request.system_instruction
+                render = lambda _context, _schema: request.system_instruction
                 logger.info("🔧 Using custom system instruction from request")
             elif context and len(context.strip()) > 0:
                 # Combine RAG context with the optimized system instruction
-                system_instruction = f"{SYSTEM_INSTRUCTION}\n\n**RELEVANT CONTEXT FROM KNOWLEDGE BASE:**\n\n{context}\n\n**INSTRUCTIONS:** Use the above context to answer the user's question. If the context contains the specific information requested, use it directly. If not, acknowledge what you can and cannot answer based on the available context."
+                passages = fanout['context_parts'] or [context]
+                render = lambda packed_context, _schema: rag_instruction(packed_context)
                 logger.info(f"🔍 Using RAG context in system instruction. Context length: {len(context)}")
                 logger.info(f"🔍 RAG context preview: {context[:200]}...")
-                logger.info(f"🔍 Final system instruction length: {len(system_instruction)}")
-                logger.info(f"🔍 System instruction preview: {system_instruction[-500:]}...")
             else:
                 # Use base system instruction when no RAG context is available
-                system_instruction = SYSTEM_INSTRUCTION
+                render = lambda _context, _schema: SYSTEM_INSTRUCTION
                 logger.info("⚠️ No RAG context available - using base system instruction")
                 logger.info(f"🔍 DEBUG: context='{context}', context.strip()='{context.strip()}', len(context.strip())={len(context.strip())}")
             
+            # Fit instruction, retrieved passages, schema and history into the token budget
+            # Counting tokens (the local model's tokenizer) is blocking work
+            system_instruction, prompt_history = await run_blocking(
+                pack_prompt, render, request.message,
+                history=history[:-1] if history else None,  # Exclude the latest message
+                passages=passages, schema=db_schema
+            )
+            logger.info(f"🔍 Final system instruction length: {len(system_instruction)}")
+            
             instruction_end_time = time.time()
             instruction_duration = (instruction_end_time - instruction_start_time) * 1000
             logger.info(f"📝 [TIMING] System instruction preparation completed in {instruction_duration:.2f}ms")
@@ -494,52 +791,56 @@ Respond naturally based on the database information above. Use the exact numbers
             buffer = ""
             first_token_time = None
             token_count = 0
+            client_disconnected = False
             
-            if provider == "openai":
-                # Non-streaming for OpenAI
-                response = llm_service.generate_response(
-                    prompt=request.message,
-                    context=system_instruction,
-                    history=history[:-1] if history else None  # Exclude the latest message
-                )
-                await save_message(session.id, "assistant", response, db)
-                session.updated_at = datetime.utcnow()
-                db.commit()
-                yield "data: {}\n\n".format(json.dumps({'delta': response}))
-                yield "data: {}\n\n".format(json.dumps({'done': True}))
-                logger.info("✅ OpenAI response complete")
-                return
-
-            async for token in llm_service.generate_streaming_response(
+            # Tokens are pulled from the provider only as fast as this response is sent
+            tokens = llm_service.generate_streaming_response(
                 request.message,
-                history[:-1] if history else None,  # Exclude the latest message
+                prompt_history or None,
                 system_instruction=system_instruction
-            ):
-                try:
-                    if token:  # Only send non-empty tokens
-                        if first_token_time is None:
-                            first_token_time = time.time()
-                            first_token_duration = (first_token_time - llm_start_time) * 1000
-                            logger.info(f"🎯 [TIMING] First token received in {first_token_duration:.2f}ms")
-                        
-                        token_count += 1
-                        full_response += token
-                        buffer += token
-                        
-                        # Send tokens in chunks to reduce socket operations
-                        if len(buffer) >= 10 or token in ['.', '!', '?', '\n']:
-                            yield "data: {}\n\n".format(json.dumps({'delta': buffer}))
-                            buffer = ""
+            )
+            try:
+                async for token in tokens:
+                    try:
+                        if token:  # Only send non-empty tokens
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                first_token_duration = (first_token_time - llm_start_time) * 1000
+                                logger.info(f"🎯 [TIMING] First token received in {first_token_duration:.2f}ms")
                             
-                except Exception as e:
-                    logger.error(f"Error sending token: {str(e)}")
-                    if buffer:  # Send any remaining buffered content
-                        try:
-                            yield "data: {}\n\n".format(json.dumps({'delta': buffer}))
-                            buffer = ""
-                        except Exception as send_error:
-                            logger.error(f"Error sending buffered content: {str(send_error)}")
-                    break
+                            token_count += 1
+                            full_response += token
+                            buffer += token
+                            
+                            # Send tokens in chunks to reduce socket operations
+                            if len(buffer) >= 10 or token in ['.', '!', '?', '\n']:
+                                yield "data: {}\n\n".format(json.dumps({'delta': buffer}))
+                                buffer = ""
+                                # Stop generating tokens nobody will read
+                                if await http_request.is_disconnected():
+                                    client_disconnected = True
+                                    break
+                                
+                    except Exception as e:
+                        logger.error(f"Error sending token: {str(e)}")
+                        if buffer:  # Send any remaining buffered content
+                            try:
+                                yield "data: {}\n\n".format(json.dumps({'delta': buffer}))
+                                buffer = ""
+                            except Exception as send_error:
+                                logger.error(f"Error sending buffered content: {str(send_error)}")
+                        break
+            finally:
+                # Closes the provider stream when we stop early or the response task is cancelled
+                await tokens.aclose()
+            
+            if client_disconnected:
+                logger.info(f"🔌 Client disconnected after {token_count} tokens - generation cancelled")
+                # Keep the partial answer so the stored history matches what the user saw
+                if full_response:
+                    await save_message(session.id, "assistant", full_response, db)
+                    await touch_session(session, db)
+                return
             
             # Send any remaining buffered content
             if buffer:
@@ -552,8 +853,12 @@ Respond naturally based on the database information above. Use the exact numbers
             await save_message(session.id, "assistant", full_response, db)
             
             # Update session timestamp
-            session.updated_at = datetime.utcnow()
-            db.commit()
+            await touch_session(session, db)
+            
+            # Fold older turns into the session summary in the background once enough have built up
+            if CHAT_SUMMARY_ENABLED:
+                unsummarized = sum(1 for msg in history if msg["role"] != "system") + 1
+                get_chat_summarizer().request(session.id, unsummarized)
             
             # Calculate final timing
             llm_end_time = time.time()
@@ -577,7 +882,7 @@ Respond naturally based on the database information above. Use the exact numbers
     return StreamingResponse(response_generator(), media_type="text/plain")
 
 @router.delete("/session/{session_id}")
-async def delete_session(session_id: str, db: Session = Depends(get_db)):
+def delete_session(session_id: str, db: Session = Depends(get_db)):
     """Delete a chat session and all its messages"""
     logger.info(f"🗑️  Session deletion requested for session ID: {session_id}")
     delete_start_time = datetime.utcnow()
@@ -591,12 +896,19 @@ async def delete_session(session_id: str, db: Session = Depends(get_db)):
         
         logger.info(f"📋 Found session: {session_id} (ID: {session.id})")
         
+        # Buffered writes for the session must not land after it is gone
+        if CHAT_WRITE_BEHIND:
+            get_chat_writer().discard_session(session.id)
+        if HISTORY_CACHE_ENABLED:
+            get_history_cache().invalidate(session_id=session.session_id, pk=session.id)
+        
         # Count messages before deletion
         message_count = db.query(ChatMessage).filter(ChatMessage.session_id == session.id).count()
         logger.info(f"📝 Deleting {message_count} messages for session {session_id}")
         
-        # Delete all messages for this session
+        # Delete all messages and the conversation summary for this session
         deleted_messages = db.query(ChatMessage).filter(ChatMessage.session_id == session.id).delete()
+        db.query(ChatSummary).filter(ChatSummary.session_id == session.id).delete()
         
         # Delete the session itself
         db.delete(session)
@@ -615,40 +927,65 @@ async def delete_session(session_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to delete session")
 
 @router.get("/sessions")
-async def list_sessions(db: Session = Depends(get_db)):
-    """Get all chat sessions with their titles and metadata"""
+def list_sessions(
+    response: Response,
+    limit: int = Query(SESSION_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get chat sessions with their titles and metadata, most recently updated first.
+    
+    One query per page: message counts and the first user message come from
+    correlated subqueries served by the chat_messages indexes. When more
+    sessions remain, the X-Next-Cursor header holds the cursor for the next page.
+    """
     try:
-        sessions = db.query(ChatSession).order_by(ChatSession.updated_at.desc()).all()
+        after = _decode_keyset_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        message_count = (db.query(func.count(ChatMessage.id))
+                         .filter(ChatMessage.session_id == ChatSession.id)
+                         .correlate(ChatSession)
+                         .scalar_subquery())
+        # One character past the title length tells us whether to add "..."
+        first_user_message = (db.query(func.substr(ChatMessage.content, 1, 51))
+                              .filter(ChatMessage.session_id == ChatSession.id, ChatMessage.role == "user")
+                              .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+                              .limit(1)
+                              .correlate(ChatSession)
+                              .scalar_subquery())
+        query = (db.query(ChatSession, message_count, first_user_message)
+                 .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()))
+        if after:
+            query = query.filter(tuple_(ChatSession.updated_at, ChatSession.id) < after)
+        rows = query.limit(limit + 1).all()
         
         session_list = []
-        for session in sessions:
-            # Get the first user message to use as title if no title is set
-            first_message = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id,
-                ChatMessage.role == "user"
-            ).order_by(ChatMessage.timestamp.asc()).first()
-            
-            # Get message count
-            message_count = db.query(ChatMessage).filter(ChatMessage.session_id == session.id).count()
-            
+        for session, count, first_message in rows[:limit]:
             session_data = {
                 "session_id": session.session_id,
                 "title": session.title,
                 "created_at": session.created_at,
                 "updated_at": session.updated_at,
-                "message_count": message_count
+                "message_count": count
             }
             
             # If title is still "New Chat" and we have a first message, use that as title
             if session.title == "New Chat" and first_message:
                 # Truncate the message to create a reasonable title
-                title = first_message.content[:50]
-                if len(first_message.content) > 50:
+                title = first_message[:50]
+                if len(first_message) > 50:
                     title += "..."
                 session_data["title"] = title
             
             session_list.append(session_data)
         
+        if len(rows) > limit:
+            last_session = rows[limit - 1][0]
+            response.headers["X-Next-Cursor"] = _encode_keyset_cursor(last_session.updated_at, last_session.id)
         logger.info(f"📋 Retrieved {len(session_list)} sessions")
         return session_list
         
@@ -657,7 +994,7 @@ async def list_sessions(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to list sessions")
 
 @router.put("/session/{session_id}/title")
-async def update_session_title(session_id: str, title: str, db: Session = Depends(get_db)):
+def update_session_title(session_id: str, title: str, db: Session = Depends(get_db)):
     """Update the title of a chat session"""
     try:
         session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
@@ -677,7 +1014,7 @@ async def update_session_title(session_id: str, title: str, db: Session = Depend
         raise HTTPException(status_code=500, detail="Failed to update session title")
 
 @router.post("/session/new")
-async def create_new_session(db: Session = Depends(get_db)):
+def create_new_session(db: Session = Depends(get_db)):
     """Create a new chat session"""
     try:
         new_session_id = str(uuid.uuid4())
@@ -698,12 +1035,18 @@ async def hybrid_search(request: HybridSearchRequest):
     try:
         if not rag_service:
             raise HTTPException(status_code=503, detail="RAG service not available")
+        if request.search_mode and request.search_mode.lower() not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"search_mode must be one of {', '.join(SEARCH_MODES)}")
         logger.info(f"🔍 Hybrid search requested for: {request.query}")
-        results = rag_service.hybrid_search(
+        results = await run_blocking(
+            rag_service.hybrid_search,
             query=request.query,
             n_local_results=request.n_local_results,
             n_web_results=request.n_web_results,
-            include_internet=request.include_internet
+            include_internet=request.include_internet,
+            search_mode=request.search_mode,
+            alpha=request.alpha,
+            metadata_filter=request.metadata_filter
         )
         local_results = results['local_results']
         # Handle Weaviate v4 GenerativeReturn object
@@ -723,6 +1066,111 @@ async def hybrid_search(request: HybridSearchRequest):
             "local_count": local_count,
             "web_count": len(results['web_results']) if results['web_results'] else 0
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Hybrid search failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@router.get("/vector-store/health")
+def vector_store_health():
+    """Probe the shared Weaviate client without forcing a reconnect"""
+    health = get_weaviate_manager().health()
+    health["status"] = "healthy" if health["ready"] else "unhealthy"
+    return health
+
+@router.get("/documents")
+async def list_documents(
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    source: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None
+):
+    """List ingested documents with chunk counts; pass next_cursor back as after for the next page"""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    metadata_filter = {prop: value for prop, value in (("category", category), ("location", location), ("source", source)) if value}
+    try:
+        return await run_blocking(rag_service.list_documents, metadata_filter, limit, after)
+    except Exception as e:
+        logger.error(f"Error listing documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
+
+@router.get("/documents/chunks")
+async def list_document_chunks(
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+    include_content: bool = False
+):
+    """Page through all chunks in uuid order with the Weaviate cursor API"""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    try:
+        chunks = await run_blocking(rag_service.fetch_chunk_page, limit, after, include_content)
+    except Exception as e:
+        logger.error(f"Error listing chunks: {e}")
+        raise HTTPException(status_code=500, detail=f"Error listing chunks: {str(e)}")
+    return {
+        "chunks": [{"uuid": str(obj.uuid), **obj.properties} for obj in chunks],
+        "next_cursor": str(chunks[-1].uuid) if len(chunks) == limit else None
+    }
+
+@router.get("/rag/cache/stats")
+async def rag_cache_stats():
+    """Get hit/miss counters for the query embedding cache and the reranker"""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    stats = {"query_embeddings": rag_service.query_embedding_cache.stats()}
+    if rag_service.reranker is not None:
+        stats["reranker"] = rag_service.reranker.stats()
+    return stats
+
+@router.delete("/rag/cache")
+async def clear_rag_cache():
+    """Clear the query embedding and rerank score caches"""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not available")
+    rag_service.query_embedding_cache.clear()
+    if rag_service.reranker is not None:
+        rag_service.reranker.score_cache.clear()
+    logger.info("🧹 Query embedding and rerank score caches cleared")
+    return {"message": "Query embedding and rerank score caches cleared"}
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """Get streaming counters and time-to-first-token for the LLM provider"""
+    return llm_service.stream_stats()
+
+@router.get("/chat/persistence/stats")
+async def chat_persistence_stats():
+    """Get batch counters for the chat message write-behind buffer"""
+    if not CHAT_WRITE_BEHIND:
+        return {"write_behind": False}
+    return {"write_behind": True, **get_chat_writer().stats()}
+
+@router.get("/chat/history-cache/stats")
+async def history_cache_stats():
+    """Get hit/miss counters for the hot-session history cache"""
+    if not HISTORY_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_history_cache().stats()}
+
+@router.get("/chat/summary/stats")
+async def chat_summary_stats():
+    """Get counters for background conversation summarization"""
+    if not CHAT_SUMMARY_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_chat_summarizer().stats()}
+
+@router.get("/sql/cache/stats")
+async def sql_cache_stats():
+    """Get hit/miss counters for the natural-language-to-SQL semantic cache"""
+    return {"sql_semantic_cache": langchain_sql_service.sql_cache.stats()}
+
+@router.delete("/sql/cache")
+async def clear_sql_cache():
+    """Clear the natural-language-to-SQL semantic cache"""
+    langchain_sql_service.sql_cache.clear()
+    logger.info("🧹 SQL semantic cache cleared")
+    return {"message": "SQL semantic cache cleared"}
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 import logging
 from backend.services.database_service import DatabaseService
+from backend.utils.schema_cache import get_schema_cache
 import os
 from dotenv import load_dotenv
 
@@ -213,4 +214,15 @@ async def database_health():
         return {
             "status": "unhealthy",
             "error": str(e)
-        } 
\ No newline at end of file
+        } 
+
+@router.get("/schema/version")
+async def get_schema_version():
+    """Get the schema cache generation and content hash."""
+    return get_schema_cache().version()
+
+@router.post("/schema/refresh")
+async def refresh_schema_cache():
+    """Drop cached schema reflection, e.g. after an out-of-band migration."""
+    generation = get_schema_cache().invalidate(reason="admin endpoint")
+    return {"success": True, "generation": generation}
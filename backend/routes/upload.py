@@ -2,8 +2,11 @@ import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from fastapi.responses import JSONResponse
 from pathlib import Path
-from backend.services.rag_service import RAGService
+from backend.services.ingestion_jobs import get_ingestion_queue
 from backend.models.document import DocumentMetadata
+from backend.utils.concurrency import run_blocking
+# Only extensions the ingestion job can extract, so unsupported uploads are rejected before a job is queued
+from backend.utils.extractors import SUPPORTED_EXTENSIONS
 import uuid
 from typing import List
 import json
@@ -13,7 +16,8 @@ router = APIRouter()
 UPLOAD_DIR = Path("/tmp/ai_uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-SUPPORTED_EXTENSIONS = {'.pdf', '.txt', '.docx', '.csv', '.xlsx', '.jpg', '.jpeg'}
+# Uploads are copied to disk in pieces of this size instead of being read whole
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
 
 # Predefined categories and locations for dropdowns
 CATEGORIES = [
@@ -107,22 +111,40 @@ async def upload_file(
         description=description
     )
     
-    # Save file to temp directory
+    # Stream the upload to the temp directory without holding it in memory
     temp_path = UPLOAD_DIR / f"{uuid.uuid4().hex}{ext}"
-    with open(temp_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    # Ingest file using RAGService with metadata
-    rag_service = RAGService()
     try:
-        from backend.utils.ingest_documents import ingest_document
-        doc_id = ingest_document(str(temp_path), metadata.model_dump())
-        return {
-            "status": "success", 
-            "filename": file.filename, 
-            "doc_id": doc_id,
-            "metadata": metadata.model_dump()
-        }
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_blocking(f.write, chunk)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"status": "error", "detail": str(e)}) 
\ No newline at end of file
+        temp_path.unlink(missing_ok=True)
+        return JSONResponse(status_code=500, content={"status": "error", "detail": str(e)})
+    finally:
+        await file.close()
+    
+    # Extraction, embedding and insertion run in the ingestion worker pool
+    job = get_ingestion_queue().submit(str(temp_path), metadata.model_dump(), filename=file.filename)
+    return JSONResponse(status_code=202, content={
+        "status": "queued",
+        "job_id": job["job_id"],
+        "status_url": f"/api/upload/jobs/{job['job_id']}",
+        "filename": file.filename,
+        "metadata": metadata.model_dump(mode="json")
+    })
+
+@router.get("/upload/jobs")
+async def list_upload_jobs(limit: int = 50):
+    """List recent ingestion jobs, newest first."""
+    return {"jobs": get_ingestion_queue().list_jobs(limit)}
+
+@router.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Get status and progress of an ingestion job."""
+    job = get_ingestion_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
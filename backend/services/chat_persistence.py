@@ -0,0 +1,251 @@
+"""
+Write-behind persistence for chat messages and session touches.
+
+Routes hand messages and updated_at touches to ChatWriteBehind, which returns
+immediately; a background thread commits everything buffered in one
+transaction once CHAT_WRITE_BATCH_SIZE operations are waiting or the oldest
+has waited CHAT_WRITE_FLUSH_MS, so a chat turn costs no commits on the
+request path and at most one fsync per batch.
+
+Messages get their timestamp when they are submitted, so history order does
+not depend on when a batch lands. Until then they are returned by
+pending_messages(), which history reads merge in (read-your-writes within the
+process). The buffer is flushed on shutdown; a batch that keeps failing is
+retried CHAT_WRITE_RETRIES times and then dropped with an error.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam
+
+from backend.database import SessionLocal
+from backend.models.chat import ChatMessage, ChatSession
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Buffer messages and session touches instead of committing them on the request path
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"
+# Longest a buffered write waits (ms) and the batch size that triggers an early flush
+CHAT_WRITE_FLUSH_MS = float(os.getenv("CHAT_WRITE_FLUSH_MS", "200"))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+CHAT_WRITE_RETRIES = int(os.getenv("CHAT_WRITE_RETRIES", "3"))
+
+
+class ChatWriteBehind:
+    """Buffers chat writes and commits them in batches from a background thread."""
+
+    def __init__(self, session_factory=SessionLocal, flush_ms: float = CHAT_WRITE_FLUSH_MS,
+                 batch_size: int = CHAT_WRITE_BATCH_SIZE, retries: int = CHAT_WRITE_RETRIES):
+        self.session_factory = session_factory
+        self.flush_seconds = flush_ms / 1000
+        self.batch_size = max(batch_size, 1)
+        self.retries = retries
+        self._messages: List[Dict[str, Any]] = []
+        self._touches: Dict[int, datetime] = {}
+        # Batch being written, still visible to pending_messages() until it commits
+        self._inflight: List[Dict[str, Any]] = []
+        # Sessions discarded while their rows were in flight; the batch skips them
+        self._discarded: Set[int] = set()
+        self._oldest_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._flush_requested = False
+        self._stopped = False
+        self.batches = 0
+        self.dropped = 0
+        self.total_flush_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    def _submit(self) -> None:
+        self._submitted += 1
+        if self._oldest_at is None:
+            # Wake the idle writer so it starts the flush_ms timer
+            self._oldest_at = time.monotonic()
+            self._cond.notify()
+        elif len(self._messages) + len(self._touches) >= self.batch_size:
+            self._cond.notify()
+
+    def save_message(self, session_id: int, role: str, content: str) -> None:
+        """Buffer a message for the session with primary key session_id."""
+        with self._cond:
+            self._messages.append({
+                "session_id": session_id,
+                "role": role,
+                "content": content,
+                "timestamp": datetime.utcnow(),
+            })
+            self._submit()
+
+    def touch_session(self, session_id: int) -> None:
+        """Buffer an updated_at bump; repeated touches of one session collapse into one update."""
+        with self._cond:
+            self._touches[session_id] = datetime.utcnow()
+            self._submit()
+
+    def pending_messages(self, session_id: int) -> List[Dict[str, Any]]:
+        """Messages for the session that may not be committed yet, oldest first."""
+        with self._cond:
+            return [dict(msg) for msg in self._inflight + self._messages if msg["session_id"] == session_id]
+
+    def discard_session(self, session_id: int, timeout: float = 5.0) -> None:
+        """
+        Drop buffered writes for a session that is being deleted.
+
+        Rows of the session in the batch being written are skipped if that
+        batch has not reached the database yet; either way this waits (up to
+        timeout) for the batch to finish, so a delete that follows removes
+        anything it did write.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._messages = [msg for msg in self._messages if msg["session_id"] != session_id]
+            self._touches.pop(session_id, None)
+            if not self._inflight:
+                return
+            self._inflight = [msg for msg in self._inflight if msg["session_id"] != session_id]
+            self._discarded.add(session_id)
+            while session_id in self._discarded:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    logger.warning(f"⚠️  Chat write batch still in flight while discarding session {session_id}")
+                    return
+                self._cond.wait(remaining)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Commit everything submitted so far; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    pending = len(self._messages) + len(self._touches)
+                    if pending and (self._stopped or self._flush_requested or pending >= self.batch_size
+                                    or time.monotonic() - self._oldest_at >= self.flush_seconds):
+                        break
+                    if not pending:
+                        # Nothing left (e.g. discarded): everything submitted is settled
+                        self._written = self._submitted
+                        self._flush_requested = False
+                        self._oldest_at = None
+                        self._cond.notify_all()
+                        if self._stopped:
+                            return
+                    timeout = self.flush_seconds - (time.monotonic() - self._oldest_at) if pending else None
+                    self._cond.wait(timeout)
+                messages, touches = self._messages, self._touches
+                self._messages, self._touches = [], {}
+                self._inflight = messages
+                self._oldest_at = None
+                self._flush_requested = False
+                submitted = self._submitted
+            self._write_batch(messages, touches)
+            with self._cond:
+                self._inflight = []
+                self._discarded.clear()
+                self._written = submitted
+                self._cond.notify_all()
+
+    def _write_batch(self, messages: List[Dict[str, Any]], touches: Dict[int, datetime]) -> None:
+        start_time = time.time()
+        for attempt in range(self.retries + 1):
+            try:
+                self._write(messages, touches)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"❌ Dropping {len(messages)} chat messages and {len(touches)} session touches "
+                                 f"after {attempt + 1} failed writes: {e}")
+                    with self._cond:
+                        self.dropped += len(messages)
+                    return
+                logger.warning(f"⚠️  Chat write batch failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+        duration = (time.time() - start_time) * 1000
+        with self._cond:
+            self.batches += 1
+            self.total_flush_ms += duration
+        logger.debug(f"💾 Wrote {len(messages)} messages and {len(touches)} session touches in {duration:.2f}ms")
+
+    def _write(self, messages: List[Dict[str, Any]], touches: Dict[int, datetime]) -> None:
+        db = self.session_factory()
+        try:
+            with self._cond:
+                discarded = set(self._discarded)
+            # Skip writes for sessions deleted since they were buffered
+            session_ids = ({msg["session_id"] for msg in messages} | set(touches)) - discarded
+            existing = {pk for (pk,) in db.query(ChatSession.id).filter(ChatSession.id.in_(session_ids))}
+            rows = [msg for msg in messages if msg["session_id"] in existing]
+            if rows:
+                db.execute(ChatMessage.__table__.insert(), rows)
+            updates = [{"pk": pk, "touched_at": touched_at} for pk, touched_at in touches.items() if pk in existing]
+            if updates:
+                sessions = ChatSession.__table__
+                db.execute(
+                    sessions.update().where(sessions.c.id == bindparam("pk")).values(updated_at=bindparam("touched_at")),
+                    updates
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending": len(self._messages) + len(self._touches),
+                "batches": self.batches,
+                "dropped_messages": self.dropped,
+                "avg_flush_ms": round(self.total_flush_ms / self.batches, 2) if self.batches else 0.0,
+            }
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Flush what is buffered and stop the writer thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("❌ Chat write-behind did not finish flushing before shutdown")
+
+
+# Global instance
+_chat_writer = None
+_chat_writer_lock = threading.Lock()
+
+def get_chat_writer() -> ChatWriteBehind:
+    """Get the global chat write-behind buffer"""
+    global _chat_writer
+    with _chat_writer_lock:
+        if _chat_writer is None:
+            _chat_writer = ChatWriteBehind()
+        return _chat_writer
+
+def shutdown_chat_writer() -> None:
+    global _chat_writer
+    with _chat_writer_lock:
+        if _chat_writer is not None:
+            _chat_writer.shutdown()
+            _chat_writer = None
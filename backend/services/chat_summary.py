@@ -0,0 +1,220 @@
+"""
+Rolling conversation summaries.
+
+Long sessions used to be cut at MAX_HISTORY_MESSAGES, so they either lost
+their early context or sent very large prompts. Instead, the history of a
+session is now:
+
+    [summary of everything older] + the messages not yet summarized
+
+The last CHAT_SUMMARY_KEEP_RECENT messages are always sent verbatim. Once
+CHAT_SUMMARY_BATCH older messages have piled up behind them, a background
+thread folds them into the stored summary (chat_summaries). It sends the
+LLM the previous summary and the new messages only, so each update costs
+the same however long the conversation gets. Summarization never runs on the
+request path; until it catches up, the unsummarized messages are simply
+sent as they are.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List
+
+from dotenv import load_dotenv
+from sqlalchemy import func, tuple_
+
+from backend.database import SessionLocal
+from backend.models.chat import ChatMessage, ChatSummary
+from backend.services.history_cache import HISTORY_CACHE_ENABLED, get_history_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHAT_SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() == "true"
+# Most recent messages that are always kept verbatim
+CHAT_SUMMARY_KEEP_RECENT = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "10"))
+# Older unsummarized messages that trigger a summary update, and the most folded in per LLM call
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "10"))
+CHAT_SUMMARY_MAX_MESSAGES = int(os.getenv("CHAT_SUMMARY_MAX_MESSAGES", "40"))
+# Target summary length given to the LLM
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "250"))
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+SUMMARY_INSTRUCTION = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages. Keep facts, names, numbers, decisions and open "
+    f"questions the assistant may need later; drop small talk. Use at most {CHAT_SUMMARY_MAX_WORDS} words "
+    "and reply with the summary only."
+)
+
+# LLMService.generate_response reports failures as text rather than raising
+LLM_ERROR_PREFIXES = ("[OpenAI API error", "[Local LLM error")
+OPENAI_RESPONSE_PREFIX = "[OPENAI] "
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """The history entry that stands in for the summarized messages"""
+    return {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+
+def build_summary_prompt(previous: str, messages: List[Dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+    return (f"Current summary:\n{previous or '(none yet)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            "Updated summary:")
+
+def llm_summarize(previous: str, messages: List[Dict[str, Any]]) -> str:
+    """Summarize with the configured LLM provider"""
+    from backend.services.llm_service import LLMService
+    text = LLMService().generate_response(build_summary_prompt(previous, messages), context=SUMMARY_INSTRUCTION)
+    if text.startswith(LLM_ERROR_PREFIXES):
+        raise RuntimeError(text)
+    if text.startswith(OPENAI_RESPONSE_PREFIX):
+        text = text[len(OPENAI_RESPONSE_PREFIX):]
+    return text.strip()
+
+
+class ChatSummarizer:
+    """Updates session summaries from a background thread, one session at a time."""
+
+    def __init__(self, session_factory=SessionLocal, summarize: Callable[[str, List[Dict[str, Any]]], str] = llm_summarize,
+                 keep_recent: int = CHAT_SUMMARY_KEEP_RECENT, batch: int = CHAT_SUMMARY_BATCH,
+                 max_messages: int = CHAT_SUMMARY_MAX_MESSAGES):
+        self.session_factory = session_factory
+        self.summarize = summarize
+        self.keep_recent = max(keep_recent, 0)
+        self.batch = max(batch, 1)
+        self.max_messages = max(max_messages, self.batch)
+        self._pending: List[int] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.updates = 0
+        self.summarized_messages = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name="chat-summarizer", daemon=True)
+        self._thread.start()
+
+    def request(self, session_id: int, unsummarized: int) -> None:
+        """
+        Queue a summary update for the session with primary key session_id.
+
+        unsummarized is the number of messages the session's history holds
+        after its summary; nothing is queued until enough of them have
+        fallen behind the verbatim window.
+        """
+        if unsummarized < self.keep_recent + self.batch:
+            return
+        with self._cond:
+            if session_id not in self._pending and not self._stopped:
+                self._pending.append(session_id)
+                self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                session_id = self._pending.pop(0)
+            try:
+                more = self._update(session_id)
+            except Exception as e:
+                with self._cond:
+                    self.failures += 1
+                logger.error(f"❌ Summary update failed for session {session_id}: {e}")
+                continue
+            if more:
+                # Sessions with a long backlog are caught up one bounded pass at a time
+                self.request(session_id, self.keep_recent + self.batch)
+
+    def _update(self, session_id: int) -> bool:
+        """Fold the next batch of older messages into the summary; True if a backlog remains"""
+        db = self.session_factory()
+        try:
+            record = db.query(ChatSummary).filter(ChatSummary.session_id == session_id).first()
+            previous = record.summary if record else ""
+            query = (db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+                     .filter(ChatMessage.session_id == session_id))
+            if record:
+                query = query.filter(tuple_(ChatMessage.timestamp, ChatMessage.id) >
+                                     (record.summarized_until, record.summarized_message_id))
+            # Enough to fold one full pass and still see the verbatim window behind it
+            messages = (query.order_by(ChatMessage.timestamp, ChatMessage.id)
+                        .limit(self.max_messages + self.keep_recent).all())
+        finally:
+            db.close()
+        folded = messages[:min(self.max_messages, len(messages) - self.keep_recent)]
+        if len(folded) < self.batch:
+            return False
+
+        # No connection is held while the LLM writes the summary
+        summary = self.summarize(previous, [{"role": role, "content": content} for _, role, content, _ in folded])
+
+        db = self.session_factory()
+        try:
+            record = db.query(ChatSummary).filter(ChatSummary.session_id == session_id).first()
+            if record is None:
+                record = ChatSummary(session_id=session_id, summarized_messages=0)
+                db.add(record)
+            record.summary = summary
+            record.summarized_until = folded[-1].timestamp
+            record.summarized_message_id = folded[-1].id
+            record.summarized_messages = (record.summarized_messages or 0) + len(folded)
+            # Messages still unsummarized, counted rather than read, decide whether another pass is due
+            remaining = (db.query(func.count(ChatMessage.id))
+                         .filter(ChatMessage.session_id == session_id,
+                                 tuple_(ChatMessage.timestamp, ChatMessage.id) > (folded[-1].timestamp, folded[-1].id))
+                         .scalar())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._cond:
+            self.updates += 1
+            self.summarized_messages += len(folded)
+        logger.info(f"📝 Summarized {len(folded)} older messages of session {session_id}")
+        if HISTORY_CACHE_ENABLED:
+            # The cached window still holds the messages that are now summarized
+            get_history_cache().invalidate(pk=session_id)
+        return remaining - self.keep_recent >= self.batch
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "updates": self.updates,
+                "summarized_messages": self.summarized_messages,
+                "failures": self.failures,
+            }
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop after the update in progress; queued updates run on a later request"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+# Global instance
+_chat_summarizer = None
+_chat_summarizer_lock = threading.Lock()
+
+def get_chat_summarizer() -> ChatSummarizer:
+    """Get the global conversation summarizer"""
+    global _chat_summarizer
+    with _chat_summarizer_lock:
+        if _chat_summarizer is None:
+            _chat_summarizer = ChatSummarizer()
+        return _chat_summarizer
+
+def shutdown_chat_summarizer() -> None:
+    global _chat_summarizer
+    with _chat_summarizer_lock:
+        if _chat_summarizer is not None:
+            _chat_summarizer.shutdown()
+            _chat_summarizer = None
@@ -15,6 +15,8 @@ from sqlalchemy.exc import SQLAlchemyError
 import json
 import time
 
+from backend.utils.schema_cache import get_schema_cache, register_ddl_invalidation
+
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
@@ -57,6 +59,7 @@ class DatabaseService:
         }
         
         self._connect()
+        register_ddl_invalidation(self.engine)
     
     def _connect(self):
         """Establish database connection."""
@@ -98,34 +101,7 @@ class DatabaseService:
             Dictionary containing tables, columns, and their types
         """
         try:
-            inspector = inspect(self.engine)
-            schema = {
-                'tables': {},
-                'database_type': self.db_type
-            }
-            
-            for table_name in inspector.get_table_names():
-                columns = []
-                for column in inspector.get_columns(table_name):
-                    columns.append({
-                        'name': column['name'],
-                        'type': str(column['type']),
-                        'nullable': column.get('nullable', True),
-                        'default': column.get('default', None)
-                    })
-                
-                # Get primary keys
-                primary_keys = inspector.get_pk_constraint(table_name)
-                
-                # Get foreign keys
-                foreign_keys = inspector.get_foreign_keys(table_name)
-                
-                schema['tables'][table_name] = {
-                    'columns': columns,
-                    'primary_keys': primary_keys.get('constrained_columns', []),
-                    'foreign_keys': foreign_keys
-                }
-            
+            schema = get_schema_cache().get(("database_service_schema", str(self.engine.url)), self._load_database_schema)
             logger.info(f"📊 Retrieved schema for {len(schema['tables'])} tables")
             return schema
             
@@ -133,6 +109,38 @@ class DatabaseService:
             logger.error(f"❌ Failed to get database schema: {e}")
             return {'error': str(e)}
     
+    def _load_database_schema(self) -> Dict[str, Any]:
+        """Reflect tables, columns and keys (uncached)."""
+        inspector = inspect(self.engine)
+        schema = {
+            'tables': {},
+            'database_type': self.db_type
+        }
+        
+        for table_name in inspector.get_table_names():
+            columns = []
+            for column in inspector.get_columns(table_name):
+                columns.append({
+                    'name': column['name'],
+                    'type': str(column['type']),
+                    'nullable': column.get('nullable', True),
+                    'default': column.get('default', None)
+                })
+            
+            # Get primary keys
+            primary_keys = inspector.get_pk_constraint(table_name)
+            
+            # Get foreign keys
+            foreign_keys = inspector.get_foreign_keys(table_name)
+            
+            schema['tables'][table_name] = {
+                'columns': columns,
+                'primary_keys': primary_keys.get('constrained_columns', []),
+                'foreign_keys': foreign_keys
+            }
+        
+        return schema
+    
     def execute_query(self, query: str, params: Dict = None) -> Dict[str, Any]:
         """
         Execute a SQL query and return results.
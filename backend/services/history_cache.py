@@ -0,0 +1,234 @@
+"""
+Hot-session cache for chat turns.
+
+Each turn used to look up the session row by its public session_id and read
+the recent history back from Postgres, although the same worker had written
+those messages moments earlier. HistoryCache keeps, per active session:
+
+    session:<session_id>  - the session's primary key
+    history:<pk>          - the last MAX_HISTORY_MESSAGES messages (role/content)
+
+save_message appends to a cached window (write-through), trimming it to the
+newest messages but keeping a leading conversation summary, and delete_session
+invalidates both entries. A window is filled from the database only on a
+miss, and only if no message was appended to the session while it was being
+read, so a slow fill never overwrites a newer window.
+
+HISTORY_CACHE_BACKEND=memory keeps entries in an in-process TTLLRUCache.
+With several workers, set it to redis (REDIS_URL) so all workers share one
+cache and see each other's appends and invalidations. When the redis package
+or server is unavailable the memory backend is used instead.
+"""
+
+import json
+import logging
+import os
+import threading
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.utils.lru_cache import TTLLRUCache
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_ENABLED = os.getenv("HISTORY_CACHE_ENABLED", "true").lower() == "true"
+# Sessions kept and seconds an idle session stays cached
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1000"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "1800"))
+# "memory" (per worker) or "redis" (shared between workers)
+HISTORY_CACHE_BACKEND = os.getenv("HISTORY_CACHE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+HISTORY_CACHE_PREFIX = os.getenv("HISTORY_CACHE_PREFIX", "chat:")
+
+
+def trim_window(messages: List[Dict[str, Any]], window: int) -> List[Dict[str, Any]]:
+    """Keep the last window messages, plus a leading summary (system) entry"""
+    head = messages[:1] if messages and messages[0].get("role") == "system" else []
+    return head + messages[len(head):][-window:]
+
+
+class HistoryCache:
+    """In-process cache of session ids and recent history windows."""
+
+    shared = False
+
+    def __init__(self, max_size: int = HISTORY_CACHE_SIZE, ttl_seconds: float = HISTORY_CACHE_TTL):
+        self.sessions = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds, name="history_sessions")
+        self.windows = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds, name="history_windows")
+        # Per-session append counter; a fill is stored only if it has not moved
+        self.versions = TTLLRUCache(max_size=max_size * 2, ttl_seconds=ttl_seconds, name="history_versions")
+        self._sequence = count(1)
+        self._lock = threading.Lock()
+
+    def get_session_pk(self, session_id: str) -> Optional[int]:
+        return self.sessions.get(session_id)
+
+    def put_session_pk(self, session_id: str, pk: int) -> None:
+        self.sessions.put(session_id, pk)
+
+    def version(self, pk: int) -> int:
+        """Token to pass to fill_history, taken before reading the window from the database"""
+        return self.versions.get(pk, 0)
+
+    def get_history(self, pk: int) -> Optional[List[Dict[str, Any]]]:
+        window = self.windows.get(pk)
+        return list(window) if window is not None else None
+
+    def fill_history(self, pk: int, messages: List[Dict[str, Any]], version: int) -> bool:
+        """Cache a window read from the database unless a message was appended meanwhile"""
+        with self._lock:
+            if self.versions.get(pk, 0) != version:
+                return False
+            self.windows.put(pk, list(messages))
+            return True
+
+    def append(self, pk: int, message: Dict[str, Any], window: int) -> None:
+        """Write-through: add a saved message to the cached window, keeping the last window messages"""
+        with self._lock:
+            self.versions.put(pk, next(self._sequence))
+            cached = self.windows.get(pk)
+            if cached is not None:
+                self.windows.put(pk, trim_window(cached + [message], window))
+
+    def invalidate(self, session_id: Optional[str] = None, pk: Optional[int] = None) -> None:
+        with self._lock:
+            if session_id is not None:
+                self.sessions.pop(session_id)
+            if pk is not None:
+                self.windows.pop(pk)
+                self.versions.put(pk, next(self._sequence))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "sessions": self.sessions.stats(), "windows": self.windows.stats()}
+
+
+class RedisHistoryCache:
+    """HistoryCache shared between workers through Redis; windows are stored as JSON."""
+
+    # Calls go over the network, so callers run them off the event loop
+    shared = True
+
+    def __init__(self, client, ttl_seconds: float = HISTORY_CACHE_TTL, prefix: str = HISTORY_CACHE_PREFIX):
+        self.client = client
+        self.ttl = max(int(ttl_seconds), 1)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, kind: str, key: Any) -> str:
+        return f"{self.prefix}{kind}:{key}"
+
+    def _call(self, default, fn, *args):
+        # A Redis outage only costs cache misses, never a failed chat turn
+        try:
+            return fn(*args)
+        except redis.RedisError as e:
+            self.errors += 1
+            logger.warning(f"⚠️  History cache unavailable: {e}")
+            return default
+
+    def _lookup(self, key: str) -> Optional[str]:
+        value = self._call(None, self.client.get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_session_pk(self, session_id: str) -> Optional[int]:
+        value = self._lookup(self._key("session", session_id))
+        return int(value) if value is not None else None
+
+    def put_session_pk(self, session_id: str, pk: int) -> None:
+        self._call(None, self.client.set, self._key("session", session_id), pk, self.ttl)
+
+    def version(self, pk: int) -> int:
+        value = self._call(None, self.client.get, self._key("version", pk))
+        return int(value) if value is not None else 0
+
+    def get_history(self, pk: int) -> Optional[List[Dict[str, Any]]]:
+        value = self._lookup(self._key("history", pk))
+        return json.loads(value) if value is not None else None
+
+    def fill_history(self, pk: int, messages: List[Dict[str, Any]], version: int) -> bool:
+        version_key = self._key("version", pk)
+        payload = json.dumps(messages)
+
+        def fill(pipe) -> bool:
+            current = pipe.get(version_key)
+            if (int(current) if current is not None else 0) != version:
+                return False
+            pipe.multi()
+            pipe.set(self._key("history", pk), payload, ex=self.ttl)
+            return True
+
+        return self._call(False, lambda: self.client.transaction(fill, version_key, value_from_callable=True))
+
+    def append(self, pk: int, message: Dict[str, Any], window: int) -> None:
+        history_key = self._key("history", pk)
+        version_key = self._key("version", pk)
+
+        def append(pipe) -> None:
+            cached = pipe.get(history_key)
+            pipe.multi()
+            pipe.incr(version_key)
+            pipe.expire(version_key, self.ttl * 2)
+            if cached is not None:
+                pipe.set(history_key, json.dumps(trim_window(json.loads(cached) + [message], window)), ex=self.ttl)
+
+        self._call(None, lambda: self.client.transaction(append, history_key))
+
+    def invalidate(self, session_id: Optional[str] = None, pk: Optional[int] = None) -> None:
+        pipe = self.client.pipeline()
+        if session_id is not None:
+            pipe.delete(self._key("session", session_id))
+        if pk is not None:
+            pipe.delete(self._key("history", pk))
+            pipe.incr(self._key("version", pk))
+            pipe.expire(self._key("version", pk), self.ttl * 2)
+        self._call(None, pipe.execute)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global instance
+_history_cache = None
+_history_cache_lock = threading.Lock()
+
+def get_history_cache():
+    """Get the global history cache (Redis-backed when configured and reachable)"""
+    global _history_cache
+    with _history_cache_lock:
+        if _history_cache is None:
+            if HISTORY_CACHE_BACKEND == "redis" and REDIS_AVAILABLE:
+                try:
+                    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+                    client.ping()
+                    _history_cache = RedisHistoryCache(client)
+                    logger.info(f"✅ History cache using Redis at {REDIS_URL}")
+                except Exception as e:
+                    logger.warning(f"⚠️  Redis history cache unavailable, using in-process cache: {e}")
+            elif HISTORY_CACHE_BACKEND == "redis":
+                logger.warning("⚠️  redis package not available, using in-process history cache")
+            if _history_cache is None:
+                _history_cache = HistoryCache()
+        return _history_cache
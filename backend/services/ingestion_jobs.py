@@ -0,0 +1,173 @@
+"""
+Background ingestion jobs for uploaded documents.
+
+/api/upload only streams the file to disk and submits a job; a small worker
+pool (separate from the request pool, so long PDFs never starve chat) does
+text extraction, embedding and insertion. Job state lives in memory and is
+reported by GET /api/upload/jobs/{job_id}.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of documents ingested at once per worker process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Finished jobs kept for status queries (oldest are forgotten first)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Share of overall progress given to each stage
+_STAGE_WEIGHTS = {"extracting": (0.0, 0.1), "embedding": (0.1, 0.85), "inserting": (0.85, 1.0)}
+
+
+class IngestionJobQueue:
+    """Runs document ingestion in a bounded worker pool and tracks job status."""
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, history: int = INGEST_JOB_HISTORY):
+        self.max_workers = max_workers
+        self.history = history
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            logger.info(f"📥 Starting ingestion worker pool with {self.max_workers} threads")
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest")
+        return self._executor
+
+    def submit(self, file_path: str, metadata: Dict[str, Any] = None, filename: str = None) -> Dict[str, Any]:
+        """Queue a file already on disk for ingestion and return its job record."""
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "stage": None,
+            "progress": 0.0,
+            "filename": filename or os.path.basename(file_path),
+            "doc_id": None,
+            "chunks": None,
+            "changes": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+        future = self._get_executor().submit(self._run, job_id, file_path, metadata)
+        future.add_done_callback(functools.partial(self._dropped, job_id, file_path))
+        logger.info(f"📥 Queued ingestion job {job_id} for {job['filename']}")
+        return dict(job)
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond the history limit. Caller holds the lock."""
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job["status"] in (JOB_COMPLETED, JOB_FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _report(self, job_id: str, stage: str, done: int, total: int):
+        start, end = _STAGE_WEIGHTS[stage]
+        fraction = done / total if total else 1.0
+        self._update(job_id, stage=stage, progress=round(start + (end - start) * fraction, 3))
+
+    @staticmethod
+    def _remove_upload(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _dropped(self, job_id: str, file_path: str, future) -> None:
+        """Fail a job cancelled before it started (pool shut down) and remove its upload."""
+        if not future.cancelled():
+            return
+        logger.warning(f"⚠️ Ingestion job {job_id} was dropped before it started")
+        self._update(job_id, status=JOB_FAILED, error="Ingestion was shut down before the job started; upload the file again",
+                     finished_at=time.time())
+        self._remove_upload(file_path)
+
+    def _run(self, job_id: str, file_path: str, metadata: Optional[Dict[str, Any]]):
+        from backend.services.rag_service import RAGService
+        from backend.utils.ingest_documents import prepare_document
+
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+        try:
+            self._report(job_id, "extracting", 0, 1)
+            document = prepare_document(file_path, metadata)
+            self._update(job_id, doc_id=document["document_id"])
+            self._report(job_id, "extracting", 1, 1)
+
+            stats = RAGService().add_documents(
+                [document],
+                progress=lambda stage, done, total: self._report(job_id, stage, done, total)
+            )
+            if stats.get("failed_chunks"):
+                raise RuntimeError(f"{stats['failed_chunks']} chunk(s) failed to insert; upload the file again to retry")
+            self._update(job_id, status=JOB_COMPLETED, stage=None, progress=1.0,
+                         chunks=stats["total_chunks"], finished_at=time.time(),
+                         changes={key: stats[key] for key in ("inserted_chunks", "replaced_chunks", "deleted_chunks", "unchanged_chunks")})
+            logger.info(f"✅ Ingestion job {job_id} finished: {stats['total_chunks']} chunks ({stats['chunks_per_sec']:.1f} chunks/sec)")
+        except Exception as e:
+            logger.error(f"❌ Ingestion job {job_id} failed: {e}")
+            self._update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+        finally:
+            self._remove_upload(file_path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        with self._lock:
+            return [dict(job) for job in reversed(list(self._jobs.values()))][:limit]
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the worker pool; queued jobs that have not started are failed and their uploads removed."""
+        if self._executor is not None:
+            logger.info("📥 Shutting down ingestion worker pool")
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+_ingestion_queue = None
+
+def get_ingestion_queue() -> IngestionJobQueue:
+    """Get the global ingestion job queue"""
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        _ingestion_queue = IngestionJobQueue()
+    return _ingestion_queue
+
+def shutdown_ingestion_queue(wait: bool = False) -> None:
+    if _ingestion_queue is not None:
+        _ingestion_queue.shutdown(wait=wait)
@@ -5,7 +5,7 @@ Replaces the manual pattern matching with AI-powered query generation
 
 import logging
 import asyncio
-import signal
+import os
 import re
 import time
 from typing import Dict, Any, Optional
@@ -16,14 +16,49 @@ from langchain.agents.agent_types import AgentType
 from langchain_community.callbacks.manager import get_openai_callback
 from langchain.llms.base import LLM
 from langchain_core.language_models.llms import LLMResult
+from langchain_core.callbacks import BaseCallbackHandler
 from sqlalchemy import text
 
-from backend.database import engine
+from backend.database import agent_engine, engine
 from backend.services.llm_service import LLMService
 from backend.utils.sql_context_builder import get_sql_context_builder
+from backend.services.sql_semantic_cache import SQLSemanticCache, SQL_CACHE_ENABLED, register_write_invalidation
+from backend.utils.schema_cache import get_schema_cache
+from backend.utils.deadline import Deadline, DeadlineExceeded, check_deadline, deadline_scope, get_current_deadline
 
 logger = logging.getLogger(__name__)
 
+# Per-request time budgets (seconds) for simple and complex natural-language queries
+SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "30"))
+SQL_COMPLEX_QUERY_TIMEOUT = float(os.getenv("SQL_COMPLEX_QUERY_TIMEOUT", "90"))
+
+class DeadlineCallbackHandler(BaseCallbackHandler):
+    """Stops the SQL agent between steps once the request deadline has passed"""
+    
+    raise_error = True
+    
+    def __init__(self, deadline: Deadline):
+        super().__init__()
+        self.deadline = deadline
+    
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.deadline.check("LLM call")
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.deadline.check("tool call")
+    
+    def on_agent_action(self, action, **kwargs):
+        self.deadline.check("agent step")
+
+def execute_sql(conn, sql_query: str):
+    """Execute SQL with a Postgres statement_timeout bounded by the active deadline"""
+    deadline = get_current_deadline()
+    if deadline is not None:
+        deadline.check("SQL execution")
+        # SET LOCAL only lasts for the current transaction, so pooled connections are unaffected
+        conn.execute(text(f"SET LOCAL statement_timeout = {max(deadline.remaining_ms(), 1)}"))
+    return conn.execute(text(sql_query))
+
 class LLMServiceWrapper(LLM):
     """Wrapper to make our LLMService compatible with LangChain"""
     
@@ -39,6 +74,7 @@ class LLMServiceWrapper(LLM):
     
     def _call(self, prompt: str, stop: Optional[list] = None, **kwargs) -> str:
         """Synchronous call method for LangChain compatibility"""
+        check_deadline("LLM call")
         try:
             # Extract the user query from the LangChain prompt
             user_query = self._extract_user_query(prompt)
@@ -61,6 +97,7 @@ class LLMServiceWrapper(LLM):
     
     async def _acall(self, prompt: str, stop: Optional[list] = None, **kwargs) -> str:
         """Async call method for LangChain compatibility"""
+        check_deadline("LLM call")
         try:
             # Extract the user query from the LangChain prompt
             user_query = self._extract_user_query(prompt)
@@ -174,7 +211,7 @@ class LLMServiceWrapper(LLM):
         try:
             # Generate a simple SQL agent response based on the question
             if "revenue" in question.lower() or "total" in question.lower():
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT SUM(total) as total_revenue FROM orders"))
                     total_revenue = result.fetchone()[0] or 0
                 
@@ -186,7 +223,7 @@ Thought: I now know the final answer.
 Final Answer: The total revenue from the orders is ${total_revenue:,.2f}."""
             
             elif "customer" in question.lower():
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT COUNT(*) as customer_count FROM customers"))
                     customer_count = result.fetchone()[0] or 0
                 
@@ -198,7 +235,7 @@ Thought: I now know the final answer.
 Final Answer: There are {customer_count} customers in the database."""
             
             elif "order" in question.lower():
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT COUNT(*) as order_count FROM orders"))
                     order_count = result.fetchone()[0] or 0
                 
@@ -234,13 +271,64 @@ class LangChainSQLService:
         self.llm_service = LLMService()
         self.db = None
         self.agent = None
+        self.sql_cache = SQLSemanticCache(embed_fn=self._embed_question)
+        if SQL_CACHE_ENABLED:
+            # App writes (orders, inventory) go through the main engine, agent SQL through its own
+            for write_engine in (engine, agent_engine):
+                register_write_invalidation(write_engine, self.sql_cache)
         self._initialize_agent()
     
+    def _embed_question(self, question: str):
+        """Embed a question with the RAG service's model, if it has been loaded"""
+        # Imported lazily: rag_service imports this module
+        from backend.services import rag_service as rag_module
+        instance = rag_module._rag_service_instance
+        if instance is None or not getattr(instance, 'embedding_model', None):
+            return None
+        return instance.embed_query(question)
+    
+    def _lookup_cached_query(self, query: str) -> Optional[Dict[str, Any]]:
+        """Answer from the semantic cache, re-executing cached SQL for paraphrases"""
+        cached = self.sql_cache.lookup(query)
+        if not cached:
+            return None
+        
+        if cached['match'] == 'exact':
+            logger.info(f"♻️  SQL cache exact hit for: '{query[:50]}...'")
+            result = dict(cached['result'])
+        else:
+            logger.info(f"♻️  SQL cache semantic hit ({cached['similarity']:.3f}) - re-executing SQL from: '{cached['cached_question'][:50]}...'")
+            sql_query = cached['sql_query']
+            try:
+                response = self._enhance_response_with_sql_execution(
+                    query, "Answered with the SQL query used for a similar question.", sql_query, raise_errors=True
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                # Stale SQL (e.g. a schema change): forget it and let the agent answer
+                logger.warning(f"⚠️  Cached SQL failed, evicting entry for '{cached['cached_question'][:50]}...': {e}")
+                self.sql_cache.discard(cached['cached_question'])
+                return None
+            result = {
+                'success': True,
+                'query': query,
+                'response': response,
+                'sql_query': sql_query,
+                'sql_generated': True,
+                'processing_approach': 'semantic_cache',
+                'enhanced_with_results': True
+            }
+        result['query'] = query
+        result['cache_hit'] = cached['match']
+        result['cache_similarity'] = cached['similarity']
+        return result
+    
     def _initialize_agent(self):
         """Initialize the LangChain SQL Agent"""
         try:
             # Create SQLDatabase from existing engine
-            self.db = SQLDatabase(engine)
+            self.db = SQLDatabase(agent_engine)
             
             # Create LangChain-compatible LLM wrapper
             langchain_llm = LLMServiceWrapper(self.llm_service)
@@ -357,12 +445,14 @@ class LangChainSQLService:
         
         return any(pattern in query_lower for pattern in simple_patterns)
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    def process_query(self, query: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         Process a natural language query using adaptive SQL processing.
         
         Args:
             query: Natural language query
+            deadline: Optional caller-owned deadline; cancelling it stops the agent,
+                direct SQL generation and SQL execution at their next checkpoint
             
         Returns:
             Dict containing processed results or None if not a database query
@@ -379,14 +469,38 @@ class LangChainSQLService:
             complexity_analysis = self._analyze_query_complexity(query)
             logger.info(f"📊 Query complexity: {complexity_analysis['level']} (score: {complexity_analysis['score']})")
             
-            # Route to appropriate processing method
-            if complexity_analysis['level'] in ['high', 'ultra-high']:
-                logger.info(f"🧠 Using enhanced processing for complex query")
-                return self._process_complex_query(query, complexity_analysis)
+            is_complex = complexity_analysis['level'] in ['high', 'ultra-high']
+            timeout = SQL_COMPLEX_QUERY_TIMEOUT if is_complex else SQL_QUERY_TIMEOUT
+            if deadline is None:
+                deadline = Deadline(timeout, name="SQL query")
             else:
-                logger.info(f"⚡ Using standard processing for simple query")
-                return self._process_simple_query(query)
+                deadline = deadline.child(timeout)
+            
+            with deadline_scope(deadline):
+                if SQL_CACHE_ENABLED:
+                    cached_result = self._lookup_cached_query(query)
+                    if cached_result is not None:
+                        return cached_result
                 
+                # Route to appropriate processing method
+                if is_complex:
+                    logger.info(f"🧠 Using enhanced processing for complex query")
+                    result = self._process_complex_query(query, complexity_analysis)
+                else:
+                    logger.info(f"⚡ Using standard processing for simple query")
+                    result = self._process_simple_query(query)
+            
+            if SQL_CACHE_ENABLED and result and result.get('success') and result.get('sql_query'):
+                self.sql_cache.store(query, result['sql_query'], result)
+            return result
+                
+        except DeadlineExceeded as e:
+            logger.error(f"⏰ {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': query
+            }
         except Exception as e:
             logger.error(f"❌ Error processing query: {e}")
             return {
@@ -452,20 +566,17 @@ class LangChainSQLService:
             
             logger.info(f"🔍 Processing simple query with LangChain: '{query}'")
             
-            # Add timeout to prevent hanging
-            def timeout_handler(signum, frame):
-                raise TimeoutError("LangChain SQL Agent timed out")
-            
-            # Set timeout to 30 seconds for simple queries
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(30)
+            # Bound the agent by the request deadline; checked between agent steps
+            deadline = get_current_deadline() or Deadline(SQL_QUERY_TIMEOUT, name="SQL query")
             
             try:
+                deadline.check("agent start")
                 # Use LangChain SQL Agent to process the query with intermediate steps
-                with get_openai_callback() as cb:
-                    result = self.agent.invoke({"input": query})
-                
-                signal.alarm(0)  # Cancel the alarm
+                with deadline_scope(deadline), get_openai_callback() as cb:
+                    result = self.agent.invoke(
+                        {"input": query},
+                        config={"callbacks": [DeadlineCallbackHandler(deadline)]}
+                    )
                 
                 # Extract the final response
                 response = result.get('output', 'No response')
@@ -512,16 +623,14 @@ class LangChainSQLService:
                     }
                 }
                 
-            except TimeoutError:
-                signal.alarm(0)  # Cancel the alarm
-                logger.error("⏰ LangChain SQL Agent timed out")
+            except DeadlineExceeded as e:
+                logger.error(f"⏰ LangChain SQL Agent stopped: {e}")
                 return {
                     'success': False,
-                    'error': 'SQL Agent timed out after 30 seconds',
+                    'error': f'SQL Agent {e}',
                     'query': query
                 }
             except Exception as agent_error:
-                signal.alarm(0)  # Cancel the alarm
                 logger.error(f"❌ LangChain SQL Agent error: {agent_error}")
                 
                 # Try to extract SQL from the error response
@@ -631,10 +740,12 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             from backend.services.llm_service import LLMService
             llm_service = LLMService()
             
+            check_deadline("direct SQL generation")
             sql_response = llm_service.generate_response(
                 prompt=prompt,
                 context="You are a SQL expert. Generate only the SQL query."
             )
+            check_deadline("direct SQL generation")
             
             # Clean up the response
             sql_query = sql_response.strip()
@@ -886,8 +997,13 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             logger.warning(f"Error formatting cell value: {e}")
             return str(cell_value) if cell_value is not None else "NULL"
 
-    def _enhance_response_with_sql_execution(self, query: str, response: str, sql_query: str) -> str:
-        """Enhance the response by executing the SQL query and including actual results"""
+    def _enhance_response_with_sql_execution(self, query: str, response: str, sql_query: str,
+                                             raise_errors: bool = False) -> str:
+        """Enhance the response by executing the SQL query and including actual results
+        
+        Execution errors are logged and the response returned unchanged, unless
+        raise_errors is set (the caller needs to know the SQL did not run).
+        """
         try:
             if not sql_query:
                 logger.info("No SQL query provided for execution")
@@ -896,8 +1012,8 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             logger.info(f"Executing SQL query: {sql_query[:100]}...")
             
             # Execute the SQL and get results
-            with engine.connect() as conn:
-                result = conn.execute(text(sql_query))
+            with agent_engine.connect() as conn:
+                result = execute_sql(conn, sql_query)
                 rows = result.fetchall()
                 columns = result.keys()
                 
@@ -927,7 +1043,11 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             return response
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
+            if raise_errors:
+                raise
             logger.warning(f"Could not execute SQL and enhance response: {e}")
             return response
 
@@ -942,8 +1062,8 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
                     sql = sql_match.group(1).strip()
                     
                     # Execute the SQL and get results
-                    with engine.connect() as conn:
-                        result = conn.execute(text(sql))
+                    with agent_engine.connect() as conn:
+                        result = execute_sql(conn, sql)
                         rows = result.fetchall()
                         columns = result.keys()
                         
@@ -976,7 +1096,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             # Customer count queries
             if re.search(r"how many.*customer(s)?", query_lower) or ("how many" in query_lower and ("customer" in query_lower or "customers" in query_lower)):
                 sql_query = "SELECT COUNT(*) as count FROM customers"
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text(sql_query))
                     count = result.fetchone()[0]
                 return {
@@ -991,7 +1111,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             # Order count queries
             elif "how many orders" in query_lower or "count of orders" in query_lower or "number of orders" in query_lower:
                 sql_query = "SELECT COUNT(*) as count FROM orders"
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text(sql_query))
                     count = result.fetchone()[0]
                 return {
@@ -1005,7 +1125,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Product count queries
             elif "how many products" in query_lower or "count of products" in query_lower or "number of products" in query_lower:
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT COUNT(*) as count FROM products"))
                     count = result.fetchone()[0]
                 return {
@@ -1024,7 +1144,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
                 or "revenue from orders" in query_lower
             ):
                 sql_query = "SELECT SUM(total) as total FROM orders"
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text(sql_query))
                     total = result.fetchone()[0] or 0
                 return {
@@ -1038,7 +1158,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Average order queries
             elif "average order" in query_lower or "avg order" in query_lower or "mean order" in query_lower:
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT AVG(total) as avg FROM orders"))
                     avg = result.fetchone()[0] or 0
                 return {
@@ -1051,7 +1171,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Average product price queries
             elif any(phrase in query_lower for phrase in ["average price", "avg price", "mean price"]) and any(phrase in query_lower for phrase in ["product", "products"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT AVG(price) as avg FROM products"))
                     avg = result.fetchone()[0] or 0
                 return {
@@ -1064,7 +1184,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Best selling product queries
             elif any(phrase in query_lower for phrase in ["best selling product", "top selling product", "most popular product", "highest selling product", "product with most sales", "best performing product"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT p.name, p.price, c.name as category_name, COUNT(oi.id) as sales_count, SUM(oi.quantity) as total_quantity
                         FROM products p
@@ -1095,7 +1215,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Top customer queries
             elif any(phrase in query_lower for phrase in ["top customer", "best customer", "customer with most orders", "biggest customer", "customer who spent the most", "highest spending customer"]) or "top 5 customers" in query_lower:
-                    with engine.connect() as conn:
+                    with agent_engine.connect() as conn:
                         result = conn.execute(text("""
                             SELECT c.first_name, c.last_name, c.email, COUNT(o.id) as order_count, SUM(o.total) as total_spent
                             FROM customers c
@@ -1155,7 +1275,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Largest order queries
             elif any(phrase in query_lower for phrase in ["largest order", "biggest order", "highest order", "order with highest total", "most expensive order"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT o.id, o.total, o.order_date, c.first_name, c.last_name
                         FROM orders o
@@ -1184,7 +1304,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Most expensive product queries
             elif any(phrase in query_lower for phrase in ["most expensive product", "highest priced product", "product with highest price"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT p.name, p.price, c.name as category_name
                         FROM products p
@@ -1213,7 +1333,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Cheapest product queries
             elif any(phrase in query_lower for phrase in ["cheapest product", "lowest priced product", "product with lowest price"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT p.name, p.price, c.name as category_name
                         FROM products p
@@ -1260,7 +1380,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
                     order_by = "p.name ASC"
                     product_type = "products"
                 
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     if "best selling" in product_type:
                         # For best selling, we need to join with order_items
                         result = conn.execute(text(f"""
@@ -1296,7 +1416,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # List products queries
             elif "list all products" in query_lower or "show all products" in query_lower:
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT p.name, p.price, c.name as category_name
                         FROM products p
@@ -1315,7 +1435,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # List customers queries
             elif "list all customers" in query_lower or "show all customers" in query_lower:
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("SELECT first_name, last_name, email FROM customers LIMIT 10"))
                     customers = result.fetchall()
                 customer_list = "\n".join([f"- {c[0]} {c[1]} ({c[2]})" for c in customers])
@@ -1329,7 +1449,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Products by category queries
             elif "products by category" in query_lower or "category breakdown" in query_lower:
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT c.name as category_name, COUNT(p.id) as product_count, AVG(p.price) as avg_price
                         FROM categories c
@@ -1349,7 +1469,7 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             
             # Recent orders queries
             elif any(phrase in query_lower for phrase in ["recent orders", "latest orders", "newest orders"]):
-                with engine.connect() as conn:
+                with agent_engine.connect() as conn:
                     result = conn.execute(text("""
                         SELECT o.id, o.total, o.order_date, c.first_name, c.last_name
                         FROM orders o
@@ -1391,14 +1511,18 @@ Generate ONLY the SQL query without any explanation. Start with SELECT or WITH i
             if not self.db:
                 return {'error': 'Database not initialized'}
             
-            return {
-                'tables': self.db.get_table_names(),
-                'schema': self.db.get_table_info(),
-                'sample_data': self.db.get_sample_data()
-            }
+            # Reflection plus sample SELECTs is too slow to repeat every chat turn
+            return get_schema_cache().get(("langchain_database_info", str(agent_engine.url)), self._load_database_info)
         except Exception as e:
             logger.error(f"Error getting database info: {e}")
             return {'error': str(e)}
+    
+    def _load_database_info(self) -> Dict[str, Any]:
+        return {
+            'tables': self.db.get_table_names(),
+            'schema': self.db.get_table_info(),
+            'sample_data': self.db.get_sample_data()
+        }
 
 # Global instance
 langchain_sql_service = LangChainSQLService() 
\ No newline at end of file
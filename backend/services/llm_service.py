@@ -6,8 +6,11 @@ from dotenv import load_dotenv
 from datetime import datetime
 import time
 import threading
+import asyncio
 import openai
 
+from backend.services.local_llm import LOCAL_LLM_BACKEND, format_chat_prompt, get_local_scheduler, local_scheduler_stats
+
 # Load environment variables
 load_dotenv()
 
@@ -17,9 +20,11 @@ logger = logging.getLogger(__name__)
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "local").lower()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+OPENAI_TEMPERATURE = 0.2
+OPENAI_MAX_TOKENS = 1024
 
 class LLMService:
-    """Service for interacting with the LLM model using ctransformers or OpenAI"""
+    """Service for interacting with the LLM model using llama.cpp (local) or OpenAI"""
     _instance = None
 
     def __new__(cls):
@@ -41,60 +46,149 @@ class LLMService:
                 logger.error("OPENAI_API_KEY is not set in .env!")
                 raise ValueError("OPENAI_API_KEY is required for OpenAI provider.")
             openai.api_key = OPENAI_API_KEY
+            # Streaming goes through the async client so tokens reach the SSE response as they arrive
+            self.async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
             logger.info(f"✅ Using OpenAI model: {OPENAI_MODEL}")
         elif self.provider == "local":
-            # Place your local model initialization here if needed
-            logger.info("✅ Using local LLM model (not OpenAI)")
+            # The model is loaded by the local scheduler on first use
+            logger.info(f"✅ Using local LLM model (not OpenAI), backend: {LOCAL_LLM_BACKEND}")
         else:
             logger.error(f"Unknown LLM_PROVIDER: {self.provider}")
             raise ValueError(f"Unknown LLM_PROVIDER: {self.provider}")
+        self._stats_lock = threading.Lock()
+        self.streams = 0
+        self.streams_cancelled = 0
+        self.streams_failed = 0
+        self.ttft_samples = 0
+        self.total_ttft_ms = 0.0
+        self.last_ttft_ms = None
+        self.total_stream_tokens = 0
+        self._initialized = True
+
+    @staticmethod
+    def _build_messages(prompt, context=None, history=None) -> List[Dict[str, str]]:
+        messages = []
+        if context:
+            messages.append({"role": "system", "content": context})
+        
+        # Add chat history if provided (a system entry carries the summary of older turns)
+        if history:
+            for msg in history:
+                if msg.get('role') in ['system', 'user', 'assistant'] and msg.get('content'):
+                    messages.append({"role": msg['role'], "content": msg['content']})
+        
+        messages.append({"role": "user", "content": prompt})
+        return messages
 
     async def generate_streaming_response(self, prompt, history=None, system_instruction=None, **kwargs):
-        """Generate streaming response (fallback to non-streaming for OpenAI)"""
+        """
+        Yield the response token by token as the provider produces it.
+        
+        The provider is only read as fast as the caller consumes, so a slow
+        client applies backpressure all the way to the API. If the caller stops
+        iterating (client disconnected), the upstream generation is stopped and
+        counted as cancelled.
+        """
         logger.info(f"[LLMService] Generating streaming response with provider: {self.provider}")
-        if self.provider == "openai":
-            # For OpenAI, use non-streaming and yield the response
-            response = self.generate_response(
-                prompt=prompt,
-                context=system_instruction,
-                history=history
-            )
-            # Yield the response as a single token for compatibility
-            yield response
-        else:
-            # Place your local streaming implementation here
-            yield "[Local streaming LLM not implemented in this patch]"
-        self._initialized = True
+        messages = self._build_messages(prompt, system_instruction, history)
+        tokens = self._openai_tokens(messages) if self.provider == "openai" else self._local_tokens(messages)
+        
+        start_time = time.time()
+        first_token_time = None
+        token_count = 0
+        outcome = "failed"
+        try:
+            async for token in tokens:
+                if first_token_time is None:
+                    first_token_time = time.time()
+                    logger.info(f"🎯 [TIMING] {self.provider} first token in {(first_token_time - start_time) * 1000:.2f}ms")
+                token_count += 1
+                yield token
+            outcome = "completed"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"{self.provider} streaming error: {e}")
+            yield f"[{'OpenAI API' if self.provider == 'openai' else 'Local LLM'} error: {e}]"
+        finally:
+            # Stops the upstream generation instead of letting it run to max_tokens
+            await tokens.aclose()
+            ttft_ms = (first_token_time - start_time) * 1000 if first_token_time else None
+            self._record_stream(outcome, ttft_ms, token_count)
+            logger.info(f"📊 [LLMService] Stream {outcome}: {token_count} tokens in {(time.time() - start_time) * 1000:.2f}ms"
+                        + (f", first token {ttft_ms:.2f}ms" if ttft_ms is not None else ""))
+
+    async def _openai_tokens(self, messages):
+        stream = await self.async_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            temperature=OPENAI_TEMPERATURE,
+            max_tokens=OPENAI_MAX_TOKENS,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def _local_tokens(self, messages):
+        # Closing this generator early cancels the generation and frees its slot
+        async for piece in get_local_scheduler().stream(format_chat_prompt(messages)):
+            yield piece
+
+    def _record_stream(self, outcome: str, ttft_ms: Optional[float], token_count: int) -> None:
+        with self._stats_lock:
+            self.streams += 1
+            self.streams_cancelled += int(outcome == "cancelled")
+            self.streams_failed += int(outcome == "failed")
+            self.total_stream_tokens += token_count
+            if ttft_ms is not None:
+                self.total_ttft_ms += ttft_ms
+                self.last_ttft_ms = ttft_ms
+                self.ttft_samples += 1
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """Streaming counters, including time to first token and the local scheduler's queue"""
+        scheduler = local_scheduler_stats() if self.provider == "local" else None
+        with self._stats_lock:
+            samples = self.ttft_samples
+            return {
+                "provider": self.provider,
+                "streams": self.streams,
+                "cancelled": self.streams_cancelled,
+                "failed": self.streams_failed,
+                "tokens": self.total_stream_tokens,
+                "avg_ttft_ms": round(self.total_ttft_ms / samples, 2) if samples else None,
+                "last_ttft_ms": round(self.last_ttft_ms, 2) if self.last_ttft_ms is not None else None,
+                "local_scheduler": scheduler,
+            }
 
     def generate_response(self, prompt, context=None, history=None, **kwargs):
         logger.info(f"[LLMService] Generating response with provider: {self.provider}")
         if self.provider == "openai":
             # Use OpenAI v1.x API (see: https://github.com/openai/openai-python/discussions/742)
-            messages = []
-            if context:
-                messages.append({"role": "system", "content": context})
-            
-            # Add chat history if provided
-            if history:
-                for msg in history:
-                    if msg.get('role') in ['user', 'assistant'] and msg.get('content'):
-                        messages.append({"role": msg['role'], "content": msg['content']})
-            
-            messages.append({"role": "user", "content": prompt})
+            messages = self._build_messages(prompt, context, history)
             try:
                 response = openai.chat.completions.create(
                     model=OPENAI_MODEL,
                     messages=messages,
-                    temperature=0.2,
-                    max_tokens=1024,
+                    temperature=OPENAI_TEMPERATURE,
+                    max_tokens=OPENAI_MAX_TOKENS,
                 )
                 return "[OPENAI] " + response.choices[0].message.content.strip()
             except Exception as e:
                 logger.error(f"OpenAI API error: {e}")
                 return f"[OpenAI API error: {e}]"
         elif self.provider == "local":
-            # Place your local model inference code here
-            return "[Local LLM not implemented in this patch]"
+            messages = self._build_messages(prompt, context, history)
+            try:
+                return get_local_scheduler().complete(format_chat_prompt(messages)).strip()
+            except Exception as e:
+                logger.error(f"Local LLM error: {e}")
+                return f"[Local LLM error: {e}]"
         else:
             logger.error(f"Unknown LLM_PROVIDER: {self.provider}")
             raise ValueError(f"Unknown LLM_PROVIDER: {self.provider}")
\ No newline at end of file
@@ -0,0 +1,469 @@
+"""
+Local (air-gapped) LLM backend: a GGUF model served by llama.cpp on CPU.
+
+Requests go through LocalLLMScheduler, which runs every active generation on
+one engine thread and advances them a token at a time in turn:
+
+    - continuous batching: new requests join at the next step instead of
+      waiting for the running ones to finish, and a finished sequence frees
+      its slot immediately
+    - LOCAL_LLM_SLOTS caps concurrent generations (one llama.cpp context, i.e.
+      KV cache, per slot; the weights are mmap'd once and shared); up to
+      LOCAL_LLM_MAX_QUEUE more wait, beyond that requests are rejected, so
+      throughput stays predictable under load
+    - prefix reuse: each slot keeps the tokens it last evaluated and a request
+      is placed on the free slot sharing the longest prefix with its prompt.
+      Prompts start with the system instruction, so llama.cpp only evaluates
+      the part after the shared prefix
+
+LOCAL_LLM_BACKEND=mock swaps in MockLocalModel, a deterministic echo model
+with the same interface, for tests and for running the stack without a model.
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.utils.concurrency import run_blocking
+from backend.utils.context_budget import CONTEXT_TOKEN_BUDGET, ContextBudget
+
+try:
+    from llama_cpp import Llama
+    LLAMA_CPP_AVAILABLE = True
+except ImportError:
+    LLAMA_CPP_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "llama_cpp" (a GGUF file at MODEL_PATH) or "mock"
+LOCAL_LLM_BACKEND = os.getenv("LOCAL_LLM_BACKEND", "llama_cpp").lower()
+MODEL_PATH = os.getenv("MODEL_PATH", "./models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf")
+CONTEXT_LENGTH = int(os.getenv("CONTEXT_LENGTH", "4096"))
+GPU_LAYERS = int(os.getenv("GPU_LAYERS", "0"))
+# Concurrent generations (one KV cache each) and requests allowed to wait for a slot
+LOCAL_LLM_SLOTS = int(os.getenv("LOCAL_LLM_SLOTS", "2"))
+LOCAL_LLM_MAX_QUEUE = int(os.getenv("LOCAL_LLM_MAX_QUEUE", "32"))
+# CPU threads per decode step (0 = all CPUs; the engine runs one step at a time)
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", "0"))
+LOCAL_LLM_MAX_TOKENS = int(os.getenv("LOCAL_LLM_MAX_TOKENS", "512"))
+LOCAL_LLM_TEMPERATURE = float(os.getenv("LOCAL_LLM_TEMPERATURE", "0.2"))
+# Prompt template: "zephyr" (TinyLlama), "mistral" or "chatml"
+LOCAL_LLM_CHAT_FORMAT = os.getenv("LOCAL_LLM_CHAT_FORMAT", "zephyr").lower()
+
+CHAT_FORMATS = ("zephyr", "mistral", "chatml")
+
+# Tokens the chat template adds around the system instruction and the user message
+LOCAL_TEMPLATE_RESERVE_TOKENS = 32
+
+
+class LocalLLMBusy(RuntimeError):
+    """Raised when every slot is busy and the wait queue is full."""
+
+
+def format_chat_prompt(messages: List[Dict[str, str]], chat_format: str = LOCAL_LLM_CHAT_FORMAT) -> str:
+    """Render chat messages with the model's template; the system message always comes first."""
+    if chat_format == "zephyr":
+        parts = [f"<|{msg['role']}|>\n{msg['content']}</s>\n" for msg in messages]
+        return "".join(parts) + "<|assistant|>\n"
+    if chat_format == "chatml":
+        parts = [f"<|im_start|>{msg['role']}\n{msg['content']}<|im_end|>\n" for msg in messages]
+        return "".join(parts) + "<|im_start|>assistant\n"
+    if chat_format == "mistral":
+        # No system role: the instruction leads the first [INST] block, so it is still a shared prefix
+        system = "".join(msg["content"] + "\n\n" for msg in messages if msg["role"] == "system")
+        prompt = ""
+        for msg in messages:
+            if msg["role"] == "user":
+                prompt += f"[INST] {system}{msg['content']} [/INST]"
+                system = ""
+            elif msg["role"] == "assistant":
+                prompt += f" {msg['content']}</s>"
+        return prompt
+    raise ValueError(f"Unknown chat format: {chat_format} (expected one of {', '.join(CHAT_FORMATS)})")
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class LlamaCppModel:
+    """GGUF model via llama-cpp-python with one llama.cpp context (KV cache) per slot."""
+
+    def __init__(self, model_path: str = MODEL_PATH, n_slots: int = LOCAL_LLM_SLOTS, n_ctx: int = CONTEXT_LENGTH,
+                 n_threads: int = LOCAL_LLM_THREADS, n_gpu_layers: int = GPU_LAYERS):
+        if not LLAMA_CPP_AVAILABLE:
+            raise RuntimeError("llama-cpp-python is not installed")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Local model not found: {model_path}")
+        n_threads = n_threads or os.cpu_count() or 1
+        logger.info(f"🔄 Loading local model {model_path} ({n_slots} slots, {n_threads} threads, n_ctx={n_ctx})...")
+        self.contexts = [
+            Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, n_gpu_layers=n_gpu_layers, verbose=False)
+            for _ in range(n_slots)
+        ]
+        self.n_slots = n_slots
+        self.n_ctx = n_ctx
+        self._eos = self.contexts[0].token_eos()
+        logger.info(f"✅ Local model loaded: {model_path}")
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.contexts[0].tokenize(text.encode("utf-8"), add_bos=True)
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return self.contexts[0].detokenize(tokens)
+
+    def is_eos(self, token: int) -> bool:
+        return token == self._eos
+
+    def generate(self, slot: int, tokens: List[int], temperature: float) -> Iterator[int]:
+        """Token ids for the prompt; llama.cpp skips the prefix already in this slot's KV cache."""
+        return self.contexts[slot].generate(tokens, temp=temperature, reset=True)
+
+
+class MockLocalModel:
+    """Deterministic stand-in model: replies by echoing the end of the prompt, one word per token."""
+
+    def __init__(self, n_slots: int = LOCAL_LLM_SLOTS, n_ctx: int = CONTEXT_LENGTH, step_delay: float = 0.0,
+                 reply_words: int = 8):
+        self.n_slots = n_slots
+        self.n_ctx = n_ctx
+        self.step_delay = step_delay
+        self.reply_words = reply_words
+        self._vocab: Dict[str, int] = {"</s>": 0}
+        self._words: List[str] = ["</s>"]
+        self._cached: List[List[int]] = [[] for _ in range(n_slots)]
+        self._lock = threading.Lock()
+        # Prompt tokens actually evaluated, after the slot's cached prefix was skipped
+        self.evaluated_tokens = 0
+
+    def _id(self, word: str) -> int:
+        with self._lock:
+            if word not in self._vocab:
+                self._vocab[word] = len(self._words)
+                self._words.append(word)
+            return self._vocab[word]
+
+    def tokenize(self, text: str) -> List[int]:
+        return [self._id(word) for word in text.split()]
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return "".join(" " + self._words[token] for token in tokens).encode("utf-8")
+
+    def is_eos(self, token: int) -> bool:
+        return token == 0
+
+    def generate(self, slot: int, tokens: List[int], temperature: float) -> Iterator[int]:
+        # Mirror llama.cpp: keep the common prefix of the cache, evaluate the rest
+        reused = common_prefix_length(self._cached[slot], tokens[:-1])
+        self.evaluated_tokens += len(tokens) - reused
+        self._cached[slot] = list(tokens)
+        for token in [self._id("Mock:")] + tokens[-self.reply_words:] + [0]:
+            if self.step_delay:
+                time.sleep(self.step_delay)
+            self._cached[slot].append(token)
+            yield token
+
+
+class _Sequence:
+    """One generation request as seen by the engine thread."""
+
+    def __init__(self, tokens: List[int], emit: Callable[[Any], None], max_tokens: int, temperature: float):
+        self.tokens = tokens
+        self.emit = emit
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.cancelled = False
+        self.slot = None
+        self.generator = None
+        self.generated: List[int] = []
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.submitted_at = time.time()
+        self.started_at = None
+
+
+class LocalLLMScheduler:
+    """Continuously batches generations across a fixed set of model slots on one engine thread."""
+
+    def __init__(self, model, max_queue: int = LOCAL_LLM_MAX_QUEUE, max_tokens: int = LOCAL_LLM_MAX_TOKENS,
+                 temperature: float = LOCAL_LLM_TEMPERATURE):
+        self.model = model
+        self.max_queue = max_queue
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._pending: "deque[_Sequence]" = deque()
+        self._active: List[_Sequence] = []
+        self._free_slots = list(range(model.n_slots))
+        # Tokens each slot's KV cache currently holds (prompt + generated)
+        self._slot_tokens: List[List[int]] = [[] for _ in range(model.n_slots)]
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.failed = 0
+        self.prompt_tokens = 0
+        self.reused_prefix_tokens = 0
+        self.generated_tokens = 0
+        self.total_queue_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="local-llm", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, emit: Callable[[Any], None], max_tokens: Optional[int] = None,
+               temperature: Optional[float] = None) -> _Sequence:
+        """
+        Queue a prompt. emit is called from the engine thread with each text
+        piece, then with an exception if generation failed, then with None.
+        """
+        tokens = self.model.tokenize(prompt)
+        max_tokens = max_tokens or self.max_tokens
+        if len(tokens) + max_tokens > self.model.n_ctx:
+            raise ValueError(f"Prompt is {len(tokens)} tokens; with {max_tokens} to generate it exceeds the "
+                             f"context length of {self.model.n_ctx}")
+        sequence = _Sequence(tokens, emit, max_tokens, self.temperature if temperature is None else temperature)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Local LLM scheduler is shut down")
+            # Queued requests first take the free slots, then up to max_queue more may wait
+            if len(self._pending) >= self.max_queue + len(self._free_slots):
+                self.rejected += 1
+                raise LocalLLMBusy(f"Local LLM is busy ({len(self._active)} generating, {len(self._pending)} queued)")
+            self._pending.append(sequence)
+            self._cond.notify()
+        return sequence
+
+    async def stream(self, prompt: str, **kwargs):
+        """Async iterator over generated text; closing it early cancels the generation."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        submitted: List[_Sequence] = []
+        abandoned = []
+
+        def emit(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop closed: the consumer is gone
+                for sequence in submitted:
+                    sequence.cancelled = True
+
+        def submit():
+            sequence = self.submit(prompt, emit, **kwargs)
+            submitted.append(sequence)
+            if abandoned:
+                sequence.cancelled = True
+
+        try:
+            # Tokenizing the prompt is blocking work, kept off the event loop
+            await run_blocking(submit)
+        except asyncio.CancelledError:
+            # The submit still lands; its generation is cancelled as soon as it does
+            abandoned.append(True)
+            for sequence in submitted:
+                sequence.cancelled = True
+            raise
+        sequence = submitted[0]
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Frees the slot at the engine's next step if we stopped early
+            sequence.cancelled = True
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        """Blocking generation of the full response."""
+        pieces = []
+        done = threading.Event()
+        error = []
+
+        def emit(item):
+            if item is None:
+                done.set()
+            elif isinstance(item, Exception):
+                error.append(item)
+            else:
+                pieces.append(item)
+
+        self.submit(prompt, emit, **kwargs)
+        done.wait()
+        if error:
+            raise error[0]
+        return "".join(pieces)
+
+    def _admit(self) -> None:
+        """Move queued requests onto free slots, preferring the slot with the longest shared prefix."""
+        while self._pending and self._free_slots:
+            sequence = self._pending.popleft()
+            if sequence.cancelled:
+                self.cancelled += 1
+                sequence.emit(None)
+                continue
+            slot = max(self._free_slots, key=lambda free: common_prefix_length(self._slot_tokens[free], sequence.tokens))
+            self._free_slots.remove(slot)
+            sequence.slot = slot
+            sequence.started_at = time.time()
+            reused = common_prefix_length(self._slot_tokens[slot], sequence.tokens[:-1])
+            self.prompt_tokens += len(sequence.tokens)
+            self.reused_prefix_tokens += reused
+            self.total_queue_ms += (sequence.started_at - sequence.submitted_at) * 1000
+            self._slot_tokens[slot] = list(sequence.tokens)
+            self._active.append(sequence)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and not self._pending and not self._active:
+                    self._cond.wait()
+                if self._stopped:
+                    break
+                self._admit()
+                active = list(self._active)
+            # One decode step per active sequence, outside the lock so submit() never waits on the model
+            for sequence in active:
+                self._step(sequence)
+
+        for sequence in list(self._active) + list(self._pending):
+            sequence.emit(RuntimeError("Local LLM scheduler is shut down"))
+            sequence.emit(None)
+
+    def _step(self, sequence: _Sequence) -> None:
+        if sequence.cancelled:
+            self._finish(sequence, "cancelled")
+            return
+        try:
+            if sequence.generator is None:
+                sequence.generator = self.model.generate(sequence.slot, sequence.tokens, sequence.temperature)
+            token = next(sequence.generator)
+        except StopIteration:
+            self._finish(sequence, "completed")
+            return
+        except Exception as e:
+            logger.error(f"❌ Local generation failed: {e}")
+            sequence.emit(e)
+            self._finish(sequence, "failed")
+            return
+
+        if self.model.is_eos(token):
+            self._finish(sequence, "completed")
+            return
+        sequence.generated.append(token)
+        self._slot_tokens[sequence.slot].append(token)
+        text = sequence.decoder.decode(self.model.detokenize([token]))
+        if text:
+            sequence.emit(text)
+        if len(sequence.generated) >= sequence.max_tokens:
+            self._finish(sequence, "completed")
+
+    def _finish(self, sequence: _Sequence, outcome: str) -> None:
+        if sequence.generator is not None:
+            sequence.generator.close()
+        tail = sequence.decoder.decode(b"", final=True)
+        if tail and outcome == "completed":
+            sequence.emit(tail)
+        sequence.emit(None)
+        with self._cond:
+            self._active.remove(sequence)
+            self._free_slots.append(sequence.slot)
+            self.generated_tokens += len(sequence.generated)
+            if outcome == "completed":
+                self.completed += 1
+            elif outcome == "cancelled":
+                self.cancelled += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            started = self.completed + self.cancelled + self.failed + len(self._active)
+            return {
+                "slots": self.model.n_slots,
+                "active": len(self._active),
+                "queued": len(self._pending),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "generated_tokens": self.generated_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "reused_prefix_tokens": self.reused_prefix_tokens,
+                "prefix_reuse_rate": round(self.reused_prefix_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                "avg_queue_ms": round(self.total_queue_ms / started, 2) if started else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the engine thread; running and queued generations end with an error."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+
+def create_local_model(backend: str = LOCAL_LLM_BACKEND):
+    if backend == "mock":
+        return MockLocalModel()
+    if backend == "llama_cpp":
+        return LlamaCppModel()
+    raise ValueError(f"Unknown LOCAL_LLM_BACKEND: {backend} (expected llama_cpp or mock)")
+
+
+# Global instance
+_local_scheduler = None
+_local_scheduler_lock = threading.Lock()
+
+def get_local_scheduler() -> LocalLLMScheduler:
+    """Get the global local LLM scheduler, loading the model on first use"""
+    global _local_scheduler
+    with _local_scheduler_lock:
+        if _local_scheduler is None:
+            _local_scheduler = LocalLLMScheduler(create_local_model())
+        return _local_scheduler
+
+def local_scheduler_stats() -> Optional[Dict[str, Any]]:
+    """Scheduler counters, or None if the local model has not been loaded"""
+    scheduler = _local_scheduler
+    return scheduler.stats() if scheduler is not None else None
+
+def shutdown_local_scheduler() -> None:
+    global _local_scheduler
+    with _local_scheduler_lock:
+        if _local_scheduler is not None:
+            _local_scheduler.shutdown()
+            _local_scheduler = None
+
+def local_context_budget(model=None) -> ContextBudget:
+    """
+    Prompt budget for the local model, counted with its own tokenizer.
+    
+    A prompt has to fit the context window together with the reply, so the
+    budget is capped at n_ctx - LOCAL_LLM_MAX_TOKENS (less the template
+    framing); otherwise submit() would reject well-packed prompts. Without a
+    model, the global scheduler's is used (loaded at startup), so counts are
+    blocking work and belong off the event loop.
+    """
+    n_ctx = model.n_ctx if model is not None else CONTEXT_LENGTH
+    window = n_ctx - LOCAL_LLM_MAX_TOKENS - LOCAL_TEMPLATE_RESERVE_TOKENS
+    if window < CONTEXT_TOKEN_BUDGET:
+        logger.info(f"🧮 Local model context is {n_ctx} tokens: prompt budget capped at {window} "
+                    f"(CONTEXT_TOKEN_BUDGET {CONTEXT_TOKEN_BUDGET})")
+    def count(texts: List[str]) -> List[int]:
+        tokenizer = model if model is not None else get_local_scheduler().model
+        return [len(tokenizer.tokenize(text)) for text in texts]
+    return ContextBudget(max_tokens=min(CONTEXT_TOKEN_BUDGET, window), counter=count)
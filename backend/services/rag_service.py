@@ -5,20 +5,30 @@ try:
 except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
     print("Warning: sentence-transformers not available. RAG functionality will be limited.")
+import bisect
 import logging
+import math
 import os
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from dotenv import load_dotenv
 from datetime import datetime
 import time
 from .search_service import SearchService
+from backend.utils.lru_cache import TTLLRUCache
+from backend.utils.extractors import iter_text_blocks
+from backend.utils.metadata_filters import filter_key, matches, parse_metadata_filter, to_weaviate_filter
+from backend.utils.content_hashing import HASHED_CHUNK_PROPERTIES, DocumentHasher, chunk_hash, content_hash, document_hash, stable_document_id
+from backend.utils.chunking import Chunker, CHUNK_MAX_TOKENS, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, FALLBACK_MAX_TOKENS, hf_token_counter, strategy_for_category
 from backend.services.langchain_sql_service import langchain_sql_service
-from weaviate.connect import ConnectionParams
-from weaviate.collections.classes.config import DataType, Property, Vectorizers, Configure, VectorDistances
+from backend.services.weaviate_client import get_weaviate_manager
+from backend.services.rerank_service import RERANK_CANDIDATES, RERANK_ENABLED, Reranker
+from weaviate.collections.classes.config import DataType, Property, Tokenization, Vectorizers, Configure, VectorDistances
 from weaviate.collections.classes.filters import Filter
 from weaviate.classes.data import DataObject
-from urllib.parse import urlparse
+from weaviate.classes.aggregate import GroupByAggregate
+from weaviate.classes.query import HybridFusion, MetadataQuery, Metrics, Sort
+from weaviate.util import generate_uuid5
 
 # Load environment variables
 load_dotenv()
@@ -28,38 +38,48 @@ logger = logging.getLogger(__name__)
 # Global singleton instance
 _rag_service_instance = None
 
-# Get chunking parameters from environment variables with defaults
-DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
-DEFAULT_OVERLAP = int(os.getenv("OVERLAP", "50"))
 # Force CPU usage for RAG to avoid GPU contention with LLM
 RAG_USE_CPU = os.getenv("RAG_USE_CPU", "true").lower() == "true"
 # Enable internet search
 ENABLE_INTERNET_SEARCH = os.getenv("ENABLE_INTERNET_SEARCH", "true").lower() == "true"
 # Weaviate configuration
-WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
 COLLECTION_NAME = "Documents"
 
 # Embedding model configuration
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "intfloat/e5-small")
 # Available models: intfloat/e5-small, intfloat/e5-large, sentence-transformers/all-MiniLM-L6-v2
+# Number of chunks embedded per forward pass during ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+# New or changed chunks held in memory before they are embedded and written
+INGEST_WINDOW_CHUNKS = int(os.getenv("INGEST_WINDOW_CHUNKS", str(EMBED_BATCH_SIZE * 8)))
+# Local retrieval: "hybrid" (BM25 + vector), "vector" or "keyword" (BM25 only)
+RAG_SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "hybrid").lower()
+# Weight of the vector side in hybrid search: 0 = pure BM25, 1 = pure vector
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))
+# How hybrid merges the BM25 and vector rankings: "rrf" (reciprocal rank fusion) or "relative" (normalized scores)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf").lower()
+SEARCH_MODES = ("hybrid", "vector", "keyword")
+# Properties searched by BM25 (Weaviate's inverted index)
+KEYWORD_PROPERTIES = ["content", "source"]
+# Filtered search: "pre" (filter inside the ANN search), "post" (filter an over-fetched result) or "auto"
+FILTER_STRATEGY = os.getenv("FILTER_STRATEGY", "auto").lower()
+# In auto mode, filters matching at least this fraction of chunks are post-filtered
+FILTER_POSTFILTER_SELECTIVITY = float(os.getenv("FILTER_POSTFILTER_SELECTIVITY", "0.3"))
+FILTER_POSTFILTER_MAX_CANDIDATES = int(os.getenv("FILTER_POSTFILTER_MAX_CANDIDATES", "200"))
+# Seconds a filter's measured selectivity is reused
+FILTER_SELECTIVITY_TTL = float(os.getenv("FILTER_SELECTIVITY_TTL", "60"))
+# Chunk properties returned when listing (chunk bodies only on request)
+CHUNK_LIST_PROPERTIES = ["document_id", "chunk_index", "category", "location", "source", "upload_date"]
+# Documents returned by one per-document aggregation, and how long its result is reused (seconds)
+DOCUMENT_LIST_MAX_GROUPS = int(os.getenv("DOCUMENT_LIST_MAX_GROUPS", "100000"))
+DOCUMENT_LIST_CACHE_TTL = float(os.getenv("DOCUMENT_LIST_CACHE_TTL", "30"))
+# Query embedding cache (entries, seconds; a TTL of 0 never expires)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
 
-def chunk_text(text: str, chunk_size: int = None, overlap: int = None) -> List[str]:
-    """Split text into overlapping chunks of chunk_size with overlap."""
-    # Use environment variables if not specified
-    if chunk_size is None:
-        chunk_size = DEFAULT_CHUNK_SIZE
-    if overlap is None:
-        overlap = DEFAULT_OVERLAP
-        
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start += chunk_size - overlap
-    return chunks
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different spellings share a cache entry."""
+    return " ".join(query.lower().split())
 
 class RAGService:
     def __new__(cls):
@@ -78,8 +98,10 @@ class RAGService:
         
         self._initialized = True
         
-        # Initialize Weaviate client lazily (will connect when first used)
-        self.client = None
+        # The shared Weaviate client connects lazily (when first used)
+        self._collection_generation = None
+        # Filter properties of a collection created with word tokenization (see _check_filter_tokenization)
+        self.legacy_filter_properties = set()
         logger.info(f"🔍 RAG service initialized (Weaviate client will connect when needed)")
         
         # Load the embedding model
@@ -94,7 +116,29 @@ class RAGService:
             self.embedding_model = None
             logger.warning("⚠️  sentence-transformers not available, embedding functionality disabled")
         logger.info(f"✅ Embedding model loaded ({device} mode)")
-        logger.info(f"📊 Chunking parameters: chunk_size={DEFAULT_CHUNK_SIZE}, overlap={DEFAULT_OVERLAP}")
+        
+        # Cache query embeddings; popular questions are embedded once per TTL
+        self.query_embedding_cache = TTLLRUCache(
+            max_size=QUERY_EMBEDDING_CACHE_SIZE,
+            ttl_seconds=QUERY_EMBEDDING_CACHE_TTL,
+            name="query_embeddings"
+        )
+        # Chunks are sized in the embedding model's own tokens so none are truncated
+        if self.embedding_model is not None:
+            self.token_counter = hf_token_counter(self.embedding_model.tokenizer)
+            # Leave room for the [CLS]/[SEP] tokens the model adds
+            self.max_chunk_tokens = CHUNK_MAX_TOKENS or max(self.embedding_model.max_seq_length - 2, 1)
+        else:
+            self.token_counter = None
+            self.max_chunk_tokens = CHUNK_MAX_TOKENS or FALLBACK_MAX_TOKENS
+        self._chunkers = {}
+        # Match fraction per metadata filter, used to choose pre- or post-filtering
+        self.filter_selectivity_cache = TTLLRUCache(max_size=1024, ttl_seconds=FILTER_SELECTIVITY_TTL, name="filter_selectivity")
+        # Per-document summaries for the admin listing, keyed by metadata filter
+        self.document_list_cache = TTLLRUCache(max_size=64, ttl_seconds=DOCUMENT_LIST_CACHE_TTL, name="document_list")
+        # Second retrieval stage: over-fetched candidates are reranked down to the requested k
+        self.reranker = Reranker() if RERANK_ENABLED else None
+        logger.info(f"📊 Chunking parameters: max_tokens={self.max_chunk_tokens}, default strategy={strategy_for_category(None)}, embed_batch_size={EMBED_BATCH_SIZE}")
         
         # Initialize search service if internet search is enabled
         self.search_service = None
@@ -107,32 +151,19 @@ class RAGService:
                 logger.warning(f"⚠️  Failed to initialize search service: {e}")
                 self.search_service = None
 
+    @property
+    def client(self):
+        """The process-wide Weaviate client (reconnects after Weaviate restarts)."""
+        return get_weaviate_manager().get_client()
+
     def _ensure_weaviate_connected(self):
-        """Ensure Weaviate client is connected, connecting if necessary."""
-        if self.client is None:
-            logger.info(f"🔍 Connecting to Weaviate at {WEAVIATE_URL}...")
-            try:
-                # Parse the URL to extract host and port
-                parsed_url = urlparse(WEAVIATE_URL)
-                host = parsed_url.hostname
-                port = parsed_url.port or 8080
-                secure = parsed_url.scheme == 'https'
-                
-                self.client = weaviate.connect_to_custom(
-                    http_host=host,
-                    http_port=port,
-                    http_secure=secure,
-                    grpc_host=host,
-                    grpc_port=50051,
-                    grpc_secure=secure,
-                    skip_init_checks=True
-                )
-                logger.info("✅ Weaviate client connected successfully")
-                # Create collection if it doesn't exist
-                self._create_collection_if_not_exists()
-            except Exception as e:
-                logger.error(f"❌ Failed to connect to Weaviate: {e}")
-                raise
+        """Ensure Weaviate client is connected and the collection exists on this connection."""
+        manager = get_weaviate_manager()
+        manager.get_client()
+        if self._collection_generation != manager.generation:
+            # Create collection if it doesn't exist
+            self._create_collection_if_not_exists()
+            self._collection_generation = manager.generation
 
     def _create_collection_if_not_exists(self):
         """Create the Documents collection if it doesn't exist."""
@@ -143,6 +174,9 @@ class RAGService:
             
             if collection_exists:
                 logger.info(f"✅ Collection '{COLLECTION_NAME}' already exists")
+                config = self.client.collections.get(COLLECTION_NAME).config.get()
+                self._add_missing_hash_properties(config)
+                self._check_filter_tokenization(config)
                 return
             
             logger.info(f"📝 Creating Weaviate collection: {COLLECTION_NAME}")
@@ -150,10 +184,13 @@ class RAGService:
                 Property(name="content", data_type=DataType.TEXT),
                 Property(name="document_id", data_type=DataType.TEXT),
                 Property(name="chunk_index", data_type=DataType.INT),
-                Property(name="category", data_type=DataType.TEXT),
-                Property(name="location", data_type=DataType.TEXT),
+                # Whole-value tokenization: filters match the exact category/location
+                Property(name="category", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="location", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
                 Property(name="source", data_type=DataType.TEXT),
-                Property(name="upload_date", data_type=DataType.DATE)
+                Property(name="upload_date", data_type=DataType.DATE, index_range_filters=True),
+                Property(name="content_hash", data_type=DataType.TEXT),
+                Property(name="document_hash", data_type=DataType.TEXT)
             ]
             self.client.collections.create(
                 name=COLLECTION_NAME,
@@ -164,175 +201,598 @@ class RAGService:
                 ),
                 description="A collection for storing document chunks with embeddings"
             )
+            self.legacy_filter_properties = set()
             logger.info(f"✅ Created collection: {COLLECTION_NAME}")
                 
         except Exception as e:
             logger.error(f"❌ Failed to create collection: {e}")
             raise
 
-    def add_document(self, document_id, text, metadata=None, chunk_size=None, overlap=None):
+    def _add_missing_hash_properties(self, config):
+        """Add the hash properties to collections created before incremental ingestion."""
+        collection = self.client.collections.get(COLLECTION_NAME)
+        existing = {prop.name for prop in config.properties}
+        for name in ("content_hash", "document_hash"):
+            if name not in existing:
+                logger.info(f"📝 Adding property '{name}' to collection: {COLLECTION_NAME}")
+                collection.config.add_property(Property(name=name, data_type=DataType.TEXT))
+
+    def _check_filter_tokenization(self, config):
+        """
+        Detect category/location properties created with word tokenization.
+
+        Weaviate cannot change a property's tokenization in place, and with word
+        tokenization an equality filter on "Human Resources" also matches other
+        values containing both words. Filters on these properties are therefore
+        always applied as exact post-filters until the collection is recreated
+        (clear_all_documents) and the documents ingested again.
+        """
+        self.legacy_filter_properties = {
+            prop.name for prop in config.properties
+            if prop.name in ("category", "location") and prop.tokenization != Tokenization.FIELD
+        }
+        if self.legacy_filter_properties:
+            logger.warning(
+                f"⚠️  Collection '{COLLECTION_NAME}' tokenizes {', '.join(sorted(self.legacy_filter_properties))} by word; "
+                "filters on them use exact post-filtering. Recreate the collection and re-ingest to restore pre-filtering."
+            )
+
+    def embed_texts(self, texts: List[str], batch_size: int = None, progress: Callable[[int, int], None] = None) -> List[Optional[List[float]]]:
+        """Embed a list of texts in batches; progress(done, total) is called after each batch."""
+        if batch_size is None:
+            batch_size = EMBED_BATCH_SIZE
+        if not texts:
+            return []
+        if not self.embedding_model:
+            return [None] * len(texts)
+
+        start_time = time.time()
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors = self.embedding_model.encode(
+                batch,
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            embeddings.extend(vector.tolist() for vector in vectors)
+            if progress:
+                progress(len(embeddings), len(texts))
+
+        duration = time.time() - start_time
+        chunks_per_sec = len(texts) / duration if duration > 0 else float(len(texts))
+        logger.info(f"🧮 Embedded {len(texts)} chunk(s) in {duration:.2f}s ({chunks_per_sec:.1f} chunks/sec, batch_size={batch_size})")
+        return embeddings
+
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed a search query, reusing cached vectors for repeated questions."""
+        if not self.embedding_model:
+            return None
+        normalized = normalize_query(query)
+        key = (EMBEDDING_MODEL, normalized)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            # Embed the text the key stands for, so every spelling sharing it gets the same vector
+            embedding = self.embedding_model.encode(normalized).tolist()
+            self.query_embedding_cache.put(key, embedding)
+        return embedding
+
+    def _build_data_object(self, document_id, idx, chunk, embedding, metadata=None, chunk_hash=None, document_hash=None) -> DataObject:
+        """Build the Weaviate DataObject for a single chunk (its uuid is derived from document id and index)."""
+        chunk_metadata = dict(metadata) if metadata else {}
+        # Format upload_date as RFC3339 with milliseconds and Z
+        upload_date = chunk_metadata.get("upload_date")
+        if not upload_date:
+            dt = datetime.utcnow()
+            upload_date = dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+        elif isinstance(upload_date, datetime):
+            upload_date = upload_date.strftime("%Y-%m-%dT%H:%M:%S.") + f"{upload_date.microsecond // 1000:03d}Z"
+        elif isinstance(upload_date, str) and not upload_date.endswith('Z'):
+            # If it's a string but doesn't end with Z, add it
+            upload_date = upload_date + 'Z'
+
+        return DataObject(
+            properties={
+                "content": chunk,
+                "document_id": document_id,
+                "chunk_index": idx,
+                "category": chunk_metadata.get("category", ""),
+                "location": chunk_metadata.get("location", ""),
+                "source": chunk_metadata.get("source", ""),
+                "upload_date": upload_date,
+                "content_hash": chunk_hash or "",
+                "document_hash": document_hash or ""
+            },
+            vector=embedding,
+            uuid=generate_uuid5(f"{document_id}:{idx}")
+        )
+
+    def _chunk_hash(self, chunk: str, metadata: Optional[Dict[str, Any]]) -> str:
+        return chunk_hash(chunk, metadata)
+
+    def _document_hash(self, blocks: Iterable[str], metadata: Optional[Dict[str, Any]], chunker_signature: str) -> str:
+        return document_hash(blocks, metadata, chunker_signature)
+
+    def get_chunker(self, category: str = None, strategy: str = None) -> Chunker:
+        """Chunker for a document category (CHUNK_STRATEGY_BY_CATEGORY) or an explicit strategy."""
+        strategy = strategy or strategy_for_category(category)
+        chunker = self._chunkers.get(strategy)
+        if chunker is None:
+            chunker = Chunker(strategy, max_tokens=self.max_chunk_tokens, token_counter=self.token_counter)
+            self._chunkers[strategy] = chunker
+        return chunker
+
+    def _fetch_existing_chunks(self, collection, document_ids: List[str]) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        """Return {document_id: {chunk_index: {"uuid", "content_hash", "document_hash"}}} for stored chunks."""
+        existing = {document_id: {} for document_id in document_ids}
+        if not document_ids:
+            return existing
+        page_size = 1000
+
+        def fetch(filters):
+            return collection.query.fetch_objects(
+                filters=filters,
+                limit=page_size,
+                sort=Sort.by_property("document_id").by_property("chunk_index"),
+                return_properties=["document_id", "chunk_index", "content_hash", "document_hash"]
+            ).objects
+
+        def record(objects):
+            for obj in objects:
+                props = obj.properties
+                existing.setdefault(props.get("document_id"), {})[int(props.get("chunk_index") or 0)] = {
+                    "uuid": obj.uuid,
+                    "content_hash": props.get("content_hash"),
+                    "document_hash": props.get("document_hash"),
+                }
+
+        # Usually every stored chunk of the batch fits in one page
+        objects = fetch(Filter.by_property("document_id").contains_any(list(document_ids)))
+        record(objects)
+        if len(objects) < page_size:
+            return existing
+
+        # Large documents: keyset-page each one by chunk_index. Offsets stop at Weaviate's
+        # QUERY_MAXIMUM_RESULTS and the cursor API cannot be combined with a filter
+        for document_id in document_ids:
+            last_index = -1
+            while True:
+                objects = fetch(Filter.by_property("document_id").equal(document_id) &
+                                Filter.by_property("chunk_index").greater_than(last_index))
+                record(objects)
+                if len(objects) < page_size:
+                    break
+                last_index = int(objects[-1].properties.get("chunk_index") or 0)
+        return existing
+
+    def add_document(self, document_id, text, metadata=None, chunk_size=None, overlap=None, batch_size=None):
         """Add a document to the vector store, chunking if needed."""
+        return self.add_documents(
+            [{"document_id": document_id, "text": text, "metadata": metadata}],
+            chunk_size=chunk_size,
+            overlap=overlap,
+            batch_size=batch_size
+        )
+
+    @staticmethod
+    def _document_blocks(document: Dict[str, Any]) -> Iterable[str]:
+        """A document's text as an iterable of blocks ("text" string or a "blocks" factory)."""
+        if document.get("text") is not None:
+            return [document["text"]]
+        return document["blocks"]()
+
+    def add_documents(self, documents: List[Dict[str, Any]], chunk_size=None, overlap=None, batch_size=None,
+                      progress: Callable[[str, int, int], None] = None) -> Dict[str, Any]:
+        """
+        Add or re-sync several documents, embedding all of their new chunks together.
+
+        Chunks whose content hash matches the stored chunk are skipped, changed
+        chunks are replaced in place and chunks past the document's new end
+        are deleted, so re-ingesting an unchanged document embeds nothing.
+        Text is chunked as a stream and written every INGEST_WINDOW_CHUNKS
+        chunks, so memory is bounded by the window rather than the file size.
+
+        Args:
+            documents: List of dicts with "document_id", optional "metadata" and either "text"
+                or "blocks" (a callable returning an iterator of text blocks, see utils/extractors.py)
+            chunk_size: Fixed chunk size in characters; when chunk_size or overlap is given the
+                "fixed" strategy is used instead of the category's token-aware chunker
+            overlap: Fixed chunk overlap in characters
+            batch_size: Embedding batch size (defaults to EMBED_BATCH_SIZE)
+            progress: Optional callback(stage, done, total) for "embedding" and "inserting";
+                the embedding total is an estimate while text is still streaming
+
+        Returns:
+            Dict with per-document chunk counts and ingest throughput
+        """
         try:
             # Ensure Weaviate is connected
             self._ensure_weaviate_connected()
-            
-            # Use environment variables if not specified
-            if chunk_size is None:
-                chunk_size = DEFAULT_CHUNK_SIZE
-            if overlap is None:
-                overlap = DEFAULT_OVERLAP
-                
-            chunks = chunk_text(text, chunk_size=chunk_size, overlap=overlap)
-            
-            # Prepare data for batch insertion
-            data_objects = []
-            
-            for idx, chunk in enumerate(chunks):
-                chunk_metadata = dict(metadata) if metadata else {}
-                chunk_metadata.update({
-                    "document_id": document_id, 
-                    "chunk_index": idx,
-                    "content": chunk
-                })
-                # Generate embedding
-                embedding = self.embedding_model.encode(chunk).tolist() if self.embedding_model else None
-                logger.info(f"Generated embedding for chunk {idx}: length={len(embedding) if embedding else 0}")
-                # Format upload_date as RFC3339 with milliseconds and Z
-                upload_date = chunk_metadata.get("upload_date")
-                if not upload_date:
-                    dt = datetime.utcnow()
-                    upload_date = dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
-                elif isinstance(upload_date, datetime):
-                    upload_date = upload_date.strftime("%Y-%m-%dT%H:%M:%S.") + f"{upload_date.microsecond // 1000:03d}Z"
-                elif isinstance(upload_date, str) and not upload_date.endswith('Z'):
-                    # If it's a string but doesn't end with Z, add it
-                    upload_date = upload_date + 'Z'
-                
-                # Create DataObject with properties and vector
-                data_object = DataObject(
-                    properties={
-                        "content": chunk,
-                        "document_id": document_id,
-                        "chunk_index": idx,
-                        "category": chunk_metadata.get("category", ""),
-                        "location": chunk_metadata.get("location", ""),
-                        "source": chunk_metadata.get("source", ""),
-                        "upload_date": upload_date
-                    },
-                    vector=embedding
-                )
-                data_objects.append(data_object)
-                
-            # Batch insert into Weaviate v4
+
+            fixed_chunker = None
+            if chunk_size is not None or overlap is not None:
+                fixed_chunker = Chunker("fixed", chunk_size=chunk_size, overlap=overlap)
+
+            start_time = time.time()
             collection = self.client.collections.get(COLLECTION_NAME)
-            collection.data.insert_many(data_objects)
-            logger.info(f"Document {document_id} added as {len(chunks)} chunk(s).")
+            existing = self._fetch_existing_chunks(collection, [document["document_id"] for document in documents])
+
+            # ~4 characters per token; only used for progress reporting
+            estimated_chunks = sum(
+                len(document["text"]) if document.get("text") is not None else document.get("size", 0)
+                for document in documents
+            ) // max(self.max_chunk_tokens * 4, 1) + 1
+            counts = {"inserted": 0, "replaced": 0, "embedded": 0, "failed": 0}
+            pending = []
+            replace_uuids = {}
+            failed_documents = set()
+
+            def flush():
+                """Embed and write the pending window of new or changed chunks."""
+                if not pending:
+                    return
+                embeddings = self.embed_texts([item[2] for item in pending], batch_size=batch_size)
+                inserts = []
+                for (document_id, idx, chunk, metadata, chunk_hash), embedding in zip(pending, embeddings):
+                    data_object = self._build_data_object(document_id, idx, chunk, embedding, metadata, chunk_hash)
+                    object_uuid = replace_uuids.pop((document_id, idx), None)
+                    if object_uuid is not None:
+                        # Changed chunks are overwritten under their existing uuid
+                        collection.data.replace(uuid=object_uuid, properties=data_object.properties, vector=data_object.vector)
+                        counts["replaced"] += 1
+                    else:
+                        inserts.append(data_object)
+                # Batch insert into Weaviate v4
+                if inserts:
+                    result = collection.data.insert_many(inserts)
+                    errors = getattr(result, "errors", None) or {}
+                    for index, error in errors.items():
+                        failed_documents.add(inserts[index].properties["document_id"])
+                        logger.error(f"❌ Chunk {inserts[index].properties['chunk_index']} of document "
+                                     f"{inserts[index].properties['document_id']} was not written: {error}")
+                    counts["inserted"] += len(inserts) - len(errors)
+                    counts["failed"] += len(errors)
+                counts["embedded"] += len(pending)
+                pending.clear()
+                if progress:
+                    progress("embedding", counts["embedded"], max(estimated_chunks, counts["embedded"]))
+
+            # Diff every document against what is stored, then embed only new or changed chunks
+            stale_uuids = []
+            hash_updates = []
+            chunk_counts = {}
+            skipped = 0
+            for document in documents:
+                document_id = document["document_id"]
+                metadata = document.get("metadata")
+                stored = existing.get(document_id, {})
+                chunker = fixed_chunker or self.get_chunker((metadata or {}).get("category"))
+
+                # The first chunk carries the hash of the whole document as last synced
+                head = stored.get(0)
+                hasher = None
+                if head:
+                    # Hashed before chunking so an unchanged document is never chunked;
+                    # the extracted blocks are kept so a changed one is not extracted again
+                    blocks = list(self._document_blocks(document))
+                    document_hash = self._document_hash(blocks, metadata, chunker.signature)
+                    if head["document_hash"] == document_hash:
+                        chunk_counts[document_id] = len(stored)
+                        skipped += len(stored)
+                        continue
+                else:
+                    # Nothing stored to compare with: hashed during the chunking pass
+                    hasher = DocumentHasher(chunker.signature)
+                    blocks = hasher.wrap(self._document_blocks(document))
+
+                chunk_count = 0
+                for idx, chunk in enumerate(chunker.chunks(blocks)):
+                    chunk_count += 1
+                    chunk_hash = self._chunk_hash(chunk, metadata)
+                    previous = stored.get(idx)
+                    if previous and previous["content_hash"] == chunk_hash:
+                        skipped += 1
+                        continue
+                    if previous:
+                        replace_uuids[(document_id, idx)] = previous["uuid"]
+                    pending.append((document_id, idx, chunk, metadata, chunk_hash))
+                    if len(pending) >= INGEST_WINDOW_CHUNKS:
+                        flush()
+
+                if hasher is not None:
+                    document_hash = hasher.hexdigest(metadata)
+
+                # Chunks past the new end of the document were removed from it
+                chunk_counts[document_id] = chunk_count
+                stale_uuids.extend(previous["uuid"] for idx, previous in stored.items() if idx >= chunk_count)
+                if chunk_count:
+                    # Recorded only after all chunks are written, so an interrupted sync is retried
+                    head_uuid = stored[0]["uuid"] if 0 in stored else generate_uuid5(f"{document_id}:0")
+                    hash_updates.append((document_id, head_uuid, document_hash))
+            flush()
+
+            if stale_uuids:
+                collection.data.delete_many(where=Filter.by_id().contains_any(stale_uuids))
+            for document_id, object_uuid, document_hash in hash_updates:
+                # A partly written document keeps its old hash, so the next sync retries it
+                if document_id not in failed_documents:
+                    collection.data.update(uuid=object_uuid, properties={"document_hash": document_hash})
+            written = counts["inserted"] + counts["replaced"]
+            if written or stale_uuids:
+                self.document_list_cache.clear()
+            if progress:
+                progress("inserting", written, written)
+
+            duration = time.time() - start_time
+            total_chunks = sum(chunk_counts.values())
+            chunks_per_sec = total_chunks / duration if duration > 0 else float(total_chunks)
+            for document_id, count in chunk_counts.items():
+                logger.info(f"Document {document_id} synced as {count} chunk(s).")
+            logger.info(
+                f"📥 Synced {len(documents)} document(s) in {duration:.2f}s: {counts['inserted']} inserted, "
+                f"{counts['replaced']} replaced, {len(stale_uuids)} deleted, {skipped} unchanged ({chunks_per_sec:.1f} chunks/sec)"
+            )
+            if failed_documents:
+                logger.error(f"❌ {counts['failed']} chunk(s) failed to insert; not marked as synced: {', '.join(sorted(failed_documents))}")
+
+            return {
+                "documents": chunk_counts,
+                "total_chunks": total_chunks,
+                "inserted_chunks": counts["inserted"],
+                "replaced_chunks": counts["replaced"],
+                "deleted_chunks": len(stale_uuids),
+                "unchanged_chunks": skipped,
+                "failed_chunks": counts["failed"],
+                "failed_documents": sorted(failed_documents),
+                "duration_seconds": duration,
+                "chunks_per_sec": chunks_per_sec
+            }
         except Exception as e:
-            logger.error(f"Error adding document {document_id}: {e}")
+            document_ids = ", ".join(str(document.get("document_id")) for document in documents)
+            logger.error(f"Error adding document(s) {document_ids}: {e}")
+            get_weaviate_manager().mark_unhealthy()
             raise
 
     def add_document_from_file(self, document_id, file_path, metadata=None, chunk_size=None, overlap=None):
-        """Add a document from a file to the vector store, extracting text and chunking if needed."""
+        """Add a document from a file to the vector store, streaming its text into the chunker."""
         try:
-            import PyPDF2
-            from docx import Document
-            import pandas as pd
-            
-            # Determine file type and extract text
-            file_path = Path(file_path)
-            file_extension = file_path.suffix.lower()
-            
-            if file_extension == '.pdf':
-                # Extract text from PDF
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                        
-            elif file_extension == '.docx':
-                # Extract text from DOCX
-                doc = Document(file_path)
-                text = ""
-                for paragraph in doc.paragraphs:
-                    text += paragraph.text + "\n"
-                    
-            elif file_extension == '.txt':
-                # Read text file
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
-                    
-            elif file_extension in ['.csv', '.xlsx']:
-                # Extract text from spreadsheet
-                if file_extension == '.csv':
-                    df = pd.read_csv(file_path)
-                else:  # .xlsx
-                    df = pd.read_excel(file_path)
-                text = df.to_string()
-                
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
-            
-            # Add the extracted text as a document
-            self.add_document(document_id, text, metadata, chunk_size, overlap)
-            
+            return self.add_documents(
+                [{
+                    "document_id": document_id,
+                    "blocks": lambda: iter_text_blocks(str(file_path)),
+                    "size": os.path.getsize(file_path),
+                    "metadata": metadata
+                }],
+                chunk_size=chunk_size,
+                overlap=overlap
+            )
         except ImportError as e:
             logger.error(f"Missing required library for file processing: {e}")
-            raise ImportError(f"Please install required libraries: pip install PyPDF2 python-docx pandas openpyxl")
+            raise ImportError(f"Please install required libraries: pip install PyPDF2 python-docx openpyxl")
         except Exception as e:
             logger.error(f"Error processing file {file_path}: {e}")
             raise
 
-    def query_documents(self, query, n_results=5, include_scores=True, metadata_filter=None):
+    def query_documents(self, query, n_results=5, include_scores=True, metadata_filter=None, rerank=None,
+                        search_mode=None, alpha=None):
         """
         Query the vector store for similar documents with optional metadata filtering.
+
+        search_mode (default RAG_SEARCH_MODE) picks BM25 + vector "hybrid" retrieval,
+        pure "vector" or pure "keyword" search; alpha weights the vector side of
+        hybrid (default HYBRID_ALPHA). With reranking (default when RERANK_ENABLED),
+        RERANK_CANDIDATES chunks are fetched and the reranker keeps the best n_results.
+
+        metadata_filter (see utils/metadata_filters.py) restricts the search itself,
+        with equality, IN and date-range conditions. Selective filters are applied
+        inside the ANN search (pre-filtering); broad ones are applied to an
+        over-fetched unfiltered result (post-filtering), see FILTER_STRATEGY.
         """
+        search_mode = (search_mode or RAG_SEARCH_MODE).lower()
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode} (expected one of {', '.join(SEARCH_MODES)})")
+        conditions = parse_metadata_filter(metadata_filter) if metadata_filter else []
         try:
             # Ensure Weaviate is connected
             self._ensure_weaviate_connected()
             
-            query_embedding = self.embedding_model.encode(query).tolist() if self.embedding_model else None
+            query_embedding = self.embed_query(query) if search_mode != "keyword" else None
+            if query_embedding is None and search_mode != "keyword":
+                # No embedding model: exact terms can still be found through the inverted index
+                search_mode = "keyword"
+            use_rerank = self.reranker is not None and (rerank if rerank is not None else True)
+            limit = max(n_results, RERANK_CANDIDATES) if use_rerank else n_results
 
             collection = self.client.collections.get(COLLECTION_NAME)
+            search = lambda limit, filters=None: self._search(
+                collection, search_mode, query, query_embedding, limit, alpha, filters, include_scores or use_rerank
+            )
             
-            if metadata_filter:
-                # Only support single property equality for now
-                if len(metadata_filter) == 1:
-                    prop, value = next(iter(metadata_filter.items()))
-                    filters = Filter.by_property(prop).equal(value)
-                else:
-                    # For multiple filters, use AND
-                    filters = Filter.all([
-                        Filter.by_property(prop).equal(value)
-                        for prop, value in metadata_filter.items()
-                    ])
-                results = collection.query.fetch_objects(filters=filters, limit=n_results)
+            if not conditions:
+                results = search(limit)
             else:
-                # For vector search, use near_vector with proper limit
-                results = collection.query.near_vector(
-                    near_vector=query_embedding,
-                    limit=n_results
-                )
+                filters = to_weaviate_filter(conditions)
+                selectivity = self._filter_selectivity(collection, conditions, filters)
+                # Word-tokenized filters match too much in Weaviate, so only exact matching is trusted
+                inexact = any(condition.prop in self.legacy_filter_properties for condition in conditions)
+                strategy = FILTER_STRATEGY
+                if inexact:
+                    strategy = "post"
+                elif strategy == "auto":
+                    strategy = "post" if selectivity >= FILTER_POSTFILTER_SELECTIVITY else "pre"
+                results = None
+                if strategy == "post" and selectivity > 0:
+                    # Over-fetch so that about limit results survive the filter
+                    fetch = min(math.ceil(limit / selectivity * 1.5), FILTER_POSTFILTER_MAX_CANDIDATES)
+                    results = search(fetch)
+                    fetched = len(results.objects)
+                    results.objects = [obj for obj in results.objects if matches(conditions, obj.properties)][:limit]
+                    if len(results.objects) < limit and fetched >= fetch:
+                        # Not enough survivors; the filter was less selective than estimated for this query
+                        results = None
+                if results is None:
+                    results = search(limit, filters)
+                    if inexact:
+                        results.objects = [obj for obj in results.objects if matches(conditions, obj.properties)]
+                logger.info(f"🔎 Filtered {search_mode} search: {strategy}-filter, selectivity {selectivity:.3f}, {len(results.objects)} result(s)")
+
+            if use_rerank:
+                results.objects = self.reranker.rerank(query, results.objects, n_results)
                 
             # Weaviate v4 returns a list of GenerativeObject directly
             return results
         except Exception as e:
             logger.error(f"Error querying documents: {e}")
+            get_weaviate_manager().mark_unhealthy()
             raise
 
-    def list_documents_by_category(self, category=None):
-        """List all documents, optionally filtered by category."""
+    def _search(self, collection, search_mode, query, query_embedding, limit, alpha=None, filters=None, with_scores=True):
+        """Run one keyword, hybrid or vector query, optionally pre-filtered."""
+        if search_mode == "keyword":
+            return collection.query.bm25(
+                query=query,
+                query_properties=KEYWORD_PROPERTIES,
+                filters=filters,
+                limit=limit,
+                return_metadata=MetadataQuery(score=True) if with_scores else None
+            )
+        if search_mode == "hybrid":
+            # BM25 catches exact codes, policy numbers and names; the vector side catches paraphrases
+            return collection.query.hybrid(
+                query=query,
+                vector=query_embedding,
+                alpha=HYBRID_ALPHA if alpha is None else alpha,
+                fusion_type=HybridFusion.RELATIVE_SCORE if HYBRID_FUSION == "relative" else HybridFusion.RANKED,
+                query_properties=KEYWORD_PROPERTIES,
+                filters=filters,
+                limit=limit,
+                return_metadata=MetadataQuery(score=True) if with_scores else None
+            )
+        # For vector search, use near_vector with proper limit
+        return collection.query.near_vector(
+            near_vector=query_embedding,
+            filters=filters,
+            limit=limit,
+            return_metadata=MetadataQuery(distance=True) if with_scores else None
+        )
+
+    def _filter_selectivity(self, collection, conditions, filters) -> float:
+        """Fraction of chunks matching the filter (cached for FILTER_SELECTIVITY_TTL seconds)."""
+        key = filter_key(conditions)
+        selectivity = self.filter_selectivity_cache.get(key)
+        if selectivity is None:
+            total = collection.aggregate.over_all(total_count=True).total_count or 0
+            selectivity = 0.0
+            if total:
+                matched = collection.aggregate.over_all(filters=filters, total_count=True).total_count or 0
+                selectivity = matched / total
+            self.filter_selectivity_cache.put(key, selectivity)
+        return selectivity
+
+    def list_documents_by_category(self, category=None, limit=100, offset=0):
+        """List chunks, optionally filtered by category, one bounded page at a time (see list_documents for browsing)."""
         try:
+            self._ensure_weaviate_connected()
             collection = self.client.collections.get(COLLECTION_NAME)
-            if category:
-                filters = Filter.by_property("category").equal(category)
-                results = collection.query.fetch_objects(filters=filters)
-            else:
-                results = collection.query.fetch_objects()
-            return results
+            filters = Filter.by_property("category").equal(category) if category else None
+            return collection.query.fetch_objects(filters=filters, limit=limit, offset=offset,
+                                                  return_properties=CHUNK_LIST_PROPERTIES)
         except Exception as e:
             logger.error(f"Error listing documents: {e}")
+            get_weaviate_manager().mark_unhealthy()
             return []
+
+    def fetch_chunk_page(self, limit: int = 100, after: str = None, include_content: bool = False) -> List[Any]:
+        """
+        One page of chunks in uuid order, starting after the given uuid (Weaviate's cursor API).
+
+        Chunk bodies are only returned when include_content is set, and vectors never.
+        """
+        try:
+            self._ensure_weaviate_connected()
+            collection = self.client.collections.get(COLLECTION_NAME)
+            properties = CHUNK_LIST_PROPERTIES + ["content"] if include_content else CHUNK_LIST_PROPERTIES
+            results = collection.query.fetch_objects(limit=limit, after=after, return_properties=properties)
+            return results.objects
+        except Exception as e:
+            logger.error(f"Error fetching chunk page: {e}")
+            get_weaviate_manager().mark_unhealthy()
+            raise
+
+    def iter_chunks(self, page_size: int = 1000, include_content: bool = False) -> Iterator[Any]:
+        """Walk every chunk with the cursor API; memory is bounded by page_size, not collection size."""
+        after = None
+        while True:
+            page = self.fetch_chunk_page(limit=page_size, after=after, include_content=include_content)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = str(page[-1].uuid)
+
+    def list_documents(self, metadata_filter: Dict[str, Any] = None, limit: int = 50, after: str = None) -> Dict[str, Any]:
+        """
+        Per-document summaries (chunk count, sources, categories, upload dates), one page at a time.
+
+        Summaries are computed by a Weaviate aggregation grouped by document_id,
+        so no chunk bodies leave the database. The sorted summary list is cached
+        for DOCUMENT_LIST_CACHE_TTL seconds and paged by document_id: pass the
+        returned next_cursor as after to get the next page.
+        """
+        conditions = parse_metadata_filter(metadata_filter) if metadata_filter else []
+        key = filter_key(conditions)
+        summaries = self.document_list_cache.get(key)
+        if summaries is None:
+            summaries = self._aggregate_documents(conditions)
+            self.document_list_cache.put(key, summaries)
+
+        start = bisect.bisect_right([summary["document_id"] for summary in summaries], after) if after else 0
+        page = summaries[start:start + limit]
+        has_more = start + limit < len(summaries)
+        return {
+            "documents": page,
+            "next_cursor": page[-1]["document_id"] if page and has_more else None,
+            "total_documents": len(summaries),
+            "total_chunks": sum(summary["chunks"] for summary in summaries),
+        }
+
+    def _aggregate_documents(self, conditions) -> List[Dict[str, Any]]:
+        try:
+            self._ensure_weaviate_connected()
+            collection = self.client.collections.get(COLLECTION_NAME)
+            response = collection.aggregate.over_all(
+                filters=to_weaviate_filter(conditions),
+                group_by=GroupByAggregate(prop="document_id", limit=DOCUMENT_LIST_MAX_GROUPS),
+                total_count=True,
+                return_metrics=[
+                    Metrics("source").text(top_occurrences_count=True, top_occurrences_value=True, limit=5),
+                    Metrics("category").text(top_occurrences_count=True, top_occurrences_value=True, limit=5),
+                    Metrics("location").text(top_occurrences_count=True, top_occurrences_value=True, limit=5),
+                    Metrics("upload_date").date_(minimum=True, maximum=True),
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Error aggregating documents: {e}")
+            get_weaviate_manager().mark_unhealthy()
+            raise
+
+        if len(response.groups) >= DOCUMENT_LIST_MAX_GROUPS:
+            logger.warning(f"⚠️  Document listing truncated at DOCUMENT_LIST_MAX_GROUPS={DOCUMENT_LIST_MAX_GROUPS} documents")
+        summaries = []
+        for group in response.groups:
+            properties = group.properties
+            upload_dates = properties.get("upload_date")
+            summaries.append({
+                "document_id": str(group.grouped_by.value),
+                "chunks": group.total_count,
+                "sources": [occurrence.value for occurrence in properties["source"].top_occurrences],
+                "categories": [occurrence.value for occurrence in properties["category"].top_occurrences],
+                "locations": [occurrence.value for occurrence in properties["location"].top_occurrences],
+                "first_uploaded": upload_dates.minimum if upload_dates else None,
+                "last_uploaded": upload_dates.maximum if upload_dates else None,
+            })
+        summaries.sort(key=lambda summary: summary["document_id"])
+        return summaries
     
     def clear_all_documents(self):
         """Clear all documents from the vector store."""
@@ -346,16 +806,26 @@ class RAGService:
             logger.info(f"🗑️  Dropping collection: {COLLECTION_NAME}")
             self.client.collections.delete(COLLECTION_NAME)
             logger.info(f"✅ Dropped collection: {COLLECTION_NAME}")
+            self.document_list_cache.clear()
             
             # Recreate the collection
             self._create_collection_if_not_exists()
             logger.info(f"✅ Cleared all documents from collection: {COLLECTION_NAME}")
         except Exception as e:
             logger.error(f"Error clearing documents: {e}")
+            get_weaviate_manager().mark_unhealthy()
             raise
 
+    def search_web(self, query: str, n_results: int = 3) -> List[Dict]:
+        """Run an internet search with the configured engine (empty list if disabled)."""
+        if not self.search_service:
+            return []
+        search_engine = os.getenv('SEARCH_ENGINE', 'duckduckgo')
+        return self.search_service.search(query, num_results=n_results, engine=search_engine)
+
     def hybrid_search(self, query: str, n_local_results: int = 3, n_web_results: int = 3, 
-                     include_internet: bool = True) -> Dict:
+                     include_internet: bool = True, search_mode: str = None, alpha: float = None,
+                     metadata_filter: Dict[str, Any] = None) -> Dict:
         """
         Perform a hybrid search combining local RAG with internet search.
         
@@ -364,6 +834,9 @@ class RAGService:
             n_local_results: Number of local document results to return
             n_web_results: Number of web search results to return
             include_internet: Whether to include internet search
+            search_mode: Local retrieval mode ("hybrid", "vector" or "keyword"; default RAG_SEARCH_MODE)
+            alpha: Vector weight of local hybrid retrieval (default HYBRID_ALPHA)
+            metadata_filter: Restricts local retrieval (see utils/metadata_filters.py)
             
         Returns:
             Dict containing both local and web results
@@ -377,7 +850,8 @@ class RAGService:
                     # Get local RAG results
         try:
             logger.info(f"🔍 Performing local RAG search for: {query}")
-            local_results = self.query_documents(query, n_results=n_local_results)
+            local_results = self.query_documents(query, n_results=n_local_results, search_mode=search_mode, alpha=alpha,
+                                                 metadata_filter=metadata_filter)
             results['local_results'] = local_results
             # Handle Weaviate v4 GenerativeReturn object
             if hasattr(local_results, 'objects'):
@@ -396,8 +870,7 @@ class RAGService:
             try:
                 logger.info(f"🌐 Performing internet search for: {query}")
                 # Use the configured search engine from environment
-                search_engine = os.getenv('SEARCH_ENGINE', 'duckduckgo')
-                web_results = self.search_service.search(query, num_results=n_web_results, engine=search_engine)
+                web_results = self.search_web(query, n_results=n_web_results)
                 results['web_results'] = web_results
                 logger.info(f"✅ Found {len(web_results)} web results")
                 
@@ -0,0 +1,238 @@
+"""
+Second-stage reranking of vector search candidates.
+
+RAGService over-fetches RERANK_CANDIDATES chunks from Weaviate and the
+reranker keeps the best k. Two scorers are available:
+
+    cross-encoder - a small CPU cross-encoder (RERANK_MODEL) reads the query
+                    and each candidate together; most precise
+    fusion        - BM25 over the candidate set blended with the vector
+                    similarity; no model, well under a millisecond
+
+Cross-encoder scoring runs in batches in vector order and stops when
+RERANK_BUDGET_MS is spent; candidates it did not reach keep their vector
+order after the scored ones. Scores are cached per (query, chunk content),
+so repeated questions are reranked without running the model.
+"""
+
+import logging
+import math
+import os
+import re
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from backend.utils.content_hashing import content_hash
+from backend.utils.lru_cache import TTLLRUCache
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+# "cross-encoder", "fusion", or "auto" (cross-encoder when sentence-transformers is installed)
+RERANK_MODE = os.getenv("RERANK_MODE", "auto").lower()
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates fetched from Weaviate before reranking down to the requested k
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Time the cross-encoder may spend per query (ms); unscored candidates keep vector order
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+# Weight of the lexical (BM25) score in the fusion scorer; the rest is vector similarity
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+# Cached cross-encoder scores (entries, seconds; a TTL of 0 never expires)
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+MODES = ("cross-encoder", "fusion")
+
+_TOKEN = re.compile(r"\w+")
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def _content(candidate) -> str:
+    properties = getattr(candidate, "properties", None) or {}
+    return properties.get("content") or ""
+
+def _distance(candidate) -> Optional[float]:
+    metadata = getattr(candidate, "metadata", None)
+    return getattr(metadata, "distance", None) if metadata is not None else None
+
+def _retrieval_score(candidate) -> Optional[float]:
+    metadata = getattr(candidate, "metadata", None)
+    return getattr(metadata, "score", None) if metadata is not None else None
+
+def _set_score(candidate, score: float) -> None:
+    """Expose the rerank score on the Weaviate object's metadata when it has one."""
+    metadata = getattr(candidate, "metadata", None)
+    if metadata is not None:
+        try:
+            metadata.rerank_score = score
+        except AttributeError:
+            pass
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def bm25_scores(query: str, documents: List[str]) -> List[float]:
+    """BM25 of query against each document, with IDF taken over the documents themselves."""
+    query_terms = set(tokenize(query))
+    tokenized = [tokenize(document) for document in documents]
+    if not query_terms or not tokenized:
+        return [0.0] * len(documents)
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1.0
+    document_frequency = Counter(term for tokens in tokenized for term in set(tokens) & query_terms)
+    total = len(tokenized)
+    scores = []
+    for tokens in tokenized:
+        frequencies = Counter(tokens)
+        score = 0.0
+        for term in query_terms:
+            frequency = frequencies.get(term, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * frequency * (_BM25_K1 + 1) / (
+                frequency + _BM25_K1 * (1 - _BM25_B + _BM25_B * len(tokens) / average_length)
+            )
+        scores.append(score)
+    return scores
+
+def _scale(values: List[float]) -> List[float]:
+    """Divide by the best score, so near-equal scores stay near-equal (unlike min-max)."""
+    high = max(values)
+    if high <= 0:
+        return [0.0] * len(values)
+    return [max(value, 0.0) / high for value in values]
+
+
+class Reranker:
+    """Reorders retrieval candidates with a cross-encoder or a lexical+vector fusion score."""
+
+    def __init__(self, mode: str = RERANK_MODE, model_name: str = RERANK_MODEL, budget_ms: float = RERANK_BUDGET_MS,
+                 batch_size: int = RERANK_BATCH_SIZE, lexical_weight: float = RERANK_LEXICAL_WEIGHT):
+        if mode == "auto":
+            mode = "cross-encoder" if CROSS_ENCODER_AVAILABLE else "fusion"
+        if mode not in MODES:
+            raise ValueError(f"Unknown rerank mode: {mode} (expected one of auto, {', '.join(MODES)})")
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = max(batch_size, 1)
+        self.lexical_weight = lexical_weight
+        self.model = None
+        if mode == "cross-encoder":
+            self.model = self._load_model(model_name)
+            if self.model is None:
+                mode = "fusion"
+        self.mode = mode
+        self.score_cache = TTLLRUCache(max_size=RERANK_CACHE_SIZE, ttl_seconds=RERANK_CACHE_TTL, name="rerank_scores")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.budget_exhausted = 0
+        self.total_ms = 0.0
+
+    @staticmethod
+    def _load_model(model_name: str):
+        if not CROSS_ENCODER_AVAILABLE:
+            logger.warning("⚠️  sentence-transformers not available, reranking with the fusion scorer")
+            return None
+        try:
+            logger.info(f"🔄 Loading rerank model: {model_name}...")
+            model = CrossEncoder(model_name, device="cpu")
+            logger.info(f"✅ Rerank model loaded: {model_name}")
+            return model
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to load rerank model {model_name}, reranking with the fusion scorer: {e}")
+            return None
+
+    def rerank(self, query: str, candidates: List[Any], top_k: int) -> List[Any]:
+        """Return the top_k candidates (Weaviate objects with a "content" property) in reranked order."""
+        if not candidates:
+            return []
+        start_time = time.time()
+        if self.mode == "cross-encoder":
+            ranked, exhausted = self._rank_cross_encoder(query, candidates)
+        else:
+            ranked, exhausted = self._rank_fusion(query, candidates), False
+        duration = (time.time() - start_time) * 1000
+        with self._lock:
+            self.calls += 1
+            self.total_ms += duration
+            self.budget_exhausted += int(exhausted)
+        logger.info(f"🎯 Reranked {len(candidates)} candidates to {min(top_k, len(ranked))} with {self.mode} in {duration:.2f}ms"
+                    + (" (budget exhausted)" if exhausted else ""))
+        return ranked[:top_k]
+
+    def _rank_fusion(self, query: str, candidates: List[Any]) -> List[Any]:
+        lexical = _scale(bm25_scores(query, [_content(candidate) for candidate in candidates]))
+        distances = [_distance(candidate) for candidate in candidates]
+        retrieval_scores = [_retrieval_score(candidate) for candidate in candidates]
+        if all(distance is not None for distance in distances):
+            vector = _scale([1.0 - distance for distance in distances])
+        elif all(score is not None for score in retrieval_scores):
+            # Hybrid and BM25 results carry a fused/keyword score instead of a distance
+            vector = _scale(retrieval_scores)
+        else:
+            # No distances (e.g. filtered fetches): the retrieval order stands in for similarity
+            vector = [1.0 - index / len(candidates) for index in range(len(candidates))]
+        scores = [self.lexical_weight * lex + (1 - self.lexical_weight) * vec for lex, vec in zip(lexical, vector)]
+        order = sorted(range(len(candidates)), key=lambda index: scores[index], reverse=True)
+        for index in order:
+            _set_score(candidates[index], scores[index])
+        return [candidates[index] for index in order]
+
+    def _rank_cross_encoder(self, query: str, candidates: List[Any]):
+        normalized_query = " ".join(query.lower().split())
+        keys = [(self.model_name, normalized_query, content_hash(_content(candidate))) for candidate in candidates]
+        scores: Dict[int, float] = {}
+        missing = []
+        for index, key in enumerate(keys):
+            score = self.score_cache.get(key)
+            if score is None:
+                missing.append(index)
+            else:
+                scores[index] = score
+
+        deadline = time.time() + self.budget_ms / 1000 if self.budget_ms > 0 else None
+        exhausted = False
+        for start in range(0, len(missing), self.batch_size):
+            if deadline is not None and start and time.time() >= deadline:
+                exhausted = True
+                break
+            batch = missing[start:start + self.batch_size]
+            predicted = self.model.predict([(query, _content(candidates[index])) for index in batch],
+                                           batch_size=self.batch_size, show_progress_bar=False)
+            for index, score in zip(batch, predicted):
+                scores[index] = float(score)
+                self.score_cache.put(keys[index], float(score))
+
+        scored = sorted(scores, key=lambda index: scores[index], reverse=True)
+        for index in scored:
+            _set_score(candidates[index], scores[index])
+        # Candidates the budget did not reach follow in their original (vector) order
+        unscored = [index for index in range(len(candidates)) if index not in scores]
+        return [candidates[index] for index in scored + unscored], exhausted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "model": self.model_name if self.mode == "cross-encoder" else None,
+                "candidates": RERANK_CANDIDATES,
+                "budget_ms": self.budget_ms,
+                "calls": self.calls,
+                "budget_exhausted": self.budget_exhausted,
+                "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+                "score_cache": self.score_cache.stats(),
+            }
@@ -0,0 +1,243 @@
+"""
+Semantic cache for natural-language-to-SQL results.
+
+Stores the question embedding, the SQL the agent generated and the formatted
+result. A repeated question returns the cached result directly; a paraphrase
+whose embedding is above the similarity threshold reuses the SQL so only the
+query is re-executed, not the multi-step agent. Embeddings barely separate
+"top 5" from "top 10" or "in 2023" from "in 2024", so a paraphrase is only
+reused when its literals (numbers, quoted text, number words, months and
+capitalized names) are exactly those of the cached question. Entries are
+dropped when a write touches any table their SQL reads from.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() == "true"
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "512"))
+# Seconds before an entry expires even without a write (covers writes from other processes)
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "900"))
+# Minimum cosine similarity for reusing another question's SQL
+SQL_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+
+# Table references, optionally schema-qualified and/or double-quoted ("public"."orders")
+_TABLE_NAME = r'((?:"?\w+"?\.)?"?\w+"?)'
+_READ_TABLE_PATTERN = re.compile(r'\b(?:from|join)\s+' + _TABLE_NAME, re.IGNORECASE)
+_WRITE_TABLE_PATTERN = re.compile(
+    r'^\s*(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|alter\s+table|drop\s+table(?:\s+if\s+exists)?)\s+' + _TABLE_NAME,
+    re.IGNORECASE
+)
+
+def _clean_table_name(name: str) -> str:
+    return name.split('.')[-1].strip('"').lower()
+
+def extract_read_tables(sql_query: str) -> Set[str]:
+    """Return the tables a SELECT reads from (FROM and JOIN targets)."""
+    # CTE names also show up here; they never receive writes, so they are harmless
+    return {_clean_table_name(match) for match in _READ_TABLE_PATTERN.findall(sql_query or "")}
+
+def extract_write_table(statement: str) -> Optional[str]:
+    """Return the table a write statement modifies, or None for reads."""
+    match = _WRITE_TABLE_PATTERN.match(statement or "")
+    return _clean_table_name(match.group(1)) if match else None
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+_QUOTED_PATTERN = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+_WORD_PATTERN = re.compile(r"[\w$%.-]+")
+_VALUE_WORDS = {
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven",
+    "twelve", "fifteen", "twenty", "thirty", "fifty", "hundred", "thousand", "million", "dozen",
+    "first", "second", "third", "fourth", "fifth", "last", "previous", "next",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "monday", "tuesday", "wednesday", "thursday", "friday",
+    "saturday", "sunday", "today", "yesterday", "tomorrow", "week", "month", "quarter", "year",
+}
+
+def question_literals(question: str) -> tuple:
+    """
+    The values a question's SQL depends on: quoted text, tokens with digits,
+    number words, dates and capitalized names. Two questions can only share
+    SQL when these are identical.
+    """
+    literals = [(a or b).strip().lower() for a, b in _QUOTED_PATTERN.findall(question)]
+    words = _WORD_PATTERN.findall(_QUOTED_PATTERN.sub(" ", question))
+    for index, word in enumerate(words):
+        word = word.strip(".-")
+        lowered = word.lower()
+        if any(ch.isdigit() for ch in word) or lowered in _VALUE_WORDS or (index > 0 and word[:1].isupper()):
+            literals.append(lowered)
+    return tuple(sorted(literals))
+
+
+class SQLSemanticCache:
+    """Thread-safe cache of question -> (embedding, SQL, result) entries."""
+
+    def __init__(self, max_entries: int = SQL_CACHE_MAX_ENTRIES, ttl_seconds: float = SQL_CACHE_TTL,
+                 similarity_threshold: float = SQL_CACHE_SIMILARITY_THRESHOLD,
+                 embed_fn: Optional[Callable[[str], Optional[List[float]]]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.literal_mismatches = 0
+        self.invalidations = 0
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.embed_fn is None:
+            return None
+        try:
+            embedding = self.embed_fn(question)
+        except Exception as e:
+            logger.warning(f"⚠️  SQL cache could not embed question: {e}")
+            return None
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - entry["created_at"] > self.ttl_seconds
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a question.
+
+        Returns:
+            None on a miss, otherwise a dict with the cached "sql_query", "result",
+            "match" ("exact" or "semantic") and "similarity"; semantic matches
+            also carry the "cached_question"
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return {"sql_query": entry["sql_query"], "result": entry["result"], "match": "exact", "similarity": 1.0}
+            has_candidates = any(e["embedding"] is not None for e in self._entries.values())
+
+        # Embed outside the lock; encoding is the slow part
+        embedding = self._embed(question) if has_candidates else None
+        if embedding is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        literals = question_literals(question)
+        with self._lock:
+            best_key, best_score = None, -1.0
+            for entry_key, entry in list(self._entries.items()):
+                if self._is_expired(entry):
+                    del self._entries[entry_key]
+                    continue
+                if entry["embedding"] is None:
+                    continue
+                score = float(np.dot(embedding, entry["embedding"]))
+                if score > best_score:
+                    best_key, best_score = entry_key, score
+            if best_key is None or best_score < self.similarity_threshold:
+                self.misses += 1
+                return None
+            if self._entries[best_key]["literals"] != literals:
+                # Same shape of question, different values: the cached SQL would answer the wrong one
+                self.literal_mismatches += 1
+                self.misses += 1
+                return None
+            entry = self._entries[best_key]
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return {"sql_query": entry["sql_query"], "result": entry["result"], "match": "semantic",
+                    "similarity": best_score, "cached_question": entry["question"]}
+
+    def store(self, question: str, sql_query: str, result: Dict[str, Any]) -> None:
+        """Cache a successful answer together with the tables its SQL reads."""
+        tables = extract_read_tables(sql_query)
+        if not sql_query or not tables:
+            return
+        embedding = self._embed(question)
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "embedding": embedding,
+                "sql_query": sql_query,
+                "result": result,
+                "tables": tables,
+                "literals": question_literals(question),
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every entry whose SQL reads from any of the given tables."""
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["tables"] & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if stale:
+            logger.info(f"🧹 SQL cache invalidated {len(stale)} entr{'y' if len(stale) == 1 else 'ies'} for tables: {', '.join(sorted(tables))}")
+        return len(stale)
+
+    def discard(self, question: str) -> bool:
+        """Drop the entry stored for a question (e.g. its SQL no longer runs)."""
+        with self._lock:
+            return self._entries.pop(normalize_question(question), None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "literal_mismatches": self.literal_mismatches,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def register_write_invalidation(engine, cache: SQLSemanticCache) -> None:
+    """Invalidate cache entries whenever a write statement runs through engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _invalidate_on_write(conn, cursor, statement, parameters, context, executemany):
+        table = extract_write_table(statement)
+        if table:
+            cache.invalidate_tables([table])
@@ -0,0 +1,241 @@
+"""
+Shared Weaviate client for the whole process.
+
+Services and scripts call get_weaviate_client() instead of opening their own
+connection. The manager connects lazily, keeps one client (HTTP session pool
+plus a single gRPC channel) for every caller, health-checks it periodically,
+reconnects with exponential backoff after Weaviate restarts and is closed by
+the FastAPI shutdown hook.
+
+Connecting and probing happen outside the lock, by one thread at a time;
+other callers wait at most WEAVIATE_CONNECT_WAIT seconds for it. After a
+failed connect the manager fails fast with WeaviateUnavailable for
+WEAVIATE_FAILURE_COOLDOWN seconds, so an outage does not tie up the blocking
+pool with requests queued behind reconnect attempts.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import weaviate
+from dotenv import load_dotenv
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.config import ConnectionConfig
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+# HTTP connection pool shared by every thread using the client
+WEAVIATE_POOL_CONNECTIONS = int(os.getenv("WEAVIATE_POOL_CONNECTIONS", "20"))
+WEAVIATE_POOL_MAXSIZE = int(os.getenv("WEAVIATE_POOL_MAXSIZE", "100"))
+# Seconds between is_ready() probes of an already connected client
+WEAVIATE_HEALTH_CHECK_INTERVAL = float(os.getenv("WEAVIATE_HEALTH_CHECK_INTERVAL", "30"))
+# Reconnect attempts and initial backoff (doubles after each failure)
+WEAVIATE_CONNECT_RETRIES = int(os.getenv("WEAVIATE_CONNECT_RETRIES", "5"))
+WEAVIATE_RETRY_BACKOFF = float(os.getenv("WEAVIATE_RETRY_BACKOFF", "0.5"))
+WEAVIATE_RETRY_BACKOFF_MAX = 10.0
+# Seconds callers fail fast after a failed connect, and wait for another thread's connect
+WEAVIATE_FAILURE_COOLDOWN = float(os.getenv("WEAVIATE_FAILURE_COOLDOWN", "15"))
+WEAVIATE_CONNECT_WAIT = float(os.getenv("WEAVIATE_CONNECT_WAIT", "2"))
+
+
+class WeaviateUnavailable(ConnectionError):
+    """Raised without a connection attempt while Weaviate is known to be down or being reconnected."""
+
+
+class WeaviateClientManager:
+    """Owns the single Weaviate client and keeps it connected."""
+
+    def __init__(self, url: str = WEAVIATE_URL, grpc_port: int = WEAVIATE_GRPC_PORT):
+        self.url = url
+        self.grpc_port = grpc_port
+        self._client = None
+        self._lock = threading.Condition()
+        self._connecting = False
+        self._checking = False
+        # Until this monotonic time callers fail fast instead of reconnecting
+        self._retry_at = 0.0
+        self._last_health_check = 0.0
+        # Incremented on every (re)connect so callers can redo per-connection setup
+        self.generation = 0
+        self.reconnects = 0
+        self.last_error = None
+
+    def _create_client(self):
+        parsed_url = urlparse(self.url)
+        host = parsed_url.hostname
+        port = parsed_url.port or 8080
+        secure = parsed_url.scheme == 'https'
+
+        client = weaviate.connect_to_custom(
+            http_host=host,
+            http_port=port,
+            http_secure=secure,
+            grpc_host=host,
+            grpc_port=self.grpc_port,
+            grpc_secure=secure,
+            skip_init_checks=True,
+            additional_config=AdditionalConfig(
+                connection=ConnectionConfig(
+                    session_pool_connections=WEAVIATE_POOL_CONNECTIONS,
+                    session_pool_maxsize=WEAVIATE_POOL_MAXSIZE,
+                ),
+                timeout=Timeout(init=5, query=30, insert=120),
+            ),
+        )
+        return client
+
+    def _connect_with_backoff(self):
+        """Connect, retrying with exponential backoff. Runs without the lock, in one thread at a time."""
+        delay = WEAVIATE_RETRY_BACKOFF
+        for attempt in range(1, WEAVIATE_CONNECT_RETRIES + 1):
+            try:
+                logger.info(f"🔍 Connecting to Weaviate at {self.url} (attempt {attempt}/{WEAVIATE_CONNECT_RETRIES})...")
+                client = self._create_client()
+                if not client.is_ready():
+                    client.close()
+                    raise ConnectionError("Weaviate is not ready")
+                logger.info("✅ Weaviate client connected successfully")
+                return client
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt == WEAVIATE_CONNECT_RETRIES:
+                    logger.error(f"❌ Failed to connect to Weaviate after {attempt} attempts: {e}")
+                    raise
+                logger.warning(f"⚠️  Weaviate connection failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, WEAVIATE_RETRY_BACKOFF_MAX)
+
+    def _is_ready(self, client) -> bool:
+        try:
+            return client is not None and client.is_ready()
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"⚠️  Error closing Weaviate client: {e}")
+
+    def get_client(self):
+        """Return the shared client, connecting or reconnecting as needed."""
+        with self._lock:
+            waited_until = time.monotonic() + WEAVIATE_CONNECT_WAIT
+            while self._connecting:
+                remaining = waited_until - time.monotonic()
+                if remaining <= 0:
+                    raise WeaviateUnavailable(f"Weaviate at {self.url} is still connecting")
+                self._lock.wait(remaining)
+            client = self._client
+            if client is not None:
+                if self._checking or time.monotonic() - self._last_health_check < WEAVIATE_HEALTH_CHECK_INTERVAL:
+                    return client
+                # This thread probes; the others keep using the client meanwhile
+                self._checking = True
+            else:
+                retry_in = self._retry_at - time.monotonic()
+                if retry_in > 0:
+                    raise WeaviateUnavailable(f"Weaviate at {self.url} is unavailable ({self.last_error}); "
+                                              f"next connect attempt in {retry_in:.1f}s")
+                self._connecting = True
+
+        if client is not None:
+            return self._check(client)
+        return self._connect()
+
+    def _check(self, client):
+        ready = self._is_ready(client)
+        with self._lock:
+            self._checking = False
+            if ready:
+                self._last_health_check = time.monotonic()
+                return client
+            if self._client is client:
+                logger.warning("⚠️  Weaviate client failed health check, reconnecting")
+                self._client = None
+                self.reconnects += 1
+        self._close(client)
+        return self.get_client()
+
+    def _connect(self):
+        try:
+            client = self._connect_with_backoff()
+        except Exception:
+            with self._lock:
+                self._connecting = False
+                self._retry_at = time.monotonic() + WEAVIATE_FAILURE_COOLDOWN
+                self._lock.notify_all()
+            raise
+        with self._lock:
+            self._client = client
+            self._connecting = False
+            self._retry_at = 0.0
+            self._last_health_check = time.monotonic()
+            self.generation += 1
+            self.last_error = None
+            self._lock.notify_all()
+        return client
+
+    def mark_unhealthy(self):
+        """Force a health check on the next get_client() (call after a failed request)."""
+        self._last_health_check = 0.0
+
+    def health(self) -> Dict[str, Any]:
+        """Probe the connection without reconnecting."""
+        with self._lock:
+            client = self._client
+        ready = self._is_ready(client) if client is not None else False
+        with self._lock:
+            if ready and self._client is client:
+                self._last_health_check = time.monotonic()
+            return {
+                "url": self.url,
+                "connected": client is not None,
+                "ready": ready,
+                "connecting": self._connecting,
+                "retry_in_seconds": round(max(self._retry_at - time.monotonic(), 0.0), 1),
+                "generation": self.generation,
+                "reconnects": self.reconnects,
+                "last_error": self.last_error,
+            }
+
+    def close(self):
+        """Close the client; the next get_client() reconnects."""
+        with self._lock:
+            client, self._client = self._client, None
+            self._retry_at = 0.0
+        if client is not None:
+            logger.info("🔌 Closing Weaviate client")
+            self._close(client)
+
+
+# Global instance
+_weaviate_manager: Optional[WeaviateClientManager] = None
+_manager_lock = threading.Lock()
+
+def get_weaviate_manager() -> WeaviateClientManager:
+    """Get the global Weaviate client manager"""
+    global _weaviate_manager
+    with _manager_lock:
+        if _weaviate_manager is None:
+            _weaviate_manager = WeaviateClientManager()
+        return _weaviate_manager
+
+def get_weaviate_client():
+    """Get the shared, health-checked Weaviate client"""
+    return get_weaviate_manager().get_client()
+
+def close_weaviate_client() -> None:
+    """Close the shared client; called from the FastAPI shutdown hook and scripts."""
+    if _weaviate_manager is not None:
+        _weaviate_manager.close()
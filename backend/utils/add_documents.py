@@ -10,28 +10,16 @@ import sys
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-import weaviate
-from weaviate.connect import ConnectionParams
 import uuid
 from datetime import datetime
 
-# Load environment variables
-load_dotenv()
-
-WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
-client = weaviate.WeaviateClient(ConnectionParams.from_url(WEAVIATE_URL, grpc_port=50051))
-client.connect()
+sys.path.append(str(Path(__file__).parent.parent.parent))
 
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))  # characters
-OVERLAP = int(os.getenv("OVERLAP", "50"))         # characters
+from backend.services.weaviate_client import get_weaviate_client, close_weaviate_client
+from backend.utils.chunking import Chunker, strategy_for_category
 
-def chunk_text(text, chunk_size=500, overlap=50):
-    chunks = []
-    i = 0
-    while i < len(text):
-        chunks.append(text[i:i+chunk_size])
-        i += chunk_size - overlap
-    return chunks
+# Load environment variables
+load_dotenv()
 
 def add_sample_documents():
     """Add sample documents to the vector store using v4 client."""
@@ -52,12 +40,12 @@ def add_sample_documents():
             "metadata": {"source": "python_docs", "category": "web_framework"}
         }
     ]
-    docs = client.collections.get("Documents")
+    docs = get_weaviate_client().collections.get("Documents")
     for doc in documents:
         text = doc["text"]
         metadata = doc["metadata"]
         document_id = doc["id"]
-        chunks = chunk_text(text, chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+        chunks = list(Chunker(strategy_for_category(metadata.get("category"))).chunks(text))
         for idx, chunk in enumerate(chunks):
             props = dict(metadata)
             props["content"] = chunk
@@ -70,10 +58,10 @@ def add_sample_documents():
 
 def add_custom_document(text: str, source: str, category: str = "custom"):
     """Add a custom document to the vector database using v4 client."""
-    docs = client.collections.get("Documents")
+    docs = get_weaviate_client().collections.get("Documents")
     doc_id = f"doc_{uuid.uuid4().hex[:8]}"
     metadata = {"source": source, "category": category}
-    chunks = chunk_text(text, chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+    chunks = list(Chunker(strategy_for_category(category)).chunks(text))
     for idx, chunk in enumerate(chunks):
         props = dict(metadata)
         props["content"] = chunk
@@ -84,15 +72,18 @@ def add_custom_document(text: str, source: str, category: str = "custom"):
     print(f"Added custom document: {source} as {len(chunks)} chunk(s)")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        # If arguments provided, add custom document
-        if len(sys.argv) >= 3:
-            text = sys.argv[1]
-            source = sys.argv[2]
-            category = sys.argv[3] if len(sys.argv) > 3 else "custom"
-            add_custom_document(text, source, category)
+    try:
+        if len(sys.argv) > 1:
+            # If arguments provided, add custom document
+            if len(sys.argv) >= 3:
+                text = sys.argv[1]
+                source = sys.argv[2]
+                category = sys.argv[3] if len(sys.argv) > 3 else "custom"
+                add_custom_document(text, source, category)
+            else:
+                print("Usage: python add_documents.py <text> <source> [category]")
         else:
-            print("Usage: python add_documents.py <text> <source> [category]")
-    else:
-        # Add sample documents
-        add_sample_documents() 
\ No newline at end of file
+            # Add sample documents
+            add_sample_documents()
+    finally:
+        close_weaviate_client()
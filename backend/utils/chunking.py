@@ -0,0 +1,236 @@
+"""
+Token-aware, structure-preserving text chunking.
+
+Chunks are packed from whole sentences (or whole paragraphs) up to the
+embedding model's token limit, so no chunk is silently truncated by the
+model and words and sentences are not cut in half. Chunkers are generators:
+they accept a string or any iterable of text pieces (pages, lines) and yield
+chunks as soon as they are full, so large documents never need to be held as
+one list of chunks.
+
+Strategies:
+    sentence  - pack sentences greedily, across paragraph boundaries
+    paragraph - start a new chunk at a paragraph boundary when the next
+                paragraph does not fit; oversized paragraphs fall back to
+                sentence packing
+    fixed     - the original fixed-size character windows (CHUNK_SIZE/OVERLAP)
+"""
+
+import json
+import math
+import os
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default strategy, and per-category overrides as JSON, e.g. {"Legal & Compliance": "paragraph"}
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "sentence").lower()
+CHUNK_STRATEGY_BY_CATEGORY = os.getenv("CHUNK_STRATEGY_BY_CATEGORY", "")
+# Token budget per chunk (0 = the embedding model's max_seq_length) and token overlap between chunks
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Character window for the "fixed" strategy
+DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+DEFAULT_OVERLAP = int(os.getenv("OVERLAP", "50"))
+
+STRATEGIES = ("sentence", "paragraph", "fixed")
+# Used when no model is available to tell us its limit
+FALLBACK_MAX_TOKENS = 512
+# Longest run of text held while waiting for a paragraph break
+MAX_PARAGRAPH_CHARS = 100000
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_counter(texts: List[str]) -> List[int]:
+    """Estimate WordPiece token counts (~1.3 tokens per word or symbol) without a tokenizer."""
+    return [math.ceil(len(_WORD.findall(text)) * 1.3) for text in texts]
+
+def hf_token_counter(tokenizer) -> TokenCounter:
+    """Token counter backed by a Hugging Face tokenizer (e.g. SentenceTransformer.tokenizer)."""
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        encoded = tokenizer(texts, add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+    return count
+
+
+def iter_paragraphs(source: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Yield paragraphs from a string or a stream of text pieces, buffering only the current paragraph."""
+    pieces = [source] if isinstance(source, str) else source
+    buffer = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        buffer += piece
+        parts = _PARAGRAPH_BREAK.split(buffer)
+        # The last part may continue in the next piece
+        buffer = parts.pop()
+        for part in parts:
+            paragraph = " ".join(part.split())
+            if paragraph:
+                yield paragraph
+        # Text without blank lines is cut at a line or sentence end so the buffer stays bounded
+        while len(buffer) > MAX_PARAGRAPH_CHARS:
+            cut = max(buffer.rfind("\n", 0, MAX_PARAGRAPH_CHARS), buffer.rfind(". ", 0, MAX_PARAGRAPH_CHARS) + 1)
+            if cut <= 0:
+                cut = buffer.rfind(" ", 0, MAX_PARAGRAPH_CHARS)
+            if cut <= 0:
+                cut = MAX_PARAGRAPH_CHARS
+            paragraph = " ".join(buffer[:cut].split())
+            buffer = buffer[cut:]
+            if paragraph:
+                yield paragraph
+    paragraph = " ".join(buffer.split())
+    if paragraph:
+        yield paragraph
+
+def split_sentences(paragraph: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(paragraph) if sentence]
+
+
+class Chunker:
+    """Packs sentences or paragraphs into chunks that fit a token budget."""
+
+    def __init__(self, strategy: str = CHUNK_STRATEGY, max_tokens: int = None, overlap_tokens: int = None,
+                 token_counter: TokenCounter = None, chunk_size: int = None, overlap: int = None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy: {strategy} (expected one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.max_tokens = max_tokens or CHUNK_MAX_TOKENS or FALLBACK_MAX_TOKENS
+        self.overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        # Keep the overlap well below the budget so every chunk makes progress
+        self.overlap_tokens = min(self.overlap_tokens, self.max_tokens // 4)
+        self.count_tokens = token_counter or approximate_token_counter
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.overlap = DEFAULT_OVERLAP if overlap is None else overlap
+
+    @property
+    def signature(self) -> str:
+        """Identifies the chunking configuration (stored in document hashes)."""
+        if self.strategy == "fixed":
+            return f"fixed:{self.chunk_size}:{self.overlap}"
+        return f"{self.strategy}:{self.max_tokens}:{self.overlap_tokens}"
+
+    def chunks(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yield chunks from a string or a stream of text pieces."""
+        if self.strategy == "fixed":
+            yield from self._fixed_stream(source)
+            return
+
+        current: List[str] = []
+        current_tokens: List[int] = []
+        total = 0
+        for paragraph in iter_paragraphs(source):
+            units = split_sentences(paragraph)
+            counts = self.count_tokens(units)
+            units, counts = self._split_oversized(units, counts)
+
+            if self.strategy == "paragraph" and current:
+                paragraph_tokens = sum(counts)
+                if paragraph_tokens <= self.max_tokens and total + paragraph_tokens > self.max_tokens:
+                    # Start the paragraph in a fresh chunk; no overlap across paragraph boundaries
+                    yield self._join(current)
+                    current, current_tokens, total = [], [], 0
+
+            for index, (unit, count) in enumerate(zip(units, counts)):
+                if current and total + count > self.max_tokens:
+                    yield self._join(current)
+                    current, current_tokens = self._overlap_tail(current, current_tokens, count)
+                    total = sum(current_tokens)
+                # Paragraph boundaries are kept as blank lines inside a chunk
+                current.append(unit if index or not current else "\n\n" + unit)
+                current_tokens.append(count)
+                total += count
+        if current:
+            yield self._join(current)
+
+    def _fixed_stream(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """fixed_chunks() over a stream, holding at most one window plus one piece."""
+        if isinstance(source, str):
+            yield from fixed_chunks(source, self.chunk_size, self.overlap)
+            return
+        step = self.chunk_size - self.overlap
+        buffer = ""
+        for piece in source:
+            buffer += piece
+            while len(buffer) >= self.chunk_size + step:
+                chunk = buffer[:self.chunk_size].strip()
+                if chunk:
+                    yield chunk
+                buffer = buffer[step:]
+        yield from fixed_chunks(buffer, self.chunk_size, self.overlap)
+
+    def _split_oversized(self, units: List[str], counts: List[int]):
+        """Split sentences longer than the budget at word boundaries."""
+        if all(count <= self.max_tokens for count in counts):
+            return units, counts
+        split_units, split_counts = [], []
+        for unit, count in zip(units, counts):
+            if count <= self.max_tokens:
+                split_units.append(unit)
+                split_counts.append(count)
+                continue
+            words = unit.split(" ")
+            # Words per piece scaled from the measured token density, then re-measured
+            step = max(int(len(words) * self.max_tokens / count * 0.9), 1)
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+            split_units.extend(pieces)
+            split_counts.extend(self.count_tokens(pieces))
+        return split_units, split_counts
+
+    def _overlap_tail(self, units: List[str], counts: List[int], next_count: int):
+        """Trailing sentences of the previous chunk that fit in the overlap budget."""
+        tail, tail_counts = [], []
+        budget = min(self.overlap_tokens, self.max_tokens - next_count)
+        for unit, count in zip(reversed(units), reversed(counts)):
+            if sum(tail_counts) + count > budget:
+                break
+            tail.insert(0, unit.lstrip("\n"))
+            tail_counts.insert(0, count)
+        return tail, tail_counts
+
+    @staticmethod
+    def _join(units: List[str]) -> str:
+        return " ".join(units).replace(" \n\n", "\n\n").strip()
+
+
+def fixed_chunks(text: str, chunk_size: int = None, overlap: int = None) -> Iterator[str]:
+    """Original fixed-size character windows with character overlap."""
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if overlap is None:
+        overlap = DEFAULT_OVERLAP
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        start += chunk_size - overlap
+
+
+def _load_category_strategies() -> Dict[str, str]:
+    if not CHUNK_STRATEGY_BY_CATEGORY:
+        return {}
+    try:
+        mapping = json.loads(CHUNK_STRATEGY_BY_CATEGORY)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"CHUNK_STRATEGY_BY_CATEGORY is not valid JSON: {e}")
+    return {str(category).lower(): str(strategy).lower() for category, strategy in mapping.items()}
+
+_category_strategies = _load_category_strategies()
+
+def strategy_for_category(category: Optional[str]) -> str:
+    """Chunking strategy configured for a document category (falls back to CHUNK_STRATEGY)."""
+    if category:
+        return _category_strategies.get(category.lower(), CHUNK_STRATEGY)
+    return CHUNK_STRATEGY
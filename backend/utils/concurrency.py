@@ -0,0 +1,45 @@
+"""
+Bounded thread pool for running blocking work off the asyncio event loop.
+
+SQLAlchemy sessions, the LangChain SQL agent, SentenceTransformer encoding
+and the synchronous Weaviate client all block. Route handlers hand that work
+to run_blocking() so one slow request cannot stall every other stream on the
+worker.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of blocking calls running at once per worker process
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+
+_executor = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the shared blocking-work executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        logger.info(f"🧵 Starting blocking work pool with {BLOCKING_POOL_SIZE} threads")
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+    return _executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable in the shared pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut the pool down; called from the FastAPI shutdown hook."""
+    global _executor
+    if _executor is not None:
+        logger.info("🧵 Shutting down blocking work pool")
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,51 @@
+"""
+Content hashes and stable ids for incremental ingestion.
+
+Kept free of model and vector-store imports so ingestion worker processes
+can hash documents without loading either.
+"""
+
+import hashlib
+import uuid
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# Chunk properties that are part of a chunk's hash (metadata edits re-write the chunk)
+HASHED_CHUNK_PROPERTIES = ("category", "location", "source")
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of text; used to detect unchanged documents and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def stable_document_id(source: str) -> str:
+    """Deterministic document id for a source, so re-ingesting it updates instead of duplicating."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, source))
+
+def chunk_hash(chunk: str, metadata: Optional[Dict[str, Any]]) -> str:
+    metadata = metadata or {}
+    return content_hash("\x1f".join([chunk] + [str(metadata.get(name, "")) for name in HASHED_CHUNK_PROPERTIES]))
+
+class DocumentHasher:
+    """Incremental document_hash(), for hashing blocks while they are being chunked."""
+
+    def __init__(self, chunker_signature: str):
+        # The chunking configuration is part of the hash: changing it re-chunks every document
+        self._digest = hashlib.sha256(chunker_signature.encode("utf-8"))
+
+    def update(self, block: str) -> None:
+        self._digest.update(block.encode("utf-8"))
+
+    def wrap(self, blocks: Iterable[str]) -> Iterator[str]:
+        """Pass blocks through unchanged, hashing each one on the way."""
+        for block in blocks:
+            self.update(block)
+            yield block
+
+    def hexdigest(self, metadata: Optional[Dict[str, Any]]) -> str:
+        return chunk_hash(self._digest.hexdigest(), metadata)
+
+def document_hash(blocks: Iterable[str], metadata: Optional[Dict[str, Any]], chunker_signature: str) -> str:
+    hasher = DocumentHasher(chunker_signature)
+    for block in blocks:
+        hasher.update(block)
+    return hasher.hexdigest(metadata)
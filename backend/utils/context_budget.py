@@ -0,0 +1,133 @@
+"""
+Token-budgeted prompt assembly.
+
+A prompt is packed into CONTEXT_TOKEN_BUDGET tokens. Required text (the
+system instruction and the user's message) is always kept; optional sections
+are then filled in CONTEXT_PRIORITY order until the budget is spent:
+
+    chunks  - retrieved chunks in rank order; a chunk that does not fit is
+              skipped so a smaller, lower-ranked one can still be used
+    history - most recent messages first, stopping at the first one that
+              does not fit so the kept history stays contiguous
+    schema  - database schema lines from the top, stopping the same way
+
+Token counts come from tiktoken when it is installed (the encoding of
+OPENAI_MODEL) and otherwise from the WordPiece estimate in chunking.py.
+Counts are cached per text, so the system instruction, earlier turns and
+frequently retrieved chunks are only tokenized once.
+"""
+
+import logging
+import os
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from backend.utils.chunking import TokenCounter, approximate_token_counter
+from backend.utils.content_hashing import content_hash
+from backend.utils.lru_cache import TTLLRUCache
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Prompt tokens (system instruction, context, history and message; not the reply)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Order in which optional sections are given the tokens left after the required text
+CONTEXT_PRIORITY = [name.strip() for name in os.getenv("CONTEXT_PRIORITY", "chunks,history,schema").split(",") if name.strip()]
+# "tiktoken", "approximate", or "auto" (tiktoken when installed)
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "auto").lower()
+CONTEXT_TOKEN_CACHE_SIZE = int(os.getenv("CONTEXT_TOKEN_CACHE_SIZE", "20000"))
+
+# Chat formats add a few tokens of framing per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# A section of optional prompt text. items are tried in order; header is paid once,
+# when the first item is kept, and overhead once per kept item.
+# contiguous sections stop at the first item that does not fit instead of skipping it.
+Section = namedtuple("Section", ["name", "items", "contiguous", "overhead", "header"], defaults=(False, 0, ""))
+
+# kept maps each section name to the indices of its kept items, in item order
+PackedContext = namedtuple("PackedContext", ["kept", "dropped", "tokens", "budget"])
+
+
+def tiktoken_token_counter(model: str) -> TokenCounter:
+    """Token counter using the tiktoken encoding of an OpenAI model (cl100k_base if unknown)."""
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    def count(texts: List[str]) -> List[int]:
+        return [len(ids) for ids in encoding.encode_ordinary_batch(texts)] if texts else []
+    return count
+
+def default_token_counter() -> TokenCounter:
+    if CONTEXT_TOKENIZER in ("auto", "tiktoken") and TIKTOKEN_AVAILABLE:
+        try:
+            return tiktoken_token_counter(os.getenv("OPENAI_MODEL", "gpt-4"))
+        except Exception as e:
+            logger.warning(f"⚠️  Could not load tiktoken encoding, estimating prompt tokens: {e}")
+    elif CONTEXT_TOKENIZER == "tiktoken":
+        logger.warning("⚠️  tiktoken not available, estimating prompt tokens")
+    return approximate_token_counter
+
+
+class ContextBudget:
+    """Packs prompt sections into a token budget by priority, with cached token counts."""
+
+    def __init__(self, max_tokens: int = CONTEXT_TOKEN_BUDGET, counter: Optional[TokenCounter] = None,
+                 priority: Sequence[str] = CONTEXT_PRIORITY):
+        self.max_tokens = max_tokens
+        self.counter = counter or default_token_counter()
+        self.priority = list(priority)
+        self.token_cache = TTLLRUCache(max_size=CONTEXT_TOKEN_CACHE_SIZE, name="context_tokens")
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Token counts for texts; uncached texts are tokenized in one batch."""
+        keys = [content_hash(text) for text in texts]
+        counts = [self.token_cache.get(key) for key in keys]
+        missing = [index for index, count in enumerate(counts) if count is None]
+        if missing:
+            for index, count in zip(missing, self.counter([texts[index] for index in missing])):
+                counts[index] = count
+                self.token_cache.put(keys[index], count)
+        return counts
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0] if text else 0
+
+    def pack(self, required: Sequence[str], sections: Sequence[Section]) -> PackedContext:
+        """Keep all required text, then as much of each section as fits, in priority order."""
+        used = sum(self.count_many([text for text in required if text]))
+        if used > self.max_tokens:
+            logger.warning(f"⚠️  Required prompt text alone is {used} tokens (budget {self.max_tokens})")
+
+        rank = {name: index for index, name in enumerate(self.priority)}
+        ordered = sorted(sections, key=lambda section: rank.get(section.name, len(rank)))
+        kept: Dict[str, List[int]] = {}
+        dropped: Dict[str, int] = {}
+        for section in ordered:
+            indices = []
+            costs = self.count_many(list(section.items))
+            header = self.count(section.header)
+            for index, cost in enumerate(costs):
+                cost += section.overhead + (0 if indices else header)
+                if used + cost <= self.max_tokens:
+                    indices.append(index)
+                    used += cost
+                elif section.contiguous:
+                    break
+            kept[section.name] = indices
+            dropped[section.name] = len(costs) - len(indices)
+
+        if any(dropped.values()):
+            logger.info(f"✂️  Prompt packed to {used}/{self.max_tokens} tokens - dropped " +
+                        ", ".join(f"{count} {name}" for name, count in dropped.items() if count))
+        return PackedContext(kept, dropped, used, self.max_tokens)
@@ -0,0 +1,85 @@
+"""
+Cooperative per-request deadlines and cancellation.
+
+Unlike signal.alarm, a Deadline works from any thread: long-running code
+calls check() at safe points (between agent steps, before LLM calls, before
+SQL execution) and gets DeadlineExceeded once time is up or the request has
+been cancelled. The active deadline is kept in a context variable so nested
+helpers can find it without threading it through every signature.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's deadline passes or the request is cancelled."""
+
+
+class Deadline:
+    """A point in time after which work for one request should stop."""
+
+    def __init__(self, seconds: float, name: str = "request"):
+        self.seconds = seconds
+        self.name = name
+        self.expires_at = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def child(self, seconds: float, name: Optional[str] = None) -> "Deadline":
+        """A tighter deadline that also stops when this one is cancelled."""
+        child = Deadline(seconds, name=name or self.name)
+        child.expires_at = min(child.expires_at, self.expires_at)
+        child.seconds = min(seconds, self.seconds)
+        child._cancelled = self._cancelled
+        return child
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def remaining_ms(self) -> int:
+        return int(self.remaining() * 1000)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.expires_at
+
+    def cancel(self) -> None:
+        """Ask the work guarded by this deadline to stop at its next check()."""
+        self._cancelled.set()
+
+    def check(self, stage: str = "") -> None:
+        """Raise DeadlineExceeded if the deadline has passed or was cancelled."""
+        if self.cancelled:
+            raise DeadlineExceeded(f"{self.name} cancelled" + (f" during {stage}" if stage else ""))
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(f"{self.name} timed out after {self.seconds:g} seconds" + (f" during {stage}" if stage else ""))
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("current_deadline", default=None)
+
+def get_current_deadline() -> Optional[Deadline]:
+    """Return the deadline active in this context, if any."""
+    return _current_deadline.get()
+
+def check_deadline(stage: str = "") -> None:
+    """Check the active deadline, if there is one."""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make deadline the active deadline for the duration of the block."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,120 @@
+"""
+Streaming text extraction for document ingestion.
+
+iter_text_blocks() yields a file's text as a sequence of blocks (a page, a
+few paragraphs, a group of spreadsheet rows) instead of building one string,
+so the chunker can consume even very large files with memory bounded by the
+block and chunk size rather than by the file size.
+"""
+
+import csv
+import os
+from pathlib import Path
+from typing import Iterator, List, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Characters read per block from plain-text files
+TEXT_BLOCK_CHARS = int(os.getenv("EXTRACT_TEXT_BLOCK_CHARS", "65536"))
+# Spreadsheet rows rendered per block (each row becomes one paragraph)
+TABLE_ROWS_PER_BLOCK = int(os.getenv("EXTRACT_TABLE_ROWS_PER_BLOCK", "20"))
+
+SUPPORTED_EXTENSIONS = {".txt", ".pdf", ".docx", ".csv", ".xlsx"}
+
+
+def iter_text_blocks(file_path: str) -> Iterator[str]:
+    """Yield the text of a .txt, .pdf, .docx, .csv or .xlsx file block by block."""
+    ext = Path(file_path).suffix.lower()
+    if ext == ".txt":
+        return _iter_txt(file_path)
+    if ext == ".pdf":
+        return _iter_pdf(file_path)
+    if ext == ".docx":
+        return _iter_docx(file_path)
+    if ext == ".csv":
+        return _iter_csv(file_path)
+    if ext == ".xlsx":
+        return _iter_xlsx(file_path)
+    raise ValueError(f"Unsupported file type: {ext}")
+
+def extract_text(file_path: str) -> str:
+    """Whole-file text; only for small files and callers that need a string."""
+    return "".join(iter_text_blocks(file_path))
+
+
+def _iter_txt(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(TEXT_BLOCK_CHARS)
+            if not block:
+                return
+            yield block
+
+def _iter_pdf(file_path: str) -> Iterator[str]:
+    try:
+        import PyPDF2
+    except ImportError:
+        raise ImportError("PyPDF2 is not installed. Please install it to process PDF files.")
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                # Page breaks are treated as paragraph breaks
+                yield page_text + "\n\n"
+
+def _iter_docx(file_path: str) -> Iterator[str]:
+    try:
+        from docx import Document
+    except ImportError:
+        raise ImportError("python-docx is not installed. Please install it to process DOCX files.")
+    doc = Document(file_path)
+    for para in doc.paragraphs:
+        if para.text.strip():
+            yield para.text + "\n\n"
+
+def _format_row(header: Sequence[str], row: Sequence) -> str:
+    cells = []
+    for index, value in enumerate(row):
+        if value is None or value == "":
+            continue
+        name = header[index] if index < len(header) and header[index] else f"column_{index + 1}"
+        cells.append(f"{name}: {value}")
+    return " | ".join(cells)
+
+def _iter_table_rows(rows: Iterator[Sequence], title: str = None) -> Iterator[str]:
+    """Render each row as a "column: value | ..." paragraph, TABLE_ROWS_PER_BLOCK rows per block."""
+    header = None
+    block: List[str] = [title] if title else []
+    for row in rows:
+        if header is None:
+            header = ["" if cell is None else str(cell).strip() for cell in row]
+            continue
+        line = _format_row(header, row)
+        if line:
+            block.append(line)
+        if len(block) >= TABLE_ROWS_PER_BLOCK:
+            yield "\n\n".join(block) + "\n\n"
+            block = []
+    if block:
+        yield "\n\n".join(block) + "\n\n"
+
+def _iter_csv(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        yield from _iter_table_rows(csv.reader(f))
+
+def _iter_xlsx(file_path: str) -> Iterator[str]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("openpyxl is not installed. Please install it to process XLSX files.")
+    # read_only streams rows from the sheet XML instead of loading every cell
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            title = f"Sheet: {sheet.title}" if len(workbook.sheetnames) > 1 else None
+            yield from _iter_table_rows(sheet.iter_rows(values_only=True), title)
+    finally:
+        workbook.close()
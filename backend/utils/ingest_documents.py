@@ -2,23 +2,24 @@
 Document Ingestion Utility
 
 This script processes and ingests documents into the Weaviate vector store.
-Supports PDF and DOCX files with automatic text extraction and chunking.
+Supports TXT, PDF, DOCX, CSV and XLSX files; text is extracted as a stream
+of blocks and chunked as it is read, so large files are never held in memory whole.
 """
 
 import os
 import sys
-import uuid
+import time
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, List
 from dotenv import load_dotenv
-import weaviate
-from weaviate.connect import ConnectionParams
 
+from backend.utils.content_hashing import stable_document_id
+from backend.utils.extractors import SUPPORTED_EXTENSIONS, extract_text, iter_text_blocks
+
+# Vector store access goes through RAGService and the shared Weaviate client;
+# importing this module (e.g. from the upload route) must not open a connection.
 load_dotenv()
-WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
-client = weaviate.WeaviateClient(ConnectionParams.from_url(WEAVIATE_URL, grpc_port=50051))
-client.connect()
 
 # ---
 def process_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -35,43 +36,29 @@ def process_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     return processed
 
 def extract_text_from_file(file_path: str) -> str:
-    ext = Path(file_path).suffix.lower()
-    if ext == ".txt":
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    elif ext == ".pdf":
-        try:
-            import PyPDF2
-        except ImportError:
-            print("❌ PyPDF2 is not installed. Please install it to process PDF files.")
-            sys.exit(1)
-        with open(file_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return text
-    elif ext == ".docx":
-        try:
-            from docx import Document
-        except ImportError:
-            print("❌ python-docx is not installed. Please install it to process DOCX files.")
-            sys.exit(1)
-        doc = Document(file_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
+    """Whole-file text; ingestion streams blocks via iter_text_blocks instead."""
+    return extract_text(file_path)
 
-def ingest_document(file_path: str, metadata: Dict[str, Any] = None) -> str:
-    """Ingest a single .txt, .pdf, or .docx document into the vector store."""
-    document_id = str(uuid.uuid4())
-    if metadata is None:
-        metadata = {}
+# Metadata that identifies an uploaded document: the same filename uploaded for another
+# category, location or by another user is a different document
+DOCUMENT_KEY_FIELDS = ("source", "category", "location", "uploaded_by")
+
+def document_source_key(metadata: Dict[str, Any]) -> str:
+    return "\x1f".join(str(metadata.get(name) or "") for name in DOCUMENT_KEY_FIELDS)
+
+def prepare_document(file_path: str, metadata: Dict[str, Any] = None, source_key: str = None) -> Dict[str, Any]:
+    """
+    Build metadata and a streaming text source for a file without embedding it yet.
+
+    The document id is derived from source_key (default: the metadata "source"
+    together with its category, location and uploader, else the absolute file
+    path), so ingesting the same source again re-syncs its chunks instead of
+    adding a duplicate document.
+    """
+    metadata = dict(metadata) if metadata else {}
+    if not source_key:
+        source_key = document_source_key(metadata) if metadata.get("source") else os.path.abspath(file_path)
+    document_id = stable_document_id(source_key)
     file_info = {
         "filename": os.path.basename(file_path),
         "file_path": file_path,
@@ -80,46 +67,102 @@ def ingest_document(file_path: str, metadata: Dict[str, Any] = None) -> str:
     }
     metadata.update(file_info)
     processed_metadata = process_metadata(metadata)
+
+    ext = Path(file_path).suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    # Text is extracted lazily, block by block, while the document is chunked
+    return {
+        "document_id": document_id,
+        "blocks": lambda: iter_text_blocks(file_path),
+        "size": os.path.getsize(file_path),
+        "metadata": processed_metadata
+    }
+
+def ingest_document(file_path: str, metadata: Dict[str, Any] = None) -> str:
+    """Ingest a single .txt, .pdf, .docx, .csv or .xlsx document into the vector store."""
+    document = prepare_document(file_path, metadata)
     
     # Use RAG service to properly ingest with embeddings
     from backend.services.rag_service import RAGService
     rag_service = RAGService()
     
-    # Extract text from file
-    text = extract_text_from_file(file_path)
-    
-    # Add document using RAG service (which handles chunking and embedding)
-    rag_service.add_document(document_id, text, processed_metadata)
+    # Add document using RAG service (which handles chunking and batched embedding)
+    stats = rag_service.add_documents([document])
     
-    print(f"✅ Successfully ingested: {file_path} as {len(text) // 500 + 1} chunks")
-    return document_id
+    print(f"✅ Successfully ingested: {file_path} as {stats['total_chunks']} chunks "
+          f"({stats['inserted_chunks']} new, {stats['replaced_chunks']} changed, {stats['deleted_chunks']} removed, {stats['unchanged_chunks']} unchanged)")
+    return document["document_id"]
 
 def ingest_directory(directory_path: str, metadata: Dict[str, Any] = None) -> List[str]:
-    supported_extensions = {'.txt', '.pdf', '.docx'}
+    """Ingest every supported file in a directory, batching embeddings across files."""
+    from backend.services.rag_service import RAGService, EMBED_BATCH_SIZE
+    rag_service = RAGService()
+
     ingested_files = []
     directory = Path(directory_path)
     if not directory.exists():
         raise FileNotFoundError(f"Directory not found: {directory_path}")
-    files = [f for f in directory.rglob('*') if f.is_file() and f.suffix.lower() in supported_extensions]
+    files = [f for f in directory.rglob('*') if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS]
     if not files:
         print(f"📭 No supported files found in {directory_path}")
         return []
     print(f"📁 Found {len(files)} files to ingest:")
     for file in files:
         print(f"   - {file}")
+
+    # Small files are grouped until they fill at least one embedding batch
+    # (chunk count estimated from the file size at ~4 characters per token)
+    step = max(rag_service.max_chunk_tokens * 4, 1)
+    pending = []
+    pending_chunks = 0
+    total_chunks = 0
+    changes = {"inserted_chunks": 0, "replaced_chunks": 0, "deleted_chunks": 0, "unchanged_chunks": 0}
+    start_time = time.time()
+
+    def flush():
+        nonlocal pending, pending_chunks, total_chunks
+        if not pending:
+            return
+        try:
+            stats = rag_service.add_documents(pending)
+            ingested_files.extend(document["document_id"] for document in pending)
+            total_chunks += stats["total_chunks"]
+            for key in changes:
+                changes[key] += stats[key]
+        except Exception as e:
+            names = ", ".join(document["metadata"].get("filename", "") for document in pending)
+            print(f"⚠️  Skipping batch ({names}): {e}")
+        pending = []
+        pending_chunks = 0
+
     for file_path in files:
         try:
-            document_id = ingest_document(str(file_path), metadata)
-            ingested_files.append(document_id)
+            document = prepare_document(str(file_path), metadata, source_key=str(file_path.resolve()))
         except Exception as e:
             print(f"⚠️  Skipping {file_path}: {e}")
             continue
+        pending.append(document)
+        pending_chunks += document["size"] // step + 1
+        if pending_chunks >= EMBED_BATCH_SIZE:
+            flush()
+    flush()
+
+    duration = time.time() - start_time
+    chunks_per_sec = total_chunks / duration if duration > 0 else float(total_chunks)
     print(f"🎉 Successfully ingested {len(ingested_files)} out of {len(files)} files")
+    print(f"📊 {total_chunks} chunks in {duration:.2f}s ({chunks_per_sec:.1f} chunks/sec)")
+    print(f"🔁 {changes['inserted_chunks']} new, {changes['replaced_chunks']} changed, "
+          f"{changes['deleted_chunks']} removed, {changes['unchanged_chunks']} unchanged")
     return ingested_files
 
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser(description="Ingest .txt, .pdf, .docx documents into vector store")
+    import atexit
+    from backend.services.weaviate_client import close_weaviate_client
+    atexit.register(close_weaviate_client)
+    parser = argparse.ArgumentParser(description="Ingest .txt, .pdf, .docx, .csv, .xlsx documents into vector store")
     parser.add_argument("path", help="File or directory path to ingest")
     parser.add_argument("--metadata", help="Additional metadata as JSON string")
     args = parser.parse_args()
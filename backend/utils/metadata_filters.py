@@ -0,0 +1,134 @@
+"""
+Metadata filters for retrieval.
+
+A filter spec maps a chunk property to a condition:
+
+    {"category": "Human Resources"}                      equality
+    {"location": ["Headquarters", "All Locations"]}      IN (any of)
+    {"upload_date": {"gte": "2024-01-01", "lt": "2025-01-01"}}   range
+    {"category": {"in": [...]}, "upload_date": {"gt": ...}}      combined (AND)
+
+parse_metadata_filter() validates a spec into conditions, which can be turned
+into a Weaviate filter (pre-filtered ANN search) or evaluated in Python
+against returned objects (post-filtering).
+"""
+
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Hashable, List
+
+# Filterable chunk properties and their types
+FILTERABLE_PROPERTIES = {
+    "category": "text",
+    "location": "text",
+    "source": "text",
+    "document_id": "text",
+    "upload_date": "date",
+}
+OPERATORS = ("eq", "ne", "in", "gt", "gte", "lt", "lte")
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+Condition = namedtuple("Condition", ["prop", "op", "value"])
+
+
+def _parse_date(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid date in metadata filter: {value!r} (expected ISO 8601)")
+    else:
+        raise ValueError(f"Invalid date in metadata filter: {value!r}")
+    # Naive dates are taken as UTC, matching how upload_date is stored
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _coerce(prop: str, value: Any) -> Any:
+    if FILTERABLE_PROPERTIES[prop] == "date":
+        return _parse_date(value)
+    return str(value)
+
+def parse_metadata_filter(spec: Dict[str, Any]) -> List[Condition]:
+    """Validate a filter spec and return its conditions (all must hold)."""
+    conditions = []
+    for prop, condition in (spec or {}).items():
+        if prop not in FILTERABLE_PROPERTIES:
+            raise ValueError(f"Cannot filter on {prop!r} (filterable: {', '.join(FILTERABLE_PROPERTIES)})")
+        if isinstance(condition, dict):
+            operators = condition.items()
+        elif isinstance(condition, (list, tuple, set)):
+            operators = [("in", condition)]
+        else:
+            operators = [("eq", condition)]
+        for op, value in operators:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown filter operator {op!r} on {prop} (expected one of {', '.join(OPERATORS)})")
+            if op in RANGE_OPERATORS and FILTERABLE_PROPERTIES[prop] != "date":
+                raise ValueError(f"Range operator {op!r} is only supported on date properties, not {prop}")
+            if op == "in":
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                if not values:
+                    raise ValueError(f"Empty 'in' list for {prop}")
+                conditions.append(Condition(prop, op, tuple(_coerce(prop, item) for item in values)))
+            else:
+                conditions.append(Condition(prop, op, _coerce(prop, value)))
+    return conditions
+
+def filter_key(conditions: List[Condition]) -> Hashable:
+    """Order-independent key for caching per-filter statistics."""
+    return tuple(sorted((c.prop, c.op, c.value if not isinstance(c.value, tuple) else tuple(sorted(c.value, key=str)))
+                        for c in conditions))
+
+def to_weaviate_filter(conditions: List[Condition]):
+    """Weaviate v4 filter for the conditions (None when there are none)."""
+    from weaviate.classes.query import Filter
+
+    parts = []
+    for c in conditions:
+        field = Filter.by_property(c.prop)
+        if c.op == "eq":
+            parts.append(field.equal(c.value))
+        elif c.op == "ne":
+            parts.append(field.not_equal(c.value))
+        elif c.op == "in":
+            parts.append(field.contains_any(list(c.value)))
+        elif c.op == "gt":
+            parts.append(field.greater_than(c.value))
+        elif c.op == "gte":
+            parts.append(field.greater_or_equal(c.value))
+        elif c.op == "lt":
+            parts.append(field.less_than(c.value))
+        elif c.op == "lte":
+            parts.append(field.less_or_equal(c.value))
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else Filter.all_of(parts)
+
+def matches(conditions: List[Condition], properties: Dict[str, Any]) -> bool:
+    """Evaluate the conditions against a returned object's properties (post-filtering)."""
+    for c in conditions:
+        value = properties.get(c.prop)
+        if value is None:
+            return False
+        if FILTERABLE_PROPERTIES[c.prop] == "date":
+            value = _parse_date(value)
+        else:
+            value = str(value)
+        if c.op == "eq" and value != c.value:
+            return False
+        if c.op == "ne" and value == c.value:
+            return False
+        if c.op == "in" and value not in c.value:
+            return False
+        if c.op == "gt" and not value > c.value:
+            return False
+        if c.op == "gte" and not value >= c.value:
+            return False
+        if c.op == "lt" and not value < c.value:
+            return False
+        if c.op == "lte" and not value <= c.value:
+            return False
+    return True
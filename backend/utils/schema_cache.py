@@ -0,0 +1,108 @@
+"""
+Process-wide cache for database schema introspection.
+
+Reflecting ~17 tables and running sample SELECTs on every chat turn is
+wasteful when the schema only changes on init_db or a migration. Callers
+load schema views through SchemaCache.get(); the cache is invalidated
+explicitly (init_db, admin endpoint) or automatically when DDL runs through
+an engine registered with register_ddl_invalidation().
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+_DDL_PATTERN = re.compile(r'^\s*(?:create|alter|drop|rename|comment\s+on)\b', re.IGNORECASE)
+
+class SchemaCache:
+    """Caches schema views by key until the next invalidation."""
+
+    def __init__(self):
+        self._values: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+        self.generation = 0
+        self.loaded_at = None
+        self.invalidated_at = time.time()
+        self.last_invalidation_reason = "startup"
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, calling loader on a miss.
+
+        Args:
+            key: Identifies the schema view (include the engine URL when several databases are used)
+            loader: Performs the actual introspection; exceptions propagate and nothing is cached
+        """
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            generation = self.generation
+
+        value = loader()
+
+        with self._lock:
+            # Drop results that raced with an invalidation
+            if generation == self.generation:
+                self._values[key] = value
+                self.loaded_at = time.time()
+        return value
+
+    def invalidate(self, reason: str = "manual") -> int:
+        """Forget every cached schema view and bump the generation."""
+        with self._lock:
+            self._values.clear()
+            self.generation += 1
+            self.invalidated_at = time.time()
+            self.last_invalidation_reason = reason
+            generation = self.generation
+        logger.info(f"🔄 Schema cache invalidated ({reason}) - generation {generation}")
+        return generation
+
+    def version_hash(self) -> str:
+        """Short hash of the cached schema contents; changes whenever the schema does."""
+        with self._lock:
+            items = sorted((repr(key), value) for key, value in self._values.items())
+        payload = json.dumps(items, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def version(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "hash": self.version_hash(),
+                "cached_views": len(self._values),
+                "loaded_at": self.loaded_at,
+                "invalidated_at": self.invalidated_at,
+                "last_invalidation_reason": self.last_invalidation_reason,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+# Global instance
+_schema_cache = None
+
+def get_schema_cache() -> SchemaCache:
+    """Get the global schema cache instance"""
+    global _schema_cache
+    if _schema_cache is None:
+        _schema_cache = SchemaCache()
+    return _schema_cache
+
+def register_ddl_invalidation(engine) -> None:
+    """Invalidate the schema cache whenever DDL (a migration) runs through engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _invalidate_on_ddl(conn, cursor, statement, parameters, context, executemany):
+        if _DDL_PATTERN.match(statement or ""):
+            get_schema_cache().invalidate(reason=f"DDL: {statement.strip().split(chr(10))[0][:60]}")
@@ -14,50 +14,49 @@ from sqlalchemy.exc import SQLAlchemyError
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from backend.database import engine
+from backend.utils.schema_cache import get_schema_cache
 
 class SQLContextBuilder:
     """Builds comprehensive SQL context for agents"""
     
     def __init__(self):
-        self.schema_cache = None
         self.examples_cache = None
     
     def get_database_schema(self) -> str:
-        """Get the complete database schema as a string"""
-        if self.schema_cache:
-            return self.schema_cache
-            
+        """Get the complete database schema as a string (shared schema cache)"""
         try:
-            inspector = inspect(engine)
-            schema_parts = ["# Database Schema\n"]
+            return get_schema_cache().get(("sql_context_schema", str(engine.url)), self._load_database_schema)
+        except Exception as e:
+            return f"# Database Schema\nError retrieving schema: {e}"
+    
+    def _load_database_schema(self) -> str:
+        """Reflect the database schema into markdown"""
+        inspector = inspect(engine)
+        schema_parts = ["# Database Schema\n"]
+        
+        for table_name in inspector.get_table_names():
+            schema_parts.append(f"## Table: {table_name}")
             
-            for table_name in inspector.get_table_names():
-                schema_parts.append(f"## Table: {table_name}")
-                
-                # Get columns
-                columns = inspector.get_columns(table_name)
-                for column in columns:
-                    nullable = "NULL" if column['nullable'] else "NOT NULL"
-                    default = f" DEFAULT {column['default']}" if column.get('default') else ""
-                    schema_parts.append(f"- {column['name']}: {column['type']} {nullable}{default}")
-                
-                # Get primary keys
-                pk = inspector.get_pk_constraint(table_name)
-                if pk['constrained_columns']:
-                    schema_parts.append(f"- Primary Key: {', '.join(pk['constrained_columns'])}")
-                
-                # Get foreign keys
-                fks = inspector.get_foreign_keys(table_name)
-                for fk in fks:
-                    schema_parts.append(f"- Foreign Key: {', '.join(fk['constrained_columns'])} -> {fk['referred_table']}.{', '.join(fk['referred_columns'])}")
-                
-                schema_parts.append("")  # Empty line between tables
+            # Get columns
+            columns = inspector.get_columns(table_name)
+            for column in columns:
+                nullable = "NULL" if column['nullable'] else "NOT NULL"
+                default = f" DEFAULT {column['default']}" if column.get('default') else ""
+                schema_parts.append(f"- {column['name']}: {column['type']} {nullable}{default}")
             
-            self.schema_cache = "\n".join(schema_parts)
-            return self.schema_cache
+            # Get primary keys
+            pk = inspector.get_pk_constraint(table_name)
+            if pk['constrained_columns']:
+                schema_parts.append(f"- Primary Key: {', '.join(pk['constrained_columns'])}")
             
-        except Exception as e:
-            return f"# Database Schema\nError retrieving schema: {e}"
+            # Get foreign keys
+            fks = inspector.get_foreign_keys(table_name)
+            for fk in fks:
+                schema_parts.append(f"- Foreign Key: {', '.join(fk['constrained_columns'])} -> {fk['referred_table']}.{', '.join(fk['referred_columns'])}")
+            
+            schema_parts.append("")  # Empty line between tables
+        
+        return "\n".join(schema_parts)
     
     def get_example_queries(self) -> str:
         """Get example SQL queries for common operations"""
@@ -544,12 +544,30 @@ function clearChat(keepSystemMessages = true) {
     }
 }
 
+// Fetch every page of a keyset-paged endpoint, following the X-Next-Cursor header.
+// Returns the pages in the order they were served, or null if a request failed.
+async function fetchAllPages(url, cursorParam) {
+    const pages = [];
+    let cursor = null;
+    do {
+        const pageUrl = cursor ? `${url}?${cursorParam}=${encodeURIComponent(cursor)}` : url;
+        const response = await fetch(pageUrl);
+        if (!response.ok) {
+            return null;
+        }
+        pages.push(await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return pages;
+}
+
 // Load sessions from the backend
 async function loadSessions() {
     try {
-        const response = await fetch('/api/sessions');
-        if (response.ok) {
-            sessions = await response.json();
+        // Sessions come newest first, one page at a time
+        const pages = await fetchAllPages('/api/sessions', 'cursor');
+        if (pages) {
+            sessions = pages.flat();
             AppState.updateSession({ sessions: sessions });
 
             // Auto-select first session if none selected
@@ -633,10 +651,10 @@ async function switchToSession(targetSessionId) {
         // Clear current chat
         clearChat();
 
-        // Load session messages
-        const response = await fetch(`/api/history/${targetSessionId}`);
-        if (response.ok) {
-            const messages = await response.json();
+        // Load session messages; each page is oldest first and the cursor walks back to older pages
+        const pages = await fetchAllPages(`/api/history/${targetSessionId}`, 'before');
+        if (pages) {
+            const messages = pages.reverse().flat();
 
             // Add messages to chat
             messages.forEach(msg => {
@@ -1238,11 +1256,16 @@ async function handleMetadataUpload(event) {
         if (response.ok) {
             const result = await response.json();
 
-            // Show success message
-            addMessage(`<img src="/static/icons/upload-success.svg" alt="Success" class="message-icon" style="width: 16px; height: 16px; vertical-align: middle; margin-right: 8px;"> Successfully uploaded "${result.metadata.title}" with metadata. The document is now available for questions.`, 'system');
-
-            // Close modal
+            // Close modal; ingestion continues in the background
             closeModal();
+            addMessage(`<img src="/static/icons/upload-success.svg" alt="Success" class="message-icon" style="width: 16px; height: 16px; vertical-align: middle; margin-right: 8px;"> Uploaded "${result.metadata.title}". Processing the document...`, 'system');
+
+            const job = result.status_url ? await waitForUploadJob(result.status_url) : { status: 'completed' };
+            if (job.status === 'completed') {
+                addMessage(`<img src="/static/icons/upload-success.svg" alt="Success" class="message-icon" style="width: 16px; height: 16px; vertical-align: middle; margin-right: 8px;"> "${result.metadata.title}" is now available for questions.`, 'system');
+            } else {
+                throw new Error(job.error || 'Processing failed');
+            }
         } else {
             const errorData = await response.json();
             throw new Error(errorData.detail || 'Upload failed');
@@ -1259,6 +1282,21 @@ async function handleMetadataUpload(event) {
     }
 }
 
+// Poll an ingestion job until it completes or fails
+async function waitForUploadJob(statusUrl, intervalMs = 1500) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        if (!response.ok) {
+            throw new Error('Could not check processing status');
+        }
+        const job = await response.json();
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Search functionality
 async function handleSearchClick() {
     const message = userInput.value.trim();
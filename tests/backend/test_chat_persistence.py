@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Tests for write-behind chat persistence against a temporary SQLite database.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base
+from backend.models.chat import ChatMessage, ChatSession
+from backend.services.chat_persistence import ChatWriteBehind
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, so the writer thread and the test each use their own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[ChatSession.__table__, ChatMessage.__table__])
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add_all([ChatSession(id=1, session_id="s-1"), ChatSession(id=2, session_id="s-2")])
+    db.commit()
+    db.close()
+    return factory
+
+@pytest.fixture
+def writers():
+    started = []
+    yield started
+    for writer in started:
+        writer.shutdown(timeout=1)
+
+def _writer(writers, session_factory, **kwargs):
+    kwargs.setdefault("flush_ms", 60000)
+    writer = ChatWriteBehind(session_factory=session_factory, **kwargs)
+    writers.append(writer)
+    return writer
+
+def _contents(session_factory, session_id=None):
+    db = session_factory()
+    try:
+        query = db.query(ChatMessage.content).order_by(ChatMessage.timestamp, ChatMessage.id)
+        if session_id is not None:
+            query = query.filter(ChatMessage.session_id == session_id)
+        return [content for (content,) in query]
+    finally:
+        db.close()
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_full_batch_is_written_without_waiting_for_the_timer(writers, session_factory):
+    """Reaching batch_size triggers a write even though flush_ms has not passed"""
+    writer = _writer(writers, session_factory, batch_size=3)
+    for index in range(3):
+        writer.save_message(1, "user", f"m{index}")
+    assert _wait_for(lambda: len(_contents(session_factory)) == 3)
+    assert writer.stats()["batches"] == 1
+
+def test_buffered_writes_are_written_after_flush_ms(writers, session_factory):
+    """A lone message is written once it has waited flush_ms"""
+    writer = _writer(writers, session_factory, flush_ms=50, batch_size=100)
+    writer.save_message(1, "user", "hello")
+    assert _wait_for(lambda: _contents(session_factory) == ["hello"], timeout=2)
+
+def test_flush_commits_messages_and_touches(writers, session_factory):
+    """flush() returns once everything submitted before it is committed"""
+    writer = _writer(writers, session_factory)
+    writer.save_message(1, "user", "question")
+    writer.save_message(1, "assistant", "answer")
+    touched_at = datetime.utcnow()
+    writer.touch_session(2)
+    assert writer.flush(timeout=5)
+    assert _contents(session_factory) == ["question", "answer"]
+    db = session_factory()
+    assert db.query(ChatSession.updated_at).filter(ChatSession.id == 2).scalar() >= touched_at
+    db.close()
+    assert writer.stats()["pending"] == 0
+
+def test_shutdown_drains_the_buffer(writers, session_factory):
+    """Writes buffered at shutdown are committed before the thread stops"""
+    writer = _writer(writers, session_factory)
+    writer.save_message(2, "user", "last words")
+    writer.shutdown(timeout=5)
+    assert _contents(session_factory) == ["last words"]
+
+def test_failed_batch_is_retried(writers, session_factory):
+    """A transient failure is retried and the batch still lands"""
+    failures = []
+
+    def flaky_factory():
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("database restarting")
+        return session_factory()
+
+    writer = _writer(writers, flaky_factory, retries=2)
+    writer.save_message(1, "user", "hello")
+    assert writer.flush(timeout=5)
+    assert _contents(session_factory) == ["hello"]
+    assert writer.stats()["dropped_messages"] == 0
+
+def test_batch_is_dropped_after_the_last_retry(writers, session_factory):
+    """A batch that keeps failing is dropped and counted, and flush() still returns"""
+    def broken_factory():
+        raise RuntimeError("database down")
+
+    writer = _writer(writers, broken_factory, retries=1)
+    writer.save_message(1, "user", "lost")
+    writer.save_message(1, "assistant", "also lost")
+    assert writer.flush(timeout=5)
+    assert writer.stats()["dropped_messages"] == 2
+    assert writer.pending_messages(1) == []
+
+def test_discard_drops_buffered_writes(writers, session_factory):
+    """Discarding a session drops its buffered messages and touches only"""
+    writer = _writer(writers, session_factory)
+    writer.save_message(1, "user", "deleted")
+    writer.touch_session(1)
+    writer.save_message(2, "user", "kept")
+    writer.discard_session(1)
+    assert writer.pending_messages(1) == []
+    assert writer.flush(timeout=5)
+    assert _contents(session_factory) == ["kept"]
+
+def test_discard_skips_rows_of_the_batch_in_flight(writers, session_factory):
+    """Rows of a discarded session in the batch being written are neither returned nor written"""
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocking_factory():
+        entered.set()
+        release.wait(5)
+        return session_factory()
+
+    writer = _writer(writers, blocking_factory)
+    writer.save_message(1, "user", "deleted")
+    writer.save_message(2, "user", "kept")
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    assert entered.wait(5)
+    assert [msg["content"] for msg in writer.pending_messages(1)] == ["deleted"]
+
+    discarding = threading.Thread(target=writer.discard_session, args=(1,))
+    discarding.start()
+    assert _wait_for(lambda: writer.pending_messages(1) == [])
+    assert discarding.is_alive()
+    release.set()
+    discarding.join(5)
+    flusher.join(5)
+    assert not discarding.is_alive()
+    assert _contents(session_factory) == ["kept"]
+
+def test_history_includes_buffered_messages(writers, session_factory, monkeypatch):
+    """_get_chat_history merges write-behind messages after the committed ones, without duplicates"""
+    os.environ.setdefault("ENABLE_RAG", "false")
+    from backend.routes import chat
+
+    writer = _writer(writers, session_factory)
+    monkeypatch.setattr(chat, "CHAT_WRITE_BEHIND", True)
+    monkeypatch.setattr(chat, "HISTORY_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat, "CHAT_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(chat, "get_chat_writer", lambda: writer)
+
+    db = session_factory()
+    db.add(ChatMessage(session_id=1, role="user", content="committed", timestamp=datetime(2024, 1, 1)))
+    db.commit()
+    writer.save_message(1, "assistant", "buffered")
+    writer.save_message(2, "user", "other session")
+    expected = [{"role": "user", "content": "committed"}, {"role": "assistant", "content": "buffered"}]
+    try:
+        assert chat._get_chat_history(1, db) == expected
+        assert writer.flush(timeout=5)
+        assert chat._get_chat_history(1, db) == expected
+    finally:
+        db.close()
+
+def test_history_sees_a_batch_committed_between_the_two_reads(writers, session_factory, monkeypatch):
+    """A batch committing right after the database read is still taken from the buffer snapshot"""
+    os.environ.setdefault("ENABLE_RAG", "false")
+    from sqlalchemy.orm import Query
+    from backend.routes import chat
+
+    writer = _writer(writers, session_factory)
+    monkeypatch.setattr(chat, "CHAT_WRITE_BEHIND", True)
+    monkeypatch.setattr(chat, "HISTORY_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat, "CHAT_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(chat, "get_chat_writer", lambda: writer)
+
+    read_all = Query.all
+
+    def all_then_commit(query):
+        rows = read_all(query)
+        # The write-behind batch lands after the committed rows were read
+        assert writer.flush(timeout=5)
+        return rows
+
+    monkeypatch.setattr(Query, "all", all_then_commit)
+    writer.save_message(1, "user", "question")
+    db = session_factory()
+    try:
+        assert chat._get_chat_history(1, db) == [{"role": "user", "content": "question"}]
+    finally:
+        db.close()
+
+def test_history_cache_fill_keeps_a_message_saved_before_it_started(writers, session_factory, monkeypatch):
+    """A window filled while the saved message's batch commits includes it, and later appends build on it"""
+    os.environ.setdefault("ENABLE_RAG", "false")
+    import asyncio
+    from sqlalchemy.orm import Query
+    from backend.routes import chat
+    from backend.services.history_cache import HistoryCache
+
+    writer = _writer(writers, session_factory)
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    monkeypatch.setattr(chat, "CHAT_WRITE_BEHIND", True)
+    monkeypatch.setattr(chat, "HISTORY_CACHE_ENABLED", True)
+    monkeypatch.setattr(chat, "CHAT_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(chat, "get_chat_writer", lambda: writer)
+    monkeypatch.setattr(chat, "get_history_cache", lambda: cache)
+
+    read_all = Query.all
+
+    def all_then_commit(query):
+        rows = read_all(query)
+        assert writer.flush(timeout=5)
+        return rows
+
+    monkeypatch.setattr(Query, "all", all_then_commit)
+    db = session_factory()
+    try:
+        # The append bumps the cache version before the fill reads it, so only the read order protects the window
+        asyncio.run(chat.save_message(1, "user", "question", db))
+        assert chat._get_chat_history(1, db) == [{"role": "user", "content": "question"}]
+        assert cache.get_history(1) == [{"role": "user", "content": "question"}]
+        asyncio.run(chat.save_message(1, "assistant", "answer", db))
+        assert chat._get_chat_history(1, db) == [{"role": "user", "content": "question"},
+                                                 {"role": "assistant", "content": "answer"}]
+    finally:
+        db.close()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Tests for the chat session and history endpoints (against a temporary SQLite database) and the pre-LLM fan-out.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# The endpoints under test do not use the vector store
+os.environ.setdefault("ENABLE_RAG", "false")
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import database
+from backend.database import Base, get_db
+from backend.models.chat import ChatMessage, ChatSession, ChatSummary
+from backend.routes import chat
+from backend.utils.deadline import DeadlineExceeded
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[ChatSession.__table__, ChatMessage.__table__, ChatSummary.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_WRITE_BEHIND", False)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+
+    def sqlite_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = sqlite_db
+    return TestClient(app)
+
+def _add_session(session_factory, session_id, updated_at, messages=()):
+    """Add a session and its (role, content, timestamp) messages; returns the session's pk"""
+    db = session_factory()
+    session = ChatSession(session_id=session_id, created_at=updated_at, updated_at=updated_at)
+    db.add(session)
+    db.flush()
+    for role, content, timestamp in messages:
+        db.add(ChatMessage(session_id=session.id, role=role, content=content, timestamp=timestamp))
+    db.commit()
+    pk = session.id
+    db.close()
+    return pk
+
+def _pages(client, url, limit, cursor_param):
+    """Follow X-Next-Cursor until the last page; returns the pages"""
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        params = {"limit": limit, cursor_param: cursor}
+
+def test_sessions_are_keyset_paged_newest_first(client, session_factory):
+    """Pages follow X-Next-Cursor, sessions updated at the same instant are neither skipped nor repeated"""
+    for index in range(7):
+        # Pairs of sessions share an updated_at, so page boundaries fall inside ties
+        _add_session(session_factory, f"s-{index}", START + timedelta(minutes=index // 2))
+
+    pages = _pages(client, "/api/sessions", 3, "cursor")
+    assert [len(page) for page in pages] == [3, 3, 1]
+    session_ids = [session["session_id"] for page in pages for session in page]
+    assert session_ids == ["s-6", "s-5", "s-4", "s-3", "s-2", "s-1", "s-0"]
+
+def test_session_title_and_count_come_from_its_messages(client, session_factory):
+    """Untitled sessions are named after their first user message; ties on timestamp go to the lower id"""
+    long_question = "How many vacation days do new employees get in their first year here?"
+    _add_session(session_factory, "s-1", START, [
+        ("user", long_question, START),
+        ("user", "second question, same instant", START),
+        ("assistant", "Fifteen.", START + timedelta(seconds=1)),
+    ])
+    [session] = client.get("/api/sessions").json()
+    assert session["message_count"] == 3
+    assert session["title"] == long_question[:50] + "..."
+
+def test_malformed_session_cursor_is_rejected(client, session_factory):
+    """A cursor that cannot be decoded is a client error, not a server error"""
+    _add_session(session_factory, "s-1", START)
+    for cursor in ("garbage", "2024-01-01T00:00:00|abc", "yesterday|5", "|"):
+        response = client.get("/api/sessions", params={"cursor": cursor})
+        assert response.status_code == 400, cursor
+
+def test_timezone_aware_cursor_is_compared_in_utc(client, session_factory):
+    """A cursor with an offset pages from the same instant as the naive UTC timestamps stored"""
+    for index in range(3):
+        _add_session(session_factory, f"s-{index}", START + timedelta(hours=index))
+    cursor = (START + timedelta(hours=2)).replace(tzinfo=None).isoformat() + "+02:00|999"
+    sessions = client.get("/api/sessions", params={"cursor": cursor}).json()
+    assert [session["session_id"] for session in sessions] == ["s-0"]
+
+def test_history_is_keyset_paged_oldest_first(client, session_factory):
+    """Each page is in chronological order and the cursor walks back to the first message"""
+    _add_session(session_factory, "s-1", START, [
+        ("user" if index % 2 == 0 else "assistant", f"m{index}", START + timedelta(seconds=index)) for index in range(7)
+    ])
+    pages = _pages(client, "/api/history/s-1", 3, "before")
+    assert [[message["content"] for message in page] for page in pages] == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+def test_history_page_boundary_inside_equal_timestamps(client, session_factory):
+    """Messages sharing a timestamp across a page boundary are neither skipped nor repeated"""
+    _add_session(session_factory, "s-1", START, [("user", f"m{index}", START) for index in range(5)])
+    pages = _pages(client, "/api/history/s-1", 2, "before")
+    assert [[message["content"] for message in page] for page in pages] == [["m3", "m4"], ["m1", "m2"], ["m0"]]
+
+def test_history_rejects_malformed_cursor_and_unknown_session(client, session_factory):
+    """Bad cursors are 400 and unknown sessions 404"""
+    _add_session(session_factory, "s-1", START, [("user", "hi", START)])
+    assert client.get("/api/history/s-1", params={"before": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/history/missing").status_code == 404
+
+def test_init_db_adds_history_indexes_to_existing_tables(tmp_path, monkeypatch):
+    """Tables created before the keyset indexes existed get them on the next init_db"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat_sessions (id INTEGER PRIMARY KEY, session_id VARCHAR(36), title VARCHAR(255), "
+                          "created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, session_id INTEGER, role VARCHAR(10), "
+                          "content TEXT, timestamp DATETIME)"))
+    monkeypatch.setattr(database, "engine", engine)
+    database.init_db()
+
+    indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("chat_messages")}
+    assert indexes["ix_chat_messages_session_timestamp"] == ["session_id", "timestamp", "id"]
+    session_indexes = {index["name"] for index in inspect(engine).get_indexes("chat_sessions")}
+    assert "ix_chat_sessions_updated_at_id" in session_indexes
+
+class StubSQLService:
+    """Routes every message to SQL; process_query answers after delay or, when hang is set, waits to be cancelled"""
+
+    def __init__(self, delay=0.0, hang=False):
+        self.delay = delay
+        self.hang = hang
+        self.deadlines = []
+
+    def is_database_query(self, message):
+        return True
+
+    def process_query(self, message, deadline=None):
+        self.deadlines.append(deadline)
+        if self.hang:
+            while not deadline.cancelled:
+                time.sleep(0.005)
+            raise DeadlineExceeded("SQL query cancelled")
+        time.sleep(self.delay)
+        return {"success": True, "sql_query": "SELECT COUNT(*) FROM orders", "response": "42 orders"}
+
+class NoSQLService(StubSQLService):
+    def is_database_query(self, message):
+        return False
+
+class StubRAGService:
+    """Vector and web search with fixed results; a blocked search waits until release is set"""
+
+    search_service = object()
+
+    def __init__(self, block_vector=False, block_web=False):
+        self.release = threading.Event()
+        self.block_vector = block_vector
+        self.block_web = block_web
+        self.queries = []
+
+    def query_documents(self, message, n_results=None, metadata_filter=None):
+        self.queries.append(message)
+        if self.block_vector:
+            self.release.wait(5)
+        return [SimpleNamespace(properties={"content": "Refunds take 5 days.", "source": "policy.pdf", "category": "Finance"})]
+
+    def search_web(self, message, n_results):
+        if self.block_web:
+            self.release.wait(5)
+        return [{"title": "Refund guide", "url": "https://example.com/refunds", "snippet": "Refunds usually take a week."}]
+
+@pytest.fixture
+def fanout(monkeypatch):
+    """Enables RAG in the fan-out with a stub service and records the tasks handed to _cancel_tasks"""
+    rag = StubRAGService()
+    cancelled = []
+    cancel_tasks = chat._cancel_tasks
+
+    async def recording_cancel_tasks(*tasks):
+        cancelled.extend(task for task in tasks if task is not None)
+        await cancel_tasks(*tasks)
+
+    monkeypatch.setattr(chat, "ENABLE_RAG", True)
+    monkeypatch.setattr(chat, "_cancel_tasks", recording_cancel_tasks)
+    monkeypatch.setattr(chat, "rag_service", rag)
+    state = SimpleNamespace(rag=rag, cancelled=cancelled)
+    yield state
+    # Let blocked pool threads finish
+    state.rag.release.set()
+
+def test_sql_success_cancels_the_retrieval_branches(fanout, monkeypatch):
+    """When the SQL branch wins, the vector and web branches are cancelled and no RAG context is built"""
+    fanout.rag = StubRAGService(block_vector=True, block_web=True)
+    monkeypatch.setattr(chat, "rag_service", fanout.rag)
+    monkeypatch.setattr(chat, "langchain_sql_service", StubSQLService(delay=0.05))
+
+    start = time.time()
+    result = asyncio.run(chat.gather_pre_llm_context("how many orders did we get?"))
+    assert time.time() - start < 2
+    assert result["has_successful_db_query"]
+    assert result["context"] == "" and result["context_parts"] == []
+    assert len(fanout.cancelled) == 2
+    assert all(task.cancelled() for task in fanout.cancelled)
+
+def test_retrieval_fallback_queries_the_vector_store_once(fanout, monkeypatch):
+    """Without a SQL answer the single vector search and the web results become the RAG context"""
+    monkeypatch.setattr(chat, "langchain_sql_service", NoSQLService())
+    result = asyncio.run(chat.gather_pre_llm_context("how long do refunds take?"))
+    assert fanout.rag.queries == ["how long do refunds take?"]
+    assert not result["has_successful_db_query"]
+    assert result["context_parts"] == [
+        "[Document 1 - policy.pdf - Finance]: Refunds take 5 days.",
+        "[Web 1 - Refund guide - https://example.com/refunds]: Refunds usually take a week.",
+    ]
+
+def test_vector_timeout_falls_back_to_web_context(fanout, monkeypatch):
+    """A vector search past VECTOR_SEARCH_TIMEOUT is dropped but the web results are still used"""
+    fanout.rag = StubRAGService(block_vector=True)
+    monkeypatch.setattr(chat, "rag_service", fanout.rag)
+    monkeypatch.setattr(chat, "langchain_sql_service", NoSQLService())
+    monkeypatch.setattr(chat, "VECTOR_SEARCH_TIMEOUT", 0.05)
+
+    result = asyncio.run(chat.gather_pre_llm_context("how long do refunds take?"))
+    assert result["context_parts"] == ["[Web 1 - Refund guide - https://example.com/refunds]: Refunds usually take a week."]
+    assert result["context"] == result["context_parts"][0]
+
+def test_client_disconnect_cancels_the_sql_deadline_and_branches(fanout, monkeypatch):
+    """Cancelling the fan-out mid-query cancels the SQL deadline and the retrieval branches"""
+    fanout.rag = StubRAGService(block_vector=True, block_web=True)
+    monkeypatch.setattr(chat, "rag_service", fanout.rag)
+    sql = StubSQLService(hang=True)
+    monkeypatch.setattr(chat, "langchain_sql_service", sql)
+
+    async def disconnect():
+        task = asyncio.create_task(chat.gather_pre_llm_context("how many orders did we get?"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(disconnect())
+    assert sql.deadlines[0].cancelled
+    assert len(fanout.cancelled) == 2
+    assert all(task.cancelled() for task in fanout.cancelled)
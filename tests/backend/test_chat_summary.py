@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the rolling conversation summarizer against a temporary SQLite database.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base
+from backend.models.chat import ChatMessage, ChatSession, ChatSummary
+from backend.services.chat_summary import ChatSummarizer
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, so the summarizer thread and the test each use their own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[ChatSession.__table__, ChatMessage.__table__, ChatSummary.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _session(session_factory, messages):
+    """Create a session with the given number of alternating user/assistant messages; returns its pk"""
+    db = session_factory()
+    session = ChatSession(session_id="s-1", title="Test")
+    db.add(session)
+    db.flush()
+    for index in range(messages):
+        db.add(ChatMessage(session_id=session.id, role="user" if index % 2 == 0 else "assistant",
+                           content=f"message {index}", timestamp=START + timedelta(seconds=index)))
+    db.commit()
+    pk = session.id
+    db.close()
+    return pk
+
+def _summary(session_factory, pk):
+    db = session_factory()
+    try:
+        return db.query(ChatSummary).filter(ChatSummary.session_id == pk).first()
+    finally:
+        db.close()
+
+class StubSummarize:
+    """Records each call and returns the contents folded so far"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, previous, messages):
+        self.calls.append((previous, [message["content"] for message in messages]))
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        return " | ".join(filter(None, [previous] + [message["content"] for message in messages]))
+
+def _summarizer(session_factory, summarize, **kwargs):
+    summarizer = ChatSummarizer(session_factory=session_factory, summarize=summarize, **kwargs)
+    summarizer.shutdown()
+    return summarizer
+
+def test_older_messages_are_folded_and_recent_ones_kept(session_factory):
+    """Everything but the verbatim window is summarized and the summary point is persisted"""
+    pk = _session(session_factory, 25)
+    summarize = StubSummarize()
+    summarizer = _summarizer(session_factory, summarize, keep_recent=10, batch=5, max_messages=40)
+    assert summarizer._update(pk) is False
+    assert summarize.calls == [("", [f"message {index}" for index in range(15)])]
+
+    record = _summary(session_factory, pk)
+    assert record.summarized_messages == 15
+    assert record.summarized_until == START + timedelta(seconds=14)
+    assert record.summary.endswith("message 14")
+
+def test_nothing_is_folded_below_a_batch(session_factory):
+    """Fewer than batch messages behind the verbatim window leave the session alone"""
+    pk = _session(session_factory, 14)
+    summarize = StubSummarize()
+    summarizer = _summarizer(session_factory, summarize, keep_recent=10, batch=5, max_messages=40)
+    assert summarizer._update(pk) is False
+    assert summarize.calls == []
+    assert _summary(session_factory, pk) is None
+
+def test_long_backlog_is_folded_in_bounded_passes(session_factory):
+    """Each pass folds at most max_messages, continues from the stored summary and reports the backlog"""
+    pk = _session(session_factory, 30)
+    summarize = StubSummarize()
+    summarizer = _summarizer(session_factory, summarize, keep_recent=5, batch=5, max_messages=10)
+    assert summarizer._update(pk) is True
+    assert summarizer._update(pk) is True
+    assert summarizer._update(pk) is False
+    assert [len(messages) for _, messages in summarize.calls] == [10, 10, 5]
+    assert summarize.calls[1][0].endswith("message 9")
+    assert summarize.calls[2][1][0] == "message 20"
+    assert _summary(session_factory, pk).summarized_messages == 25
+
+def test_background_thread_requeues_until_caught_up(session_factory):
+    """A requested session is re-queued by the worker until its backlog is folded"""
+    pk = _session(session_factory, 30)
+    summarize = StubSummarize()
+    summarizer = ChatSummarizer(session_factory=session_factory, summarize=summarize,
+                                keep_recent=5, batch=5, max_messages=10)
+    try:
+        summarizer.request(pk, 30)
+        deadline = time.time() + 5
+        while summarizer.stats()["summarized_messages"] < 25 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        summarizer.shutdown()
+    assert summarizer.stats()["updates"] == 3
+    assert _summary(session_factory, pk).summarized_messages == 25
+
+def test_failed_summary_is_not_persisted(session_factory):
+    """An LLM failure is counted and leaves the stored summary unchanged"""
+    pk = _session(session_factory, 25)
+    summarizer = ChatSummarizer(session_factory=session_factory, summarize=StubSummarize(fail=True),
+                                keep_recent=10, batch=5, max_messages=40)
+    try:
+        summarizer.request(pk, 25)
+        deadline = time.time() + 5
+        while summarizer.stats()["failures"] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        summarizer.shutdown()
+    assert summarizer.stats()["failures"] == 1
+    assert _summary(session_factory, pk) is None
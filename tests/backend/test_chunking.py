@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-aware, structure-preserving chunker.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.utils.chunking import Chunker, approximate_token_counter, fixed_chunks, iter_paragraphs, split_sentences
+
+SAMPLE = (
+    "The first paragraph has two sentences. It talks about vacation policy.\n\n"
+    "The second paragraph is about expenses. Receipts are required for every claim. "
+    "Claims over one thousand dollars need approval.\n\n"
+    "A short closing paragraph."
+)
+
+def test_chunks_respect_token_budget():
+    """No chunk is longer than the token budget"""
+    chunker = Chunker("sentence", max_tokens=20, overlap_tokens=0)
+    chunks = list(chunker.chunks(SAMPLE))
+    assert len(chunks) > 1
+    assert max(approximate_token_counter(chunks)) <= 20
+
+def test_chunks_end_on_sentence_boundaries():
+    """Sentences are never cut in half"""
+    chunker = Chunker("sentence", max_tokens=20, overlap_tokens=0)
+    sentences = [s for p in iter_paragraphs(SAMPLE) for s in split_sentences(p)]
+    for chunk in chunker.chunks(SAMPLE):
+        rebuilt = " ".join(chunk.split())
+        assert any(rebuilt.endswith(sentence) for sentence in sentences)
+
+def test_overlap_repeats_trailing_sentence():
+    """The overlap carries whole trailing sentences into the next chunk"""
+    chunker = Chunker("sentence", max_tokens=48, overlap_tokens=12)
+    chunks = list(chunker.chunks(SAMPLE))
+    assert any(
+        split_sentences(" ".join(previous.split()))[-1] in following
+        for previous, following in zip(chunks, chunks[1:])
+    )
+
+def test_paragraph_strategy_starts_chunks_at_paragraphs():
+    """Paragraphs that fit the budget are not split across chunks"""
+    chunker = Chunker("paragraph", max_tokens=40, overlap_tokens=0)
+    chunks = list(chunker.chunks(SAMPLE))
+    assert chunks[0].startswith("The first paragraph")
+    assert any(chunk.startswith("The second paragraph") for chunk in chunks)
+
+def test_oversized_sentence_is_split_at_words():
+    """A sentence longer than the budget is split between words"""
+    text = " ".join(f"word{i}" for i in range(200)) + "."
+    chunks = list(Chunker("sentence", max_tokens=32, overlap_tokens=0).chunks(text))
+    assert len(chunks) > 1
+    assert max(approximate_token_counter(chunks)) <= 32
+    assert all(piece.startswith("word") for chunk in chunks for piece in chunk.split())
+
+def test_streamed_input_matches_whole_text():
+    """Feeding the text in small pieces yields the same chunks"""
+    chunker = Chunker("sentence", max_tokens=20, overlap_tokens=5)
+    pieces = (SAMPLE[i:i + 7] for i in range(0, len(SAMPLE), 7))
+    assert list(chunker.chunks(pieces)) == list(chunker.chunks(SAMPLE))
+
+def test_fixed_strategy_matches_character_windows():
+    """The fixed strategy keeps the original character-window behaviour"""
+    chunker = Chunker("fixed", chunk_size=40, overlap=10)
+    assert list(chunker.chunks(SAMPLE)) == list(fixed_chunks(SAMPLE, 40, 10))
+    assert chunker.signature == "fixed:40:10"
+
+def test_fixed_strategy_streams_like_fixed_chunks():
+    """The fixed strategy gives the original windows when fed a stream of pieces"""
+    chunker = Chunker("fixed", chunk_size=50, overlap=10)
+    pieces = [SAMPLE[i:i + 7] for i in range(0, len(SAMPLE), 7)]
+    assert list(chunker.chunks(pieces)) == list(fixed_chunks(SAMPLE, 50, 10))
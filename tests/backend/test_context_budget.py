@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted prompt packing.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.utils.context_budget import ContextBudget, Section
+
+calls = []
+
+def word_counter(texts):
+    """One token per word; records each batch so caching can be checked"""
+    calls.append(list(texts))
+    return [len(text.split()) for text in texts]
+
+def make_budget(max_tokens, priority=("chunks", "history", "schema")):
+    return ContextBudget(max_tokens=max_tokens, counter=word_counter, priority=priority)
+
+def test_required_text_is_always_counted():
+    """Required text is kept even when it exceeds the budget, and leaves nothing for sections"""
+    budget = make_budget(3)
+    packed = budget.pack(["one two three four"], [Section("chunks", ["a b"])])
+    assert packed.tokens == 4
+    assert packed.kept["chunks"] == []
+    assert packed.dropped["chunks"] == 1
+
+def test_chunks_skip_but_history_stays_contiguous():
+    """A chunk that does not fit is skipped for a smaller one; history stops at the first miss"""
+    budget = make_budget(10)
+    packed = budget.pack(["sys"], [
+        Section("chunks", ["a b c d e f", "g h h h h h h", "i j"]),
+        Section("history", ["k", "l m m m m", "n"], contiguous=True),
+    ])
+    # 1 required + 6 + 2 chunk tokens leaves 1 for history
+    assert packed.kept["chunks"] == [0, 2]
+    assert packed.kept["history"] == [0]
+    assert packed.tokens == 10
+
+def test_priority_order_decides_who_gets_the_budget():
+    """Sections are filled in priority order, not the order they are passed"""
+    sections = [Section("chunks", ["a b c d"]), Section("history", ["e f g h"], contiguous=True)]
+    assert make_budget(5).pack([], sections).kept == {"chunks": [0], "history": []}
+    assert make_budget(5, priority=("history", "chunks")).pack([], sections).kept == {"history": [0], "chunks": []}
+
+def test_header_and_overhead_are_charged():
+    """The header is paid once with the first kept item, overhead with every item"""
+    budget = make_budget(8)
+    packed = budget.pack([], [Section("chunks", ["a", "b", "c"], overhead=1, header="h1 h2 h3")])
+    # header 3 + (1 + 1) per item: two items fit in 8 tokens, not three
+    assert packed.kept["chunks"] == [0, 1]
+    assert packed.tokens == 7
+
+def test_token_counts_are_cached():
+    """Each distinct text is tokenized once"""
+    budget = make_budget(100)
+    calls.clear()
+    budget.pack(["sys"], [Section("history", ["x y", "z"])])
+    budget.pack(["sys"], [Section("history", ["x y", "z", "new"])])
+    tokenized = [text for batch in calls for text in batch]
+    assert sorted(tokenized) == ["new", "sys", "x y", "z"]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the cooperative, thread-safe request deadline used by the SQL service.
+"""
+
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.utils.deadline import Deadline, DeadlineExceeded, check_deadline, deadline_scope, get_current_deadline
+
+def test_deadline_expires():
+    """check() raises once the deadline has passed"""
+    deadline = Deadline(0.05, name="SQL query")
+    deadline.check("start")
+    time.sleep(0.1)
+    assert deadline.expired
+    try:
+        deadline.check("agent step")
+        assert False, "expected DeadlineExceeded"
+    except DeadlineExceeded as e:
+        assert "timed out" in str(e)
+
+def test_cancel_from_another_thread():
+    """A deadline cancelled on one thread stops work checking it on another"""
+    deadline = Deadline(10)
+    stopped = threading.Event()
+
+    def worker():
+        try:
+            while True:
+                deadline.check("loop")
+                time.sleep(0.01)
+        except DeadlineExceeded:
+            stopped.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    deadline.cancel()
+    thread.join(timeout=1)
+    assert stopped.is_set()
+
+def test_child_deadline_is_tighter_and_shares_cancel():
+    """child() never outlives its parent and follows its cancellation"""
+    parent = Deadline(60)
+    child = parent.child(1)
+    assert child.remaining() <= 1
+    assert parent.child(120).remaining() <= 60
+    parent.cancel()
+    assert child.cancelled
+
+def test_scope_sets_current_deadline_per_thread():
+    """deadline_scope only affects the current thread's context"""
+    seen = {}
+
+    def worker():
+        seen["other"] = get_current_deadline()
+
+    deadline = Deadline(0)
+    with deadline_scope(deadline):
+        assert get_current_deadline() is deadline
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        try:
+            check_deadline("SQL execution")
+            assert False, "expected DeadlineExceeded"
+        except DeadlineExceeded:
+            pass
+    assert get_current_deadline() is None
+    assert seen["other"] is None
+
+if __name__ == "__main__":
+    test_deadline_expires()
+    test_cancel_from_another_thread()
+    test_child_deadline_is_tighter_and_shares_cancel()
+    test_scope_sets_current_deadline_per_thread()
+    print("✅ All deadline tests passed")
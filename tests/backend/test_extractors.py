@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming text extraction.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+
+from backend.utils import extractors
+from backend.utils.chunking import Chunker, iter_paragraphs
+from backend.utils.extractors import extract_text, iter_text_blocks
+
+def test_txt_is_read_in_bounded_blocks(tmp_path, monkeypatch):
+    """Plain text is yielded in blocks no larger than EXTRACT_TEXT_BLOCK_CHARS"""
+    monkeypatch.setattr(extractors, "TEXT_BLOCK_CHARS", 100)
+    path = tmp_path / "policy.txt"
+    text = "Employees accrue vacation monthly. " * 50
+    path.write_text(text, encoding="utf-8")
+    blocks = list(iter_text_blocks(str(path)))
+    assert len(blocks) > 1
+    assert max(len(block) for block in blocks) <= 100
+    assert "".join(blocks) == text
+
+def test_csv_rows_become_labelled_paragraphs(tmp_path, monkeypatch):
+    """Each CSV row is rendered as a "column: value" paragraph, a few rows per block"""
+    monkeypatch.setattr(extractors, "TABLE_ROWS_PER_BLOCK", 2)
+    path = tmp_path / "staff.csv"
+    path.write_text("name,office\nAlice,North\nBob,\nCarol,South\n", encoding="utf-8")
+    blocks = list(iter_text_blocks(str(path)))
+    assert len(blocks) == 2
+    paragraphs = list(iter_paragraphs(blocks))
+    assert paragraphs == ["name: Alice | office: North", "name: Bob", "name: Carol | office: South"]
+
+def test_blocks_chunk_like_whole_text(tmp_path, monkeypatch):
+    """Chunking the block stream gives the same chunks as chunking the whole text"""
+    monkeypatch.setattr(extractors, "TEXT_BLOCK_CHARS", 37)
+    path = tmp_path / "handbook.txt"
+    path.write_text(
+        "Remote work needs manager approval. Equipment is provided.\n\n"
+        "Expenses are reimbursed monthly. Receipts are required for every claim.\n\n" * 10,
+        encoding="utf-8"
+    )
+    chunker = Chunker("sentence", max_tokens=40, overlap_tokens=8)
+    assert list(chunker.chunks(iter_text_blocks(str(path)))) == list(chunker.chunks(extract_text(str(path))))
+
+def test_unsupported_extension(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\xff\xd8")
+    with pytest.raises(ValueError):
+        iter_text_blocks(str(path))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process hot-session history cache.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.history_cache import HistoryCache, trim_window
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+def test_session_ids_map_to_primary_keys():
+    """A cached session id resolves to its primary key until invalidated"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    assert cache.get_session_pk("abc") is None
+    cache.put_session_pk("abc", 7)
+    assert cache.get_session_pk("abc") == 7
+    cache.invalidate(session_id="abc", pk=7)
+    assert cache.get_session_pk("abc") is None
+
+def test_append_writes_through_to_cached_window():
+    """Saved messages are appended to a cached window, which keeps only the last window messages"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    assert cache.fill_history(1, [message("user", "hi"), message("assistant", "hello")], cache.version(1))
+    cache.append(1, message("user", "how are you"), window=2)
+    assert cache.get_history(1) == [message("assistant", "hello"), message("user", "how are you")]
+
+def test_append_to_uncached_session_does_not_create_a_partial_window():
+    """Without a cached window the next read has to go to the database"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    cache.append(1, message("user", "hi"), window=50)
+    assert cache.get_history(1) is None
+
+def test_fill_is_rejected_after_a_concurrent_append():
+    """A window read before a message was saved must not overwrite the cache"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    version = cache.version(1)
+    cache.append(1, message("user", "new"), window=50)
+    assert not cache.fill_history(1, [message("user", "old")], version)
+    assert cache.get_history(1) is None
+    assert cache.fill_history(1, [message("user", "old"), message("user", "new")], cache.version(1))
+
+def test_invalidate_drops_the_window():
+    """Deleting a session removes its history window"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    cache.fill_history(3, [message("user", "hi")], cache.version(3))
+    cache.invalidate(pk=3)
+    assert cache.get_history(3) is None
+
+def test_returned_window_is_a_copy():
+    """Callers may modify the returned list without changing the cache"""
+    cache = HistoryCache(max_size=10, ttl_seconds=0)
+    cache.fill_history(1, [message("user", "hi")], cache.version(1))
+    cache.get_history(1).append(message("user", "extra"))
+    assert cache.get_history(1) == [message("user", "hi")]
+
+def test_trim_keeps_leading_summary():
+    """Trimming a window drops the oldest messages but not the conversation summary"""
+    summary = message("system", "Summary of the earlier conversation:\nuser asked about returns")
+    window = [summary, message("user", "a"), message("assistant", "b")]
+    assert trim_window(window + [message("user", "c")], 2) == [summary, message("assistant", "b"), message("user", "c")]
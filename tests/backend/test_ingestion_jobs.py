@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for the background ingestion jobs, with a stubbed RAGService.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services import rag_service
+from backend.services.ingestion_jobs import IngestionJobQueue, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+
+def _add_job(queue, job_id, status):
+    queue._jobs[job_id] = {"job_id": job_id, "status": status, "stage": None, "progress": 0.0}
+
+def test_progress_is_weighted_by_stage():
+    """Embedding dominates overall progress; insertion finishes it"""
+    queue = IngestionJobQueue(max_workers=1)
+    _add_job(queue, "job", JOB_RUNNING)
+
+    queue._report("job", "extracting", 1, 1)
+    assert queue.get("job")["progress"] == 0.1
+    queue._report("job", "embedding", 32, 64)
+    assert queue.get("job")["stage"] == "embedding"
+    assert 0.1 < queue.get("job")["progress"] < 0.85
+    queue._report("job", "inserting", 64, 64)
+    assert queue.get("job")["progress"] == 1.0
+
+def test_history_drops_oldest_finished_jobs_only():
+    """Trimming never forgets jobs that are still queued or running"""
+    queue = IngestionJobQueue(max_workers=1, history=2)
+    _add_job(queue, "queued", JOB_QUEUED)
+    _add_job(queue, "done-1", JOB_COMPLETED)
+    _add_job(queue, "done-2", JOB_COMPLETED)
+    with queue._lock:
+        queue._trim()
+
+    assert queue.get("queued") is not None
+    assert queue.get("done-1") is None
+    assert [job["job_id"] for job in queue.list_jobs()] == ["done-2", "queued"]
+
+def test_get_returns_a_copy():
+    """Callers cannot mutate the queue's job records"""
+    queue = IngestionJobQueue(max_workers=1)
+    _add_job(queue, "job", JOB_QUEUED)
+    queue.get("job")["status"] = "tampered"
+    assert queue.get("job")["status"] == JOB_QUEUED
+
+class StubRAGService:
+    """Reads the prepared document like RAGService.add_documents, without embedding it"""
+
+    error = None
+    failed_chunks = 0
+    # When set, ingestion waits for it, keeping the job running
+    gate = None
+    documents = []
+
+    def add_documents(self, documents, progress=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error:
+            raise self.error
+        text = "".join("".join(document["blocks"]()) for document in documents)
+        StubRAGService.documents.append((documents[0]["document_id"], documents[0]["metadata"], text))
+        progress("embedding", 2, 2)
+        progress("inserting", 2, 2)
+        return {"total_chunks": 2, "inserted_chunks": 2 - self.failed_chunks, "replaced_chunks": 0,
+                "deleted_chunks": 0, "unchanged_chunks": 0, "failed_chunks": self.failed_chunks,
+                "chunks_per_sec": 1.0}
+
+@pytest.fixture
+def stub_rag(monkeypatch):
+    monkeypatch.setattr(rag_service, "RAGService", StubRAGService)
+    monkeypatch.setattr(StubRAGService, "documents", [])
+    return StubRAGService
+
+def _run_job(tmp_path, metadata=None):
+    path = tmp_path / "upload.txt"
+    path.write_text("Remote work needs manager approval.", encoding="utf-8")
+    queue = IngestionJobQueue(max_workers=1)
+    job = queue.submit(str(path), metadata, filename="policy.txt")
+    queue.shutdown(wait=True)
+    return queue.get(job["job_id"]), path
+
+def test_submitted_job_completes_and_removes_the_upload(tmp_path, stub_rag):
+    """A successful job reports its chunks and changes and deletes the temporary file"""
+    job, path = _run_job(tmp_path, {"source": "policy.txt", "category": "Human Resources"})
+    assert job["status"] == JOB_COMPLETED
+    assert job["progress"] == 1.0 and job["stage"] is None
+    assert job["chunks"] == 2 and job["changes"]["inserted_chunks"] == 2
+    assert job["doc_id"] == stub_rag.documents[0][0]
+    assert stub_rag.documents[0][1]["category"] == "Human Resources"
+    assert "manager approval" in stub_rag.documents[0][2]
+    assert not path.exists()
+
+def test_failed_job_records_the_error_and_removes_the_upload(tmp_path, stub_rag, monkeypatch):
+    """An ingestion error fails the job without losing track of the temporary file"""
+    monkeypatch.setattr(StubRAGService, "error", RuntimeError("Weaviate unavailable"))
+    job, path = _run_job(tmp_path)
+    assert job["status"] == JOB_FAILED
+    assert job["error"] == "Weaviate unavailable"
+    assert job["finished_at"] is not None
+    assert not path.exists()
+
+def test_job_with_rejected_chunks_fails(tmp_path, stub_rag, monkeypatch):
+    """Chunks the vector store rejected fail the job so the upload can be retried"""
+    monkeypatch.setattr(StubRAGService, "failed_chunks", 1)
+    job, path = _run_job(tmp_path)
+    assert job["status"] == JOB_FAILED
+    assert "1 chunk(s) failed to insert" in job["error"]
+    assert not path.exists()
+
+def test_shutdown_fails_queued_jobs_and_removes_their_uploads(tmp_path, stub_rag, monkeypatch):
+    """Jobs still queued when the pool shuts down are failed, not left queued, and their files deleted"""
+    gate = threading.Event()
+    monkeypatch.setattr(StubRAGService, "gate", gate)
+    paths = [tmp_path / f"upload-{index}.txt" for index in range(3)]
+    for path in paths:
+        path.write_text("Remote work needs manager approval.", encoding="utf-8")
+    queue = IngestionJobQueue(max_workers=1)
+    jobs = [queue.submit(str(path), None, filename=path.name) for path in paths]
+    deadline = time.time() + 5
+    while queue.get(jobs[0]["job_id"])["status"] != JOB_RUNNING and time.time() < deadline:
+        time.sleep(0.01)
+
+    queue.shutdown(wait=False)
+    for job, path in zip(jobs[1:], paths[1:]):
+        dropped = queue.get(job["job_id"])
+        assert dropped["status"] == JOB_FAILED
+        assert "shut down" in dropped["error"]
+        assert not path.exists()
+
+    # The running job is not affected
+    gate.set()
+    while queue.get(jobs[0]["job_id"])["status"] == JOB_RUNNING and time.time() < deadline:
+        time.sleep(0.01)
+    assert queue.get(jobs[0]["job_id"])["status"] == JOB_COMPLETED
+    assert not paths[0].exists()
+
+def test_upload_rejects_files_ingestion_cannot_extract(monkeypatch):
+    """An image is refused with a 400 instead of being accepted and failing in the background"""
+    from backend.routes import upload
+
+    submitted = []
+    monkeypatch.setattr(upload, "get_ingestion_queue", lambda: submitted.append(1))
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/api")
+    response = TestClient(app).post(
+        "/api/upload",
+        files={"file": ("scan.jpg", b"\xff\xd8\xff", "image/jpeg")},
+        data={"title": "Scan", "category": "Finance & Accounting", "location": "Headquarters"},
+    )
+    assert response.status_code == 400
+    assert "Unsupported file type: .jpg" in response.json()["detail"]
+    assert submitted == []
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for LLMService streaming: disconnects, upstream errors and the stream counters.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+from types import SimpleNamespace
+
+from backend.services.llm_service import LLMService
+
+class FakeOpenAIStream:
+    """Async iterator of chat completion chunks that records whether it was closed"""
+
+    def __init__(self, pieces, fail_after=None):
+        self.pieces = list(pieces)
+        self.fail_after = fail_after
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.fail_after is not None and self.sent == self.fail_after:
+            raise RuntimeError("connection reset")
+        if self.sent == len(self.pieces):
+            raise StopAsyncIteration
+        await asyncio.sleep(0)
+        self.sent += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.pieces[self.sent - 1]))])
+
+    async def close(self):
+        self.closed = True
+
+def _service(stream):
+    """A fresh (non-singleton) LLMService whose OpenAI client returns the given stream"""
+    service = object.__new__(LLMService)
+    service.__init__()
+    service.provider = "openai"
+
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return stream
+
+    service.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return service
+
+def test_completed_stream_records_tokens_and_ttft():
+    """A stream read to the end counts its tokens and time to first token"""
+    stream = FakeOpenAIStream(["Hel", "lo", "!"])
+    service = _service(stream)
+
+    async def consume():
+        return [token async for token in service.generate_streaming_response("hi")]
+
+    assert asyncio.run(consume()) == ["Hel", "lo", "!"]
+    stats = service.stream_stats()
+    assert (stats["streams"], stats["cancelled"], stats["failed"], stats["tokens"]) == (1, 0, 0, 3)
+    assert stats["avg_ttft_ms"] is not None and stats["last_ttft_ms"] is not None
+    assert stream.closed
+
+def test_client_disconnect_closes_the_upstream_stream():
+    """Closing the response generator mid-stream (client went away) stops the provider stream"""
+    stream = FakeOpenAIStream(["one", "two", "three", "four"])
+    service = _service(stream)
+
+    async def disconnect_after_first_token():
+        tokens = service.generate_streaming_response("hi")
+        first = await tokens.__anext__()
+        await tokens.aclose()
+        return first
+
+    assert asyncio.run(disconnect_after_first_token()) == "one"
+    assert stream.closed
+    assert stream.sent == 1
+    stats = service.stream_stats()
+    assert (stats["streams"], stats["cancelled"], stats["tokens"]) == (1, 1, 1)
+
+def test_upstream_error_is_reported_in_the_stream():
+    """A provider failure mid-stream ends the stream with an error token and is counted as failed"""
+    stream = FakeOpenAIStream(["partial"], fail_after=1)
+    service = _service(stream)
+
+    async def consume():
+        return [token async for token in service.generate_streaming_response("hi")]
+
+    tokens = asyncio.run(consume())
+    assert tokens[0] == "partial"
+    assert tokens[-1] == "[OpenAI API error: connection reset]"
+    assert stream.closed
+    stats = service.stream_stats()
+    assert (stats["failed"], stats["cancelled"]) == (1, 0)
+
+def test_stream_without_tokens_has_no_ttft_sample():
+    """An empty response is counted as a stream but not as a time-to-first-token sample"""
+    service = _service(FakeOpenAIStream([]))
+
+    async def consume():
+        return [token async for token in service.generate_streaming_response("hi")]
+
+    assert asyncio.run(consume()) == []
+    stats = service.stream_stats()
+    assert stats["streams"] == 1
+    assert stats["avg_ttft_ms"] is None
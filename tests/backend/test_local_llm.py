@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for the local LLM scheduler, using the mock model.
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.local_llm import (
+    LOCAL_LLM_MAX_TOKENS, LocalLLMBusy, LocalLLMScheduler, MockLocalModel, common_prefix_length, format_chat_prompt,
+    local_context_budget
+)
+from backend.utils.context_budget import MESSAGE_OVERHEAD_TOKENS, Section
+
+SYSTEM = "You are a helpful assistant that answers from the knowledge base only"
+
+def make_scheduler(n_slots=2, max_queue=8, step_delay=0.0, max_tokens=64):
+    return LocalLLMScheduler(MockLocalModel(n_slots=n_slots, step_delay=step_delay), max_queue=max_queue,
+                             max_tokens=max_tokens)
+
+def test_complete_returns_mock_reply():
+    """A blocking completion returns the whole generated text"""
+    scheduler = make_scheduler()
+    try:
+        assert scheduler.complete("tell me about the holiday policy") == " Mock: tell me about the holiday policy"
+        assert scheduler.stats()["completed"] == 1
+    finally:
+        scheduler.shutdown()
+
+def test_concurrent_streams_are_interleaved():
+    """Concurrent requests are generated together instead of one after the other"""
+    scheduler = make_scheduler(n_slots=2, step_delay=0.002)
+    order = []
+
+    async def consume(name, prompt):
+        async for piece in scheduler.stream(prompt):
+            order.append(name)
+
+    async def main():
+        await asyncio.gather(consume("a", "one two three four five"), consume("b", "six seven eight nine ten"))
+
+    try:
+        asyncio.run(main())
+    finally:
+        scheduler.shutdown()
+    # Both streams produced tokens before either finished
+    assert order.index("b") < len(order) - order[::-1].index("a") - 1
+    assert order.count("a") == order.count("b") == 6
+
+def test_max_tokens_caps_generation():
+    """Generation stops after max_tokens tokens"""
+    scheduler = make_scheduler(max_tokens=3)
+    try:
+        assert scheduler.complete("a b c d e f g h").split() == ["Mock:", "a", "b"]
+    finally:
+        scheduler.shutdown()
+
+def test_shared_system_prefix_is_reused():
+    """A prompt sharing the system instruction skips the cached prefix and picks the warm slot"""
+    model = MockLocalModel(n_slots=2)
+    scheduler = LocalLLMScheduler(model)
+    try:
+        first = format_chat_prompt([{"role": "system", "content": SYSTEM}, {"role": "user", "content": "first question"}])
+        scheduler.complete(first)
+        evaluated_after_first = model.evaluated_tokens
+        second = format_chat_prompt([{"role": "system", "content": SYSTEM}, {"role": "user", "content": "second one"}])
+        scheduler.complete(second)
+        second_tokens = len(model.tokenize(second))
+        # Only the part after the shared prefix was evaluated
+        assert model.evaluated_tokens - evaluated_after_first < second_tokens / 2
+        assert scheduler.stats()["reused_prefix_tokens"] >= common_prefix_length(model.tokenize(first), model.tokenize(second))
+    finally:
+        scheduler.shutdown()
+
+def test_full_queue_rejects_requests():
+    """Once every slot is busy and the queue is full, new requests are rejected"""
+    scheduler = make_scheduler(n_slots=1, max_queue=1, step_delay=0.01)
+    done = threading.Event()
+    try:
+        scheduler.submit("one two three", lambda item: done.set() if item is None else None)
+        scheduler.submit("four five six", lambda item: None)
+        with pytest.raises(LocalLLMBusy):
+            scheduler.submit("seven eight nine", lambda item: None)
+        assert scheduler.stats()["rejected"] == 1
+        done.wait(5)
+    finally:
+        scheduler.shutdown()
+
+def test_closing_a_stream_cancels_generation():
+    """Stopping iteration early frees the slot for the next request"""
+    scheduler = make_scheduler(n_slots=1, step_delay=0.005)
+
+    async def main():
+        stream = scheduler.stream("a b c d e f g h")
+        async for _ in stream:
+            break
+        await stream.aclose()
+        # The freed slot serves the next request
+        return await asyncio.get_running_loop().run_in_executor(None, scheduler.complete, "x y")
+
+    try:
+        assert asyncio.run(main()) == " Mock: x y"
+        stats = scheduler.stats()
+        assert stats["cancelled"] == 1
+        assert stats["active"] == 0
+    finally:
+        scheduler.shutdown()
+
+def test_stream_tokenizes_the_prompt_off_the_event_loop():
+    """The prompt is tokenized in the blocking pool, not on the thread running the event loop"""
+    model = MockLocalModel(n_slots=1)
+    scheduler = LocalLLMScheduler(model)
+    tokenized_on = []
+    tokenize = model.tokenize
+
+    def recording_tokenize(text):
+        tokenized_on.append(threading.current_thread())
+        return tokenize(text)
+
+    model.tokenize = recording_tokenize
+
+    async def main():
+        return "".join([piece async for piece in scheduler.stream("a b c")])
+
+    try:
+        assert asyncio.run(main()) == " Mock: a b c"
+    finally:
+        scheduler.shutdown()
+    assert tokenized_on and threading.main_thread() not in tokenized_on
+
+def test_prompt_packed_to_the_local_budget_is_accepted():
+    """A prompt filled to the local budget still leaves room for the reply in the context window"""
+    model = MockLocalModel(n_slots=1, n_ctx=1024)
+    scheduler = LocalLLMScheduler(model, max_tokens=LOCAL_LLM_MAX_TOKENS)
+    budget = local_context_budget(model)
+    passages = [" ".join(f"chunk{i}word{j}" for j in range(120)) for i in range(40)]
+    history = [{"role": "user" if i % 2 else "assistant", "content": f"turn {i} " * 30} for i in range(20)]
+    packed = budget.pack([SYSTEM, "what is the refund policy"], [
+        Section("chunks", passages, overhead=1),
+        Section("history", [msg["content"] for msg in history[::-1]], contiguous=True, overhead=MESSAGE_OVERHEAD_TOKENS),
+    ])
+    assert packed.dropped["chunks"] > 0
+    kept_history = [history[::-1][i] for i in reversed(packed.kept["history"])]
+    context = "\n\n".join(passages[i] for i in packed.kept["chunks"])
+    prompt = format_chat_prompt([{"role": "system", "content": f"{SYSTEM}\n\n{context}"}] + kept_history +
+                                [{"role": "user", "content": "what is the refund policy"}])
+    try:
+        assert len(model.tokenize(prompt)) + LOCAL_LLM_MAX_TOKENS <= model.n_ctx
+        assert scheduler.complete(prompt).startswith(" Mock:")
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the thread-safe TTL/LRU cache used for query embeddings.
+"""
+
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.utils.lru_cache import TTLLRUCache
+
+def test_lru_eviction():
+    """Least recently used entries are evicted once max_size is reached"""
+    cache = TTLLRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry():
+    """Entries older than the TTL are treated as misses"""
+    cache = TTLLRUCache(max_size=10, ttl_seconds=0.05)
+    cache.put("q", [0.1, 0.2])
+    assert cache.get("q") == [0.1, 0.2]
+    time.sleep(0.1)
+    assert cache.get("q") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_concurrent_access():
+    """Concurrent writers never push the cache over its size limit"""
+    cache = TTLLRUCache(max_size=50)
+
+    def worker(offset):
+        for i in range(200):
+            cache.put((offset, i), i)
+            cache.get((offset, i - 1))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats["size"] <= 50
+    assert stats["hits"] + stats["misses"] == 8 * 200
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_concurrent_access()
+    print("✅ All LRU cache tests passed")
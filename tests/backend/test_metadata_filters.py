@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for metadata filter parsing and post-filter evaluation.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.utils.metadata_filters import Condition, filter_key, matches, parse_metadata_filter
+
+CHUNK = {
+    "category": "Human Resources",
+    "location": "Headquarters",
+    "upload_date": datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc),
+}
+
+def test_scalar_list_and_range_forms():
+    conditions = parse_metadata_filter({
+        "category": "Human Resources",
+        "location": ["Headquarters", "All Locations"],
+        "upload_date": {"gte": "2024-01-01", "lt": "2025-01-01T00:00:00Z"},
+    })
+    assert Condition("category", "eq", "Human Resources") in conditions
+    assert Condition("location", "in", ("Headquarters", "All Locations")) in conditions
+    assert {c.op for c in conditions if c.prop == "upload_date"} == {"gte", "lt"}
+    assert matches(conditions, CHUNK)
+
+def test_post_filter_rejects_non_matching_chunks():
+    assert not matches(parse_metadata_filter({"category": "Finance & Accounting"}), CHUNK)
+    assert not matches(parse_metadata_filter({"upload_date": {"gt": "2024-06-02"}}), CHUNK)
+    assert not matches(parse_metadata_filter({"location": {"in": ["Remote/Home Office"]}}), CHUNK)
+    assert not matches(parse_metadata_filter({"source": "handbook.pdf"}), CHUNK)
+
+def test_dates_stored_as_strings_are_compared_as_dates():
+    conditions = parse_metadata_filter({"upload_date": {"lte": "2024-06-01T12:00:00Z"}})
+    assert matches(conditions, {"upload_date": "2024-06-01T12:00:00.000Z"})
+
+def test_invalid_filters_are_rejected():
+    with pytest.raises(ValueError):
+        parse_metadata_filter({"content": "secret"})
+    with pytest.raises(ValueError):
+        parse_metadata_filter({"category": {"gt": "A"}})
+    with pytest.raises(ValueError):
+        parse_metadata_filter({"upload_date": {"gte": "last week"}})
+
+def test_filter_key_ignores_order():
+    first = parse_metadata_filter({"category": "HR", "location": ["B", "A"]})
+    second = parse_metadata_filter({"location": ["A", "B"], "category": "HR"})
+    assert filter_key(first) == filter_key(second)
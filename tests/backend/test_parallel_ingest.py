@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for document ids, the parse stage and the manifest of the parallel ingestion CLI.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.utils.chunking import Chunker
+from backend.utils.content_hashing import document_hash, stable_document_id
+from backend.utils.ingest_documents import prepare_document
+from backend.utils.parallel_ingest import IngestManifest, parse_file
+
+TEXT = (
+    "Remote work needs manager approval. Equipment is provided by IT.\n\n"
+    "Expenses are reimbursed monthly. Receipts are required for every claim.\n\n"
+) * 20
+
+def _write(tmp_path, name="handbook.txt", text=TEXT):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path.resolve())
+
+def test_uploaded_filenames_are_distinguished_by_category_location_and_uploader(tmp_path):
+    """The same filename uploaded for another category, location or user is a different document"""
+    path = _write(tmp_path)
+    metadata = {"source": "handbook.pdf", "category": "Human Resources", "location": "Headquarters", "uploaded_by": "alice"}
+    document_id = prepare_document(path, metadata)["document_id"]
+    assert prepare_document(path, dict(metadata, tags="policy"))["document_id"] == document_id
+    for name, value in (("category", "Finance & Accounting"), ("location", "Remote/Home Office"), ("uploaded_by", "bob")):
+        assert prepare_document(path, dict(metadata, **{name: value}))["document_id"] != document_id
+    assert prepare_document(path, metadata, source_key="explicit")["document_id"] == stable_document_id("explicit")
+
+def test_parse_file_chunks_and_hashes_in_one_pass(tmp_path):
+    """New files are chunked like the serial path and hashed while chunking"""
+    path = _write(tmp_path)
+    result = parse_file(path, {"category": "Human Resources"}, max_tokens=40)
+    assert result["error"] is None
+    assert result["document_id"] == stable_document_id(path)
+    chunker = Chunker(max_tokens=40)
+    assert [chunk for chunk, _ in result["chunks"]] == list(chunker.chunks(TEXT))
+    assert result["document_hash"] == document_hash([TEXT], result["metadata"], chunker.signature)
+
+def test_parse_file_skips_chunking_unchanged_documents(tmp_path):
+    """A matching stored hash short-circuits before chunking"""
+    path = _write(tmp_path)
+    first = parse_file(path, None, max_tokens=40)
+    second = parse_file(path, None, max_tokens=40, known_hash=first["document_hash"])
+    assert second["unchanged"] and second["chunks"] == []
+    changed = parse_file(path, None, max_tokens=40, known_hash="stale")
+    assert not changed["unchanged"] and changed["chunks"] == first["chunks"]
+
+def test_parse_file_reports_errors(tmp_path):
+    path = _write(tmp_path, name="photo.jpg", text="not text")
+    result = parse_file(path, None, max_tokens=40)
+    assert "Unsupported file type" in result["error"]
+
+def test_manifest_resumes_only_unmodified_files(tmp_path):
+    path = _write(tmp_path)
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    IngestManifest(manifest_path).record(path, "doc-1", 3)
+
+    manifest = IngestManifest(manifest_path)
+    assert manifest.load() == 1
+    assert manifest.is_done(path)
+    _write(tmp_path, text=TEXT + "A new policy paragraph.")
+    assert not manifest.is_done(path)
+
+def test_manifest_redoes_files_ingested_with_other_metadata(tmp_path):
+    """A file recorded under one set of metadata is not done for a run with different metadata"""
+    path = _write(tmp_path)
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    IngestManifest(manifest_path, {"category": "HR", "location": "Remote"}).record(path, "doc-1", 3)
+
+    same = IngestManifest(manifest_path, {"location": "Remote", "category": "HR"})
+    same.load()
+    assert same.is_done(path)
+    for metadata in ({"category": "Legal & Compliance", "location": "Remote"}, None):
+        manifest = IngestManifest(manifest_path, metadata)
+        manifest.load()
+        assert not manifest.is_done(path)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Tests for RAGService ingestion and retrieval against an in-memory stand-in for the Weaviate collection.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from weaviate.collections.classes.config import Tokenization
+
+from backend.services import rag_service
+from backend.services.rag_service import RAGService
+from backend.utils.lru_cache import TTLLRUCache
+
+class FakeModel:
+    """Embeds a text as [len(text), index of the call]"""
+
+    def __init__(self):
+        self.batches = []
+        self.queries = []
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, convert_to_numpy=True):
+        if isinstance(texts, str):
+            self.queries.append(texts)
+            return np.array([float(len(texts)), -1.0])
+        self.batches.append(list(texts))
+        return np.array([[float(len(text)), float(len(self.batches))] for text in texts])
+
+class FakeCollection:
+    """Keeps objects in a dict and evaluates the filters RAGService builds"""
+
+    def __init__(self, max_results=10000, fail_document=None):
+        self.objects = {}
+        self.max_results = max_results
+        self.fail_document = fail_document
+        self.fetches = []
+        self.searches = []
+        self.aggregations = 0
+        self.insert_batches = []
+        self.updates = []
+        self.query = self
+        self.data = SimpleNamespace(insert_many=self.insert_many, replace=self.replace,
+                                    update=self.update, delete_many=self.delete_many)
+        self.config = SimpleNamespace(get=lambda: SimpleNamespace(properties=[]))
+        self.aggregate = SimpleNamespace(over_all=self.over_all)
+
+    @staticmethod
+    def _matches(filters, obj):
+        if filters is None:
+            return True
+        if hasattr(filters, "filters"):
+            return all(FakeCollection._matches(f, obj) for f in filters.filters)
+        value = obj["properties"].get(filters.target)
+        operator = filters.operator.value
+        if operator == "Equal":
+            return value == filters.value
+        if operator == "GreaterThan":
+            return value > filters.value
+        if operator == "ContainsAny":
+            return value in filters.value
+        raise AssertionError(f"unexpected filter operator {operator}")
+
+    def fetch_objects(self, filters=None, limit=None, sort=None, return_properties=None, after=None, offset=None):
+        self.fetches.append({"filters": filters, "limit": limit, "after": after, "offset": offset,
+                             "return_properties": return_properties})
+        if (offset or 0) + limit > self.max_results:
+            raise RuntimeError("query maximum results exceeded")
+        objects = [(uuid, obj) for uuid, obj in self.objects.items() if self._matches(filters, obj)]
+        if sort is not None:
+            objects.sort(key=lambda item: (item[1]["properties"]["document_id"], item[1]["properties"]["chunk_index"]))
+        else:
+            # Without a sort Weaviate returns objects in uuid order, which the cursor API pages through
+            objects.sort(key=lambda item: item[0])
+            if after is not None:
+                objects = [item for item in objects if item[0] > after]
+        objects = objects[offset or 0:(offset or 0) + limit]
+        return SimpleNamespace(objects=[SimpleNamespace(uuid=uuid, properties={
+            name: value for name, value in obj["properties"].items() if return_properties is None or name in return_properties
+        }) for uuid, obj in objects])
+
+    def near_vector(self, near_vector, filters=None, limit=None, return_metadata=None):
+        self.searches.append({"filters": filters, "limit": limit})
+        objects = [SimpleNamespace(uuid=uuid, properties=dict(obj["properties"]), metadata=SimpleNamespace(distance=0.1))
+                   for uuid, obj in self.objects.items() if self._matches(filters, obj)]
+        return SimpleNamespace(objects=objects[:limit])
+
+    def over_all(self, filters=None, total_count=True, group_by=None, return_metrics=None):
+        matched = [obj["properties"] for obj in self.objects.values() if self._matches(filters, obj)]
+        self.aggregations += 1
+        if group_by is None:
+            return SimpleNamespace(total_count=len(matched))
+        groups = {}
+        for props in matched:
+            groups.setdefault(props[group_by.prop], []).append(props)
+        occurrences = lambda members, name: SimpleNamespace(top_occurrences=[
+            SimpleNamespace(value=value) for value in sorted({member[name] for member in members})])
+        return SimpleNamespace(groups=[SimpleNamespace(
+            grouped_by=SimpleNamespace(value=value),
+            total_count=len(members),
+            properties={
+                "source": occurrences(members, "source"),
+                "category": occurrences(members, "category"),
+                "location": occurrences(members, "location"),
+                "upload_date": SimpleNamespace(minimum=min(member["upload_date"] for member in members),
+                                               maximum=max(member["upload_date"] for member in members)),
+            }) for value, members in groups.items()])
+
+    def insert_many(self, objects):
+        self.insert_batches.append(objects)
+        errors = {}
+        for index, obj in enumerate(objects):
+            if obj.properties["document_id"] == self.fail_document and obj.properties["chunk_index"] == 1:
+                errors[index] = SimpleNamespace(message="write failed")
+                continue
+            self.objects[obj.uuid] = {"properties": dict(obj.properties), "vector": obj.vector}
+        return SimpleNamespace(errors=errors)
+
+    def replace(self, uuid, properties, vector):
+        self.objects[uuid] = {"properties": dict(properties), "vector": vector}
+
+    def update(self, uuid, properties):
+        self.updates.append(uuid)
+        self.objects[uuid]["properties"].update(properties)
+
+    def delete_many(self, where):
+        for uuid in where.value:
+            self.objects.pop(uuid, None)
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    client = SimpleNamespace(collections=SimpleNamespace(get=lambda name: collection))
+    monkeypatch.setattr(RAGService, "client", property(lambda self: client))
+    monkeypatch.setattr(RAGService, "_ensure_weaviate_connected", lambda self: None)
+    return collection
+
+def _service(model=None):
+    """A RAGService with a fake embedding model and no connection (bypasses the singleton)"""
+    service = object.__new__(RAGService)
+    service.embedding_model = model
+    service.token_counter = None
+    service.max_chunk_tokens = 8
+    service._chunkers = {}
+    service.legacy_filter_properties = set()
+    service.reranker = None
+    service.filter_selectivity_cache = TTLLRUCache(max_size=16, ttl_seconds=0, name="test_filter_selectivity")
+    service.query_embedding_cache = TTLLRUCache(max_size=16, ttl_seconds=0, name="test_query_embeddings")
+    service.document_list_cache = TTLLRUCache(max_size=16, ttl_seconds=0, name="test_document_list")
+    return service
+
+def _document(document_id, words=40):
+    text = " ".join(f"{document_id}-word{i}." for i in range(words))
+    return {"document_id": document_id, "text": text, "metadata": {"category": "General", "source": f"{document_id}.txt"}}
+
+def _head_hash(collection, document_id):
+    for obj in collection.objects.values():
+        if obj["properties"]["document_id"] == document_id and obj["properties"]["chunk_index"] == 0:
+            return obj["properties"]["document_hash"]
+
+def test_failed_inserts_leave_the_document_unsynced(collection):
+    """A document with a chunk Weaviate rejected keeps no document hash, so the next sync retries it"""
+    collection.fail_document = "b"
+    service = _service(FakeModel())
+    stats = service.add_documents([_document("a"), _document("b")])
+    assert stats["failed_chunks"] == 1
+    assert stats["failed_documents"] == ["b"]
+    assert _head_hash(collection, "a")
+    assert not _head_hash(collection, "b")
+
+    collection.fail_document = None
+    retry = service.add_documents([_document("a"), _document("b")])
+    assert retry["failed_chunks"] == 0
+    assert retry["inserted_chunks"] == 1
+    assert _head_hash(collection, "b")
+
+def test_each_sync_extracts_a_document_once(collection):
+    """New, unchanged and changed documents are each extracted in a single pass"""
+    extractions = []
+    text = {"value": _document("a")["text"]}
+
+    def blocks():
+        extractions.append(1)
+        return iter(text["value"].split(". "))
+
+    document = {"document_id": "a", "blocks": blocks, "size": 0, "metadata": {"category": "General", "source": "a.pdf"}}
+    model = FakeModel()
+    service = _service(model)
+
+    first = service.add_documents([document])
+    assert first["inserted_chunks"] > 0 and len(extractions) == 1
+    # The hash taken while chunking matches the one checked before chunking on the next sync
+    unchanged = service.add_documents([document])
+    assert unchanged["unchanged_chunks"] == first["inserted_chunks"] and len(extractions) == 2
+    embedded = len(model.batches)
+
+    text["value"] += ". an added closing sentence"
+    changed = service.add_documents([document])
+    assert changed["inserted_chunks"] + changed["replaced_chunks"] > 0
+    assert len(extractions) == 3 and len(model.batches) > embedded
+
+def test_existing_chunks_are_keyset_paged(collection):
+    """Stored chunks past Weaviate's offset limit are still found, without offset paging"""
+    collection.max_results = 2000
+    for index in range(2500):
+        collection.objects[f"uuid-{index}"] = {"properties": {
+            "document_id": "large", "chunk_index": index, "content_hash": f"h{index}", "document_hash": ""}}
+    collection.objects["uuid-small"] = {"properties": {
+        "document_id": "small", "chunk_index": 0, "content_hash": "s", "document_hash": "d"}}
+
+    existing = _service()._fetch_existing_chunks(collection, ["large", "small", "missing"])
+    assert sorted(existing["large"]) == list(range(2500))
+    assert existing["large"][2499]["uuid"] == "uuid-2499"
+    assert existing["small"][0]["document_hash"] == "d"
+    assert existing["missing"] == {}
+    assert all(fetch["offset"] is None for fetch in collection.fetches)
+
+def test_word_tokenized_filters_are_post_filtered_exactly(collection):
+    """On a legacy collection a selective category filter is applied exactly, never inside the search"""
+    for index in range(10):
+        category = "Human Resources" if index == 0 else "Human Resources Policy"
+        collection.objects[f"uuid-{index}"] = {"properties": {
+            "document_id": f"doc-{index}", "chunk_index": 0, "content": f"chunk {index}", "category": category}}
+    collection.config = SimpleNamespace(get=lambda: SimpleNamespace(properties=[
+        SimpleNamespace(name="category", tokenization=Tokenization.WORD),
+        SimpleNamespace(name="location", tokenization=Tokenization.FIELD),
+        SimpleNamespace(name="content_hash", tokenization=Tokenization.WORD),
+        SimpleNamespace(name="document_hash", tokenization=Tokenization.WORD),
+    ]))
+    service = _service(FakeModel())
+    service._check_filter_tokenization(collection.config.get())
+    assert service.legacy_filter_properties == {"category"}
+
+    results = service.query_documents("leave policy", n_results=3, search_mode="vector", rerank=False,
+                                      metadata_filter={"category": "Human Resources"})
+    assert collection.searches[0]["filters"] is None
+    assert [obj.properties["category"] for obj in results.objects] == ["Human Resources"]
+
+def test_field_tokenized_collection_keeps_pre_filtering(collection):
+    """A collection created with field tokenization uses the selectivity-based strategy"""
+    service = _service(FakeModel())
+    service._check_filter_tokenization(SimpleNamespace(properties=[
+        SimpleNamespace(name="category", tokenization=Tokenization.FIELD),
+        SimpleNamespace(name="location", tokenization=Tokenization.FIELD),
+    ]))
+    assert service.legacy_filter_properties == set()
+
+def test_query_embedding_is_computed_from_the_cache_key():
+    """Spellings that share a cache entry get the embedding of the normalized text, whichever comes first"""
+    model = FakeModel()
+    service = _service(model)
+    first = service.embed_query("  What is the LEAVE policy? ")
+    assert service.embed_query("what is the leave policy?") == first
+    assert model.queries == ["what is the leave policy?"]
+
+def test_embed_texts_batches_in_order():
+    """Texts are encoded batch_size at a time and the embeddings come back in input order"""
+    model = FakeModel()
+    texts = [f"text {'x' * index}" for index in range(10)]
+    progress = []
+    embeddings = _service(model).embed_texts(texts, batch_size=4, progress=lambda done, total: progress.append((done, total)))
+    assert [len(batch) for batch in model.batches] == [4, 4, 2]
+    assert [embedding[0] for embedding in embeddings] == [float(len(text)) for text in texts]
+    assert progress == [(4, 10), (8, 10), (10, 10)]
+
+def test_add_documents_embeds_in_windows_and_keeps_chunks_with_their_vectors(collection, monkeypatch):
+    """Chunks are embedded and inserted a window at a time, each with the vector of its own text"""
+    monkeypatch.setattr(rag_service, "INGEST_WINDOW_CHUNKS", 5)
+    model = FakeModel()
+    stats = _service(model).add_documents([_document("a", words=60), _document("b", words=30)], batch_size=2)
+
+    assert stats["inserted_chunks"] == stats["total_chunks"] == len(collection.objects)
+    assert all(len(batch) <= 2 for batch in model.batches)
+    assert all(len(batch) <= 5 for batch in collection.insert_batches)
+    assert len(collection.insert_batches) > 1
+    for obj in collection.objects.values():
+        assert obj["vector"][0] == float(len(obj["properties"]["content"]))
+    for document in (_document("a", words=60), _document("b", words=30)):
+        chunks = sorted((obj["properties"]["chunk_index"], obj["properties"]["content"]) for obj in collection.objects.values()
+                        if obj["properties"]["document_id"] == document["document_id"])
+        assert [index for index, _ in chunks] == list(range(stats["documents"][document["document_id"]]))
+        positions = [document["text"].find(content.split()[0]) for _, content in chunks]
+        assert positions == sorted(positions) and -1 not in positions
+
+def _stored_chunk(collection, document_id, chunk_index, category="General", day=1):
+    collection.objects[f"{document_id}-{chunk_index:02d}"] = {"properties": {
+        "document_id": document_id, "chunk_index": chunk_index, "content": f"{document_id} chunk {chunk_index}",
+        "category": category, "location": "Headquarters", "source": f"{document_id}.pdf",
+        "upload_date": f"2024-06-{day:02d}T00:00:00.000Z"}}
+
+def test_list_documents_summarizes_and_pages_by_document(collection):
+    """Per-document summaries come from one grouped aggregation, are cached and paged by document id"""
+    for chunk_index in range(3):
+        _stored_chunk(collection, "doc-a", chunk_index, day=chunk_index + 1)
+    for chunk_index in range(2):
+        _stored_chunk(collection, "doc-b", chunk_index, category="Finance")
+    _stored_chunk(collection, "doc-c", 0)
+    service = _service()
+
+    first = service.list_documents(limit=2)
+    assert [summary["document_id"] for summary in first["documents"]] == ["doc-a", "doc-b"]
+    assert first["documents"][0]["chunks"] == 3
+    assert first["documents"][0]["sources"] == ["doc-a.pdf"]
+    assert (first["documents"][0]["first_uploaded"], first["documents"][0]["last_uploaded"]) == \
+        ("2024-06-01T00:00:00.000Z", "2024-06-03T00:00:00.000Z")
+    assert (first["next_cursor"], first["total_documents"], first["total_chunks"]) == ("doc-b", 3, 6)
+
+    second = service.list_documents(limit=2, after=first["next_cursor"])
+    assert [summary["document_id"] for summary in second["documents"]] == ["doc-c"]
+    assert second["next_cursor"] is None
+    assert collection.aggregations == 1
+
+    finance = service.list_documents(metadata_filter={"category": "Finance"})
+    assert [summary["document_id"] for summary in finance["documents"]] == ["doc-b"]
+    assert finance["documents"][0]["categories"] == ["Finance"]
+
+def test_chunks_are_walked_with_the_cursor_api(collection):
+    """iter_chunks pages in uuid order with after cursors and leaves chunk bodies out unless asked"""
+    for chunk_index in range(5):
+        _stored_chunk(collection, "doc-a", chunk_index)
+    service = _service()
+
+    chunks = list(service.iter_chunks(page_size=2))
+    assert [str(chunk.uuid) for chunk in chunks] == [f"doc-a-{index:02d}" for index in range(5)]
+    assert [fetch["after"] for fetch in collection.fetches] == [None, "doc-a-01", "doc-a-03"]
+    assert all(fetch["offset"] is None for fetch in collection.fetches)
+    assert "content" not in chunks[0].properties
+
+    page = service.fetch_chunk_page(limit=10, after="doc-a-02", include_content=True)
+    assert [chunk.properties["content"] for chunk in page] == ["doc-a chunk 3", "doc-a chunk 4"]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the fusion reranker and BM25 scoring.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from types import SimpleNamespace
+
+from backend.services.rerank_service import Reranker, bm25_scores
+
+def _candidate(content, distance=None, score=None):
+    return SimpleNamespace(properties={"content": content}, metadata=SimpleNamespace(distance=distance, score=score, rerank_score=None))
+
+def test_bm25_prefers_rare_query_terms():
+    documents = ["policy number HR-2041 covers parental leave", "leave policy overview", "expense policy"]
+    scores = bm25_scores("HR-2041 leave", documents)
+    assert scores[0] == max(scores)
+    assert scores[2] == 0.0
+
+def test_fusion_promotes_exact_lexical_match():
+    """A chunk containing the exact code beats slightly closer vectors without it"""
+    candidates = [
+        _candidate("General information about stock keeping.", distance=0.20),
+        _candidate("Inventory levels are reviewed weekly.", distance=0.21),
+        _candidate("SKU AX-9921 is discontinued; use AX-9930.", distance=0.22),
+    ]
+    reranker = Reranker(mode="fusion", lexical_weight=0.5)
+    ranked = reranker.rerank("Is SKU AX-9921 still sold?", candidates, top_k=2)
+    assert ranked[0] is candidates[2]
+    assert len(ranked) == 2
+    assert ranked[0].metadata.rerank_score >= ranked[1].metadata.rerank_score
+
+def test_fusion_without_distances_uses_retrieval_order():
+    candidates = [_candidate("alpha"), _candidate("beta"), _candidate("gamma")]
+    ranked = Reranker(mode="fusion").rerank("unrelated", candidates, top_k=3)
+    assert ranked == candidates
+
+def test_fusion_uses_hybrid_scores_without_distances():
+    candidates = [_candidate("alpha", score=0.2), _candidate("beta", score=0.9)]
+    ranked = Reranker(mode="fusion").rerank("unrelated", candidates, top_k=2)
+    assert ranked[0] is candidates[1]
+
+def test_stats_count_calls():
+    reranker = Reranker(mode="fusion")
+    reranker.rerank("leave", [_candidate("leave policy", 0.1)], top_k=1)
+    assert reranker.rerank("leave", [], top_k=1) == []
+    stats = reranker.stats()
+    assert stats["mode"] == "fusion" and stats["calls"] == 1
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide schema reflection cache.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, text
+
+from backend.utils.schema_cache import SchemaCache, get_schema_cache, register_ddl_invalidation
+
+def test_loader_runs_once_until_invalidated():
+    """Repeated reads are served from the cache until invalidate() is called"""
+    cache = SchemaCache()
+    calls = []
+    loader = lambda: calls.append(1) or {"tables": ["customers"]}
+
+    assert cache.get("schema", loader) == {"tables": ["customers"]}
+    assert cache.get("schema", loader) == {"tables": ["customers"]}
+    assert len(calls) == 1
+
+    cache.invalidate(reason="test")
+    cache.get("schema", loader)
+    assert len(calls) == 2
+    assert cache.version()["generation"] == 1
+
+def test_loader_errors_are_not_cached():
+    """A failing introspection is retried on the next call"""
+    cache = SchemaCache()
+    attempts = []
+
+    def flaky_loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return "schema"
+
+    try:
+        cache.get("schema", flaky_loader)
+        assert False, "expected the loader error to propagate"
+    except RuntimeError:
+        pass
+    assert cache.get("schema", flaky_loader) == "schema"
+    assert len(attempts) == 2
+
+def test_version_hash_tracks_contents():
+    """The version hash changes when the cached schema changes"""
+    cache = SchemaCache()
+    cache.get("schema", lambda: "v1")
+    first_hash = cache.version()["hash"]
+    cache.invalidate()
+    cache.get("schema", lambda: "v2")
+    assert cache.version()["hash"] != first_hash
+
+def test_ddl_invalidates_global_cache():
+    """CREATE/ALTER/DROP through a registered engine drops cached schema; DML does not"""
+    engine = create_engine("sqlite://")
+    register_ddl_invalidation(engine)
+    cache = get_schema_cache()
+    cache.get("ddl-test", lambda: "before")
+    generation = cache.version()["generation"]
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)"))
+    assert cache.version()["generation"] == generation + 1
+    assert cache.get("ddl-test", lambda: "after") == "after"
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO customers (name) VALUES ('Ada')"))
+    assert cache.version()["generation"] == generation + 1
+    assert cache.get("ddl-test", lambda: "unused") == "after"
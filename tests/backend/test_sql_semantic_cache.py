@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the natural-language-to-SQL semantic cache.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, text
+
+from backend.services.sql_semantic_cache import (
+    SQLSemanticCache, extract_read_tables, extract_write_table, question_literals, register_write_invalidation
+)
+
+# Tiny bag-of-words embedder so paraphrases land close together without a model
+VOCAB = ["many", "customers", "orders", "products", "total"]
+SYNONYMS = {"count": "many", "number": "many"}
+
+def fake_embed(question):
+    words = [SYNONYMS.get(w, w) for w in question.lower().replace("?", "").split()]
+    return [float(words.count(term)) for term in VOCAB]
+
+COUNT_CUSTOMERS_SQL = "SELECT COUNT(*) AS total_customers FROM customers"
+
+def test_table_extraction():
+    """Read and write table names are found in SQL text"""
+    sql = "SELECT c.name FROM customers c JOIN orders o ON o.customer_id = c.id"
+    assert extract_read_tables(sql) == {"customers", "orders"}
+    assert extract_write_table("INSERT INTO orders (id) VALUES (1)") == "orders"
+    assert extract_write_table('UPDATE "public"."customers" SET name = \'x\'') == "customers"
+    assert extract_write_table("SELECT * FROM orders") is None
+
+def test_exact_and_semantic_hits():
+    """Repeated questions hit exactly; paraphrases reuse the SQL above the threshold"""
+    cache = SQLSemanticCache(similarity_threshold=0.9, embed_fn=fake_embed)
+    cache.store("How many customers?", COUNT_CUSTOMERS_SQL, {"success": True, "response": "42"})
+
+    exact = cache.lookup("how many customers")
+    assert exact["match"] == "exact"
+    assert exact["result"]["response"] == "42"
+
+    semantic = cache.lookup("Count of customers")
+    assert semantic["match"] == "semantic"
+    assert semantic["sql_query"] == COUNT_CUSTOMERS_SQL
+
+    assert cache.lookup("how many orders") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+
+def test_write_invalidates_referenced_tables():
+    """A write through the engine drops entries that read the written table"""
+    engine = create_engine("sqlite://")
+    cache = SQLSemanticCache(embed_fn=fake_embed)
+    register_write_invalidation(engine, cache)
+    cache.store("How many customers?", COUNT_CUSTOMERS_SQL, {"success": True})
+    cache.store("How many products?", "SELECT COUNT(*) FROM products", {"success": True})
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customers (id INTEGER)"))
+        conn.execute(text("INSERT INTO customers (id) VALUES (1)"))
+
+    assert cache.lookup("How many customers?") is None
+    assert cache.lookup("How many products?")["match"] == "exact"
+    assert cache.stats()["invalidations"] == 1
+
+def test_different_literals_do_not_share_sql():
+    """Paraphrases with other numbers, years or quoted values fall through to the agent"""
+    cache = SQLSemanticCache(similarity_threshold=0.9, embed_fn=fake_embed)
+    cache.store("Top 5 products by total", "SELECT name FROM products LIMIT 5", {"success": True})
+    cache.store("Total orders in 2023", "SELECT COUNT(*) FROM orders WHERE year = 2023", {"success": True})
+
+    assert cache.lookup("top 10 products by total") is None
+    assert cache.lookup("total orders in 2024") is None
+    assert cache.lookup("the top 5 products by total")["match"] == "semantic"
+    assert cache.stats()["literal_mismatches"] == 2
+
+def test_question_literals():
+    """Numbers, number words, months, quoted text and names are literals; other words are not"""
+    assert question_literals("top five customers in March") == ("five", "march")
+    assert question_literals('Sales for "Branch Office - North" in Q3') == ("branch office - north", "q3")
+    assert question_literals("How many customers are there?") == ()
+
+def test_discard_removes_entry():
+    """A discarded entry is no longer returned"""
+    cache = SQLSemanticCache(embed_fn=fake_embed)
+    cache.store("How many customers?", COUNT_CUSTOMERS_SQL, {"success": True})
+    assert cache.discard("how many customers")
+    assert cache.lookup("How many customers?") is None
+    assert not cache.discard("how many customers")
+
+if __name__ == "__main__":
+    test_table_extraction()
+    test_exact_and_semantic_hits()
+    test_write_invalidates_referenced_tables()
+    test_different_literals_do_not_share_sql()
+    test_question_literals()
+    test_discard_removes_entry()
+    print("✅ All SQL semantic cache tests passed")
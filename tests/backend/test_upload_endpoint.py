@@ -83,7 +83,7 @@ Who should I contact for questions?"""
             print(f"📊 Response Status: {response.status_code}")
             print(f"📊 Response Headers: {dict(response.headers)}")
             
-            if response.status_code == 200:
+            if response.status_code in (200, 202):
                 result = response.json()
                 print("✅ Upload Successful!")
                 print("📋 Response Data:")
@@ -102,6 +102,11 @@ Who should I contact for questions?"""
                     print(f"  ✅ General Questions: {metadata.get('general_questions')}")
                 else:
                     print("⚠️  No metadata in response")
+                
+                # Ingestion runs in the background; report the job status
+                if 'status_url' in result:
+                    job = requests.get(f"{BASE_URL}{result['status_url']}").json()
+                    print(f"\n📥 Ingestion job {job.get('job_id')}: {job.get('status')} ({job.get('progress', 0):.0%})")
                     
             else:
                 print("❌ Upload Failed!")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared Weaviate client manager (connect, health checks, failure cooldown).
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+
+import pytest
+
+from backend.services import weaviate_client
+from backend.services.weaviate_client import WeaviateClientManager, WeaviateUnavailable
+
+class FakeClient:
+    def __init__(self, ready=True):
+        self.ready = ready
+        self.closed = False
+
+    def is_ready(self):
+        return self.ready
+
+    def close(self):
+        self.closed = True
+
+class FakeManager(WeaviateClientManager):
+    """Hands out FakeClients; clients_ready controls whether new connections come up"""
+
+    def __init__(self, connect_delay=0.0):
+        super().__init__(url="http://weaviate.test:8080")
+        self.connect_delay = connect_delay
+        self.clients_ready = True
+        self.created = []
+
+    def _create_client(self):
+        time.sleep(self.connect_delay)
+        client = FakeClient(self.clients_ready)
+        self.created.append(client)
+        return client
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(weaviate_client, "WEAVIATE_CONNECT_RETRIES", 2)
+    monkeypatch.setattr(weaviate_client, "WEAVIATE_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(weaviate_client, "WEAVIATE_FAILURE_COOLDOWN", 60)
+
+def test_client_is_created_once_and_shared():
+    """Every caller gets the same client until it fails a health check"""
+    manager = FakeManager()
+    assert manager.get_client() is manager.get_client()
+    assert len(manager.created) == 1
+    assert manager.generation == 1
+
+def test_failed_health_check_reconnects(monkeypatch):
+    """A client that stops answering is closed and replaced"""
+    monkeypatch.setattr(weaviate_client, "WEAVIATE_HEALTH_CHECK_INTERVAL", 0)
+    manager = FakeManager()
+    first = manager.get_client()
+    first.ready = False
+    second = manager.get_client()
+    assert second is not first and first.closed
+    assert manager.reconnects == 1
+    assert manager.generation == 2
+
+def test_failed_connect_fails_fast_during_cooldown():
+    """After a failed connect, callers get WeaviateUnavailable without another attempt"""
+    manager = FakeManager()
+    manager.clients_ready = False
+    with pytest.raises(ConnectionError):
+        manager.get_client()
+    attempts = len(manager.created)
+    manager.clients_ready = True
+    with pytest.raises(WeaviateUnavailable):
+        manager.get_client()
+    assert len(manager.created) == attempts
+    assert manager.health()["retry_in_seconds"] > 0
+
+    manager._retry_at = 0.0
+    assert manager.get_client().ready
+
+def test_concurrent_callers_wait_for_one_connect():
+    """Only one thread connects; the others wait for its client instead of connecting too"""
+    manager = FakeManager(connect_delay=0.2)
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(manager.get_client())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(manager.created) == 1
+    assert len(clients) == 5 and all(client is manager.created[0] for client in clients)
+
+def test_callers_give_up_on_a_slow_connect(monkeypatch):
+    """Waiting for another thread's connect is bounded by WEAVIATE_CONNECT_WAIT"""
+    monkeypatch.setattr(weaviate_client, "WEAVIATE_CONNECT_WAIT", 0.05)
+    manager = FakeManager(connect_delay=0.5)
+    connecting = threading.Thread(target=manager.get_client)
+    connecting.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    with pytest.raises(WeaviateUnavailable):
+        manager.get_client()
+    assert time.monotonic() - started < 0.3
+    connecting.join()
+
+def test_health_is_probed_without_holding_the_lock():
+    """A slow is_ready() probe does not block other callers"""
+    manager = FakeManager()
+    client = manager.get_client()
+    probing = threading.Event()
+    release = threading.Event()
+
+    def slow_ready():
+        probing.set()
+        release.wait(1)
+        return True
+
+    client.is_ready = slow_ready
+    probe = threading.Thread(target=manager.health)
+    probe.start()
+    probing.wait(1)
+    assert manager._lock.acquire(timeout=0.1)
+    manager._lock.release()
+    release.set()
+    probe.join()
+
+def test_close_allows_an_immediate_reconnect():
+    """close() drops the client and any cooldown"""
+    manager = FakeManager()
+    first = manager.get_client()
+    manager.close()
+    assert first.closed
+    assert manager.get_client() is not first
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Chunking Benchmark - compares chunking strategies on the text-for-testing corpus
+
+For each strategy (the original fixed character windows, sentence packing and
+paragraph packing) it reports chunk counts, token lengths, how many chunks
+exceed the embedding model's limit (and would be silently truncated), ingest
+throughput (chunking + embedding) and retrieval recall@k.
+
+Recall queries are sentences sampled from the corpus; a query is answered when
+one of the top-k chunks contains the middle of that sentence. Embedding and
+recall need sentence-transformers; without it only chunk statistics are shown.
+
+Usage:
+    python tests/performance/benchmark_chunking.py
+    python tests/performance/benchmark_chunking.py --corpus text-for-testing --queries-per-doc 20 --output chunking.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from backend.utils.chunking import (
+    Chunker, approximate_token_counter, hf_token_counter, iter_paragraphs, split_sentences
+)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+DEFAULT_CORPUS = Path(__file__).parent.parent.parent / "text-for-testing"
+
+def load_corpus(corpus_dir):
+    documents = {}
+    for path in sorted(Path(corpus_dir).glob("*.txt")):
+        documents[path.name] = path.read_text(encoding="utf-8", errors="ignore")
+    return documents
+
+def normalize(text):
+    return " ".join(text.split())
+
+def build_queries(documents, per_doc):
+    """Sample evenly spaced sentences of at least 8 words; the answer is the sentence's middle."""
+    queries = []
+    for name, text in documents.items():
+        sentences = [s for p in iter_paragraphs(text) for s in split_sentences(p) if len(s.split()) >= 8]
+        if not sentences:
+            continue
+        step = max(len(sentences) // per_doc, 1)
+        for sentence in sentences[::step][:per_doc]:
+            words = sentence.split()
+            margin = len(words) // 5
+            queries.append({"document": name, "query": sentence, "answer": " ".join(words[margin:len(words) - margin])})
+    return queries
+
+def chunk_corpus(chunker, documents):
+    chunks = []
+    start_time = time.time()
+    for name, text in documents.items():
+        for chunk in chunker.chunks(text):
+            chunks.append({"document": name, "text": chunk})
+    return chunks, time.time() - start_time
+
+def evaluate(name, chunker, documents, queries, model, count_tokens, model_limit, top_k):
+    chunks, chunk_seconds = chunk_corpus(chunker, documents)
+    token_counts = count_tokens([chunk["text"] for chunk in chunks])
+    total_chars = sum(len(text) for text in documents.values())
+    result = {
+        "strategy": name,
+        "signature": chunker.signature,
+        "chunks": len(chunks),
+        "tokens_mean": statistics.mean(token_counts) if token_counts else 0.0,
+        "tokens_max": max(token_counts) if token_counts else 0,
+        "over_model_limit": sum(1 for count in token_counts if count > model_limit),
+        "chunking_mb_per_sec": total_chars / 1e6 / chunk_seconds if chunk_seconds > 0 else 0.0,
+    }
+    if model is None:
+        return result
+
+    start_time = time.time()
+    chunk_vectors = model.encode([chunk["text"] for chunk in chunks], batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+    ingest_seconds = chunk_seconds + (time.time() - start_time)
+    result["ingest_seconds"] = ingest_seconds
+    result["ingest_chunks_per_sec"] = len(chunks) / ingest_seconds if ingest_seconds > 0 else 0.0
+    result["ingest_kchars_per_sec"] = total_chars / 1e3 / ingest_seconds if ingest_seconds > 0 else 0.0
+
+    query_vectors = model.encode([q["query"] for q in queries], batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+    scores = query_vectors @ chunk_vectors.T
+    normalized_chunks = [normalize(chunk["text"]) for chunk in chunks]
+    for k in sorted({1, top_k}):
+        hits = 0
+        for query, row in zip(queries, scores):
+            top = np.argsort(-row)[:k]
+            if any(query["answer"] in normalized_chunks[i] for i in top):
+                hits += 1
+        result[f"recall@{k}"] = hits / len(queries) if queries else 0.0
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies on a text corpus")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "intfloat/e5-small"))
+    parser.add_argument("--queries-per-doc", type=int, default=15)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=500, help="Character window of the fixed strategy")
+    parser.add_argument("--overlap", type=int, default=50, help="Character overlap of the fixed strategy")
+    parser.add_argument("--max-tokens", type=int, default=0, help="Token budget (0 = model limit)")
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus)
+    if not documents:
+        print(f"❌ No .txt files found in {args.corpus}")
+        sys.exit(1)
+    queries = build_queries(documents, args.queries_per_doc)
+    print(f"📚 {len(documents)} documents, {sum(len(t) for t in documents.values()):,} characters, {len(queries)} recall queries")
+
+    model = None
+    count_tokens = approximate_token_counter
+    model_limit = 512
+    if SENTENCE_TRANSFORMERS_AVAILABLE:
+        print(f"🔄 Loading embedding model: {args.model}...")
+        model = SentenceTransformer(args.model, device="cpu")
+        count_tokens = hf_token_counter(model.tokenizer)
+        model_limit = model.max_seq_length - 2
+    else:
+        print("⚠️  sentence-transformers not available; token counts are estimates and recall is skipped")
+
+    max_tokens = args.max_tokens or model_limit
+    strategies = {
+        "fixed (chunk_text)": Chunker("fixed", chunk_size=args.chunk_size, overlap=args.overlap),
+        "sentence": Chunker("sentence", max_tokens=max_tokens, overlap_tokens=args.overlap_tokens, token_counter=count_tokens),
+        "paragraph": Chunker("paragraph", max_tokens=max_tokens, overlap_tokens=args.overlap_tokens, token_counter=count_tokens),
+    }
+
+    results = []
+    for name, chunker in strategies.items():
+        result = evaluate(name, chunker, documents, queries, model, count_tokens, model_limit, args.top_k)
+        results.append(result)
+        print("=" * 50)
+        for key, value in result.items():
+            print(f"📊 {key}: {value:.3f}" if isinstance(value, float) else f"📊 {key}: {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
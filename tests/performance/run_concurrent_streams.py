@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Concurrent Stream Load Test - Assumes backend is already running
+
+Fires N concurrent POST /api/chat/stream requests and reports throughput,
+time-to-first-event and total latency. Run it against a build before and
+after a change with the same settings and compare the output.
+
+Usage:
+    python tests/performance/run_concurrent_streams.py --concurrency 16 --requests 64
+    python tests/performance/run_concurrent_streams.py --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+
+DEFAULT_MESSAGES = [
+    "How many customers do we have?",
+    "What is the total revenue?",
+    "Summarize the employee handbook",
+    "What is the capital of France?",
+]
+
+async def run_stream(client, base_url, message, results):
+    """Send one streaming chat request and record its timings"""
+    start_time = time.time()
+    first_event_time = None
+    first_delta_time = None
+    ok = False
+    try:
+        async with client.stream(
+            "POST",
+            f"{base_url}/api/chat/stream",
+            json={"message": message, "session_id": f"load-{uuid.uuid4()}"},
+        ) as response:
+            if response.status_code != 200:
+                results.append({"ok": False, "status": response.status_code})
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                now = time.time()
+                if first_event_time is None:
+                    first_event_time = now
+                try:
+                    data = json.loads(line[6:])
+                except json.JSONDecodeError:
+                    continue
+                if "delta" in data and first_delta_time is None:
+                    first_delta_time = now
+                if data.get("done") or data.get("end"):
+                    ok = "error" not in data
+                    break
+    except Exception as e:
+        results.append({"ok": False, "error": str(e)})
+        return
+
+    end_time = time.time()
+    results.append({
+        "ok": ok,
+        "total_ms": (end_time - start_time) * 1000,
+        "first_event_ms": (first_event_time - start_time) * 1000 if first_event_time else None,
+        "first_delta_ms": (first_delta_time - start_time) * 1000 if first_delta_time else None,
+    })
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+async def run_load_test(base_url, concurrency, total_requests, timeout):
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def bounded(i):
+            async with semaphore:
+                await run_stream(client, base_url, DEFAULT_MESSAGES[i % len(DEFAULT_MESSAGES)], results)
+
+        start_time = time.time()
+        await asyncio.gather(*(bounded(i) for i in range(total_requests)))
+        wall_time = time.time() - start_time
+
+    succeeded = [r for r in results if r.get("ok")]
+    totals = [r["total_ms"] for r in succeeded]
+    first_events = [r["first_delta_ms"] for r in succeeded if r.get("first_delta_ms") is not None]
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_time_s": wall_time,
+        "streams_per_sec": len(succeeded) / wall_time if wall_time > 0 else 0.0,
+        "total_ms_p50": statistics.median(totals) if totals else 0.0,
+        "total_ms_p95": percentile(totals, 95),
+        "first_token_ms_p50": statistics.median(first_events) if first_events else 0.0,
+        "first_token_ms_p95": percentile(first_events, 95),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /api/chat/stream load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--output", help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"🧪 Running {args.requests} streams with concurrency {args.concurrency} against {args.base_url}")
+    summary = asyncio.run(run_load_test(args.base_url, args.concurrency, args.requests, args.timeout))
+
+    print("=" * 50)
+    for key, value in summary.items():
+        print(f"📊 {key}: {value:.2f}" if isinstance(value, float) else f"📊 {key}: {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Summary written to {args.output}")
+
+if __name__ == "__main__":
+    main()